@@ -29,6 +29,8 @@
 # MAGIC
 # MAGIC 7. Qual o tempo médio de viagem por tipo de navio?
 # MAGIC
+# MAGIC 8. Quais são as principais rotas (origem e destino) por peso movimentado?
+# MAGIC
 # MAGIC
 # MAGIC
 # MAGIC ## Decrição de Dados
@@ -61,17 +63,82 @@
 
 # COMMAND ----------
 
-import pandas as pd
-import glob
-import os
+import hashlib
+import math
 import re
+import time
 
-from pyspark.sql import DataFrame
+from pyspark.sql import DataFrame, Row, Window
 from pyspark.sql import SparkSession
 from collections import defaultdict
+from datetime import datetime
+from functools import partial, reduce
 from pyspark.sql import functions as F
-from pyspark.sql.functions import col, coalesce, lit  
+from pyspark.sql.functions import col, lit
+from delta.tables import DeltaTable
+
+
+# COMMAND ----------
 
+# MAGIC %md
+# MAGIC Registro de esquemas tipados das tabelas (conforme o Catálogo de Dados)
+
+# COMMAND ----------
+
+# O registro de esquemas (ESQUEMAS_ANTAQ), a normalização dos nomes de colunas e a
+# identificação das tabelas pelo nome do arquivo ficam em antaq_comum.py, compartilhado
+# com a execução local (pipeline_local.py)
+from antaq_comum import (
+    ARMAZENAMENTO_BRONZE,
+    ATRIBUTOS_LOCAL_FLUXOS,
+    BITS_HLL,
+    CONSULTAS_OURO,
+    DURACOES_ATRACACAO,
+    ESQUEMAS_ANTAQ,
+    GEOHASH_PRECISAO,
+    ORDENACAO_BRONZE,
+    TABELAS_APOIO,
+    ano_do_arquivo,
+    celulas_busca,
+    consulta_historico_navio,
+    consulta_historico_navios,
+    consulta_navios_distintos,
+    consulta_percentis,
+    consulta_sketch_navios,
+    consulta_sketch_tempos,
+    geohash,
+    identificador_navio,
+    interpretar_coordenadas,
+    normalizar_nome_coluna,
+    tamanho_em_bytes,
+    tipo_da_tabela,
+    vizinhos_geohash,
+)
+
+# Leitura tipada (esquema DDL, quarentena, Ano e hash_linha) e conversão das datas da prata,
+# compartilhadas com o modo streaming (pipeline_streaming.py)
+from antaq_spark import (
+    OPCOES_LEITURA_CSV,
+    clean_column_names,
+    distancia_ate,
+    incluir_ano,
+    incluir_hash_linha,
+    ler_por_cabecalho,
+    preparar_prata,
+    renomear_coluna_a_coluna,
+)
+
+# Tempo de parede, linhas, bytes e métricas das tarefas (shuffle, spill, GC) de cada etapa
+from antaq_metricas import gravar_metricas, medir_etapa
+
+# Gravações independentes executadas em paralelo, como um grafo de dependências entre tabelas
+from antaq_agendador import executar_grafo
+
+# DataFrames reutilizados por mais de uma etapa ficam em cache até o último consumidor
+from antaq_cache import consumir, criar_cache, invalidar_origem, registrar_cache, relatorio_cache
+
+# Resultados das consultas da ouro em disco, pela consulta normalizada e pelas versões das tabelas lidas
+from antaq_cache_consultas import abrir_cache, consultar, invalidar_tabela, resumo_cache
 
 # COMMAND ----------
 
@@ -95,7 +162,7 @@ dbutils.fs.rm("dbfs:/FileStore/tables/2020Carga_part1.txt", True)
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC Criando um Dataframe com todas as tabelas:
+# MAGIC Descobrindo os arquivos e agrupando por tipo de tabela (todas as partes e todos os anos):
 
 # COMMAND ----------
 
@@ -106,117 +173,496 @@ spark = SparkSession.builder.appName("CargaDados").getOrCreate()
 # Caminho base no DBFS
 caminho_dbfs = "dbfs:/FileStore/tables/"
 
-# Listar os arquivos dentro do diretório
-arquivos_dbfs = dbutils.fs.ls(caminho_dbfs)
+# Identificador desta execução do pipeline, usado nas tabelas de acompanhamento
+ID_EXECUCAO = datetime.now().strftime("%Y%m%d%H%M%S")
 
-# Criar um dicionário para armazenar os DataFrames individuais
-dfs_individuais = {}
+# Registros de medir_etapa desta execução, gravados em qualidade.metricas_etapas ao final do notebook
+metricas_etapas = []
+
+# Cache dos DataFrames intermediários desta execução (antaq_cache.py), com o relatório ao final do notebook
+cache_etapas = criar_cache()
+
+# Cache dos resultados das consultas da ouro no disco local do driver; as gravações invalidam as entradas das tabelas regravadas
+DIRETORIO_CACHE_CONSULTAS = "/local_disk0/tmp/antaq_cache_consultas"
+cache_consultas = abrir_cache(DIRETORIO_CACHE_CONSULTAS)
+
+
+def descobrir_arquivos(caminho_base):
+    """Agrupa os arquivos .txt e .txt_part do diretório pelo tipo de tabela (ex.: 2020Carga_txt_part2 -> carga)."""
+    arquivos_por_tipo = defaultdict(list)
+    for arquivo in dbutils.fs.ls(caminho_base):
+        if arquivo.path.endswith(".txt") or "txt_part" in arquivo.path:
+            arquivos_por_tipo[tipo_da_tabela(arquivo.name)].append(arquivo)
+    return arquivos_por_tipo
+
+
+def ler_cabecalho(caminho):
+    """Lê apenas a primeira linha do arquivo, sem disparar jobs no Spark."""
+    primeira_linha = dbutils.fs.head(caminho, 65536).splitlines()[0]
+    return primeira_linha.lstrip("\ufeff").split(OPCOES_LEITURA_CSV["sep"])
 
-# Importar cada arquivo separadamente
-for arquivo in arquivos_dbfs:
-    caminho_arquivo = arquivo.path
-    
-    if caminho_arquivo.endswith(".txt") or "txt_part" in caminho_arquivo:
-        nome_tabela = caminho_arquivo.split("/")[-1].replace(".txt", "").replace(".txt_part1", "").replace(".txt_part2", "").replace(".txt_part3", "")
-        
-        df = spark.read.option("header", "true").option("sep", ";").csv(caminho_arquivo)
-        
-        dfs_individuais[nome_tabela] = df  # Salvar DataFrame no dicionário
-        
-        print(f"Arquivo importado: {nome_tabela}")
 
-# Conferindo quantos arquivos foram carregados
-print(f"Total de arquivos carregados: {len(dfs_individuais)}")
+def ler_tipo(tipo, arquivos):
+    """Lê todos os arquivos de um tipo de tabela, uma varredura por cabeçalho (ver ler_por_cabecalho).
 
+    Retorna (df_valido, df_quarentena, df_lido); o df_valido mantém a coluna "_arquivo_origem" e
+    df_lido é a leitura persistida de onde saem as duas partes.
+    """
+    caminhos_por_cabecalho = defaultdict(list)
+    for arquivo in arquivos:
+        caminhos_por_cabecalho[tuple(ler_cabecalho(arquivo.path))].append(arquivo.path)
+    return ler_por_cabecalho(tipo, caminhos_por_cabecalho)
+
+
+with medir_etapa(metricas_etapas, ID_EXECUCAO, "descoberta") as registro:
+    arquivos_por_tipo = descobrir_arquivos(caminho_dbfs)
+    registro["linhas_saida"] = sum(len(arquivos) for arquivos in arquivos_por_tipo.values())
+
+for tipo, arquivos in arquivos_por_tipo.items():
+    print(f"Tipo: {tipo}, Arquivos: {[arquivo.name for arquivo in arquivos]}")
 
 
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC Unindo as tabelas particionadas:
+# MAGIC Manifesto de arquivos: processar somente arquivos novos ou alterados desde a última carga
 
 # COMMAND ----------
 
+# Tabela com caminho, tamanho, checksum e tabela de destino de cada arquivo já carregado
+TABELA_MANIFESTO = "bronze.manifesto_arquivos"
 
+# Com True, ignora o manifesto e recarrega todos os anos (ex.: após mudança no esquema)
+CARGA_COMPLETA = False
 
-# Criar um dicionário para armazenar listas de DataFrames de tabelas particionadas
-particoes_dict = defaultdict(list)
-dfs_consolidados = {}  # Dicionário final consolidado
 
-# Separar os arquivos que possuem múltiplas partes
-for nome_tabela, df in dfs_individuais.items():
-    if "_txt_part" in nome_tabela:  
-        base_tabela = nome_tabela.split("_txt_part")[0]  # Obtém o nome base (ex.: "2020Carga")
-        particoes_dict[base_tabela].append(df)  # Agrupa todas as partes
-    else:
-        dfs_consolidados[nome_tabela] = df  # Mantém tabelas já completas
+def checksum_arquivo(caminho):
+    """MD5 do conteúdo do arquivo, lido em blocos pelo ponto de montagem /dbfs."""
+    md5 = hashlib.md5()
+    with open(caminho.replace("dbfs:", "/dbfs", 1), "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(1 << 20), b""):
+            md5.update(bloco)
+    return md5.hexdigest()
+
+
+def carregar_manifesto():
+    if CARGA_COMPLETA or not spark.catalog.tableExists(TABELA_MANIFESTO):
+        return {}
+    return {linha["caminho"]: linha for linha in spark.table(TABELA_MANIFESTO).collect()}
+
+
+def comparar_com_manifesto(arquivos_por_tipo, manifesto):
+    """Retorna (entradas, pendentes): o novo manifesto completo e as entradas dos arquivos novos ou alterados.
+
+    O checksum só é recalculado quando tamanho ou data de modificação mudaram.
+    """
+    entradas, pendentes = [], []
+    for tipo, arquivos in arquivos_por_tipo.items():
+        for arquivo in arquivos:
+            anterior = manifesto.get(arquivo.path)
+            if anterior and anterior["tamanho"] == arquivo.size and anterior["data_modificacao"] == arquivo.modificationTime:
+                entradas.append(anterior)
+                continue
+
+            entrada = Row(
+                caminho=arquivo.path,
+                tamanho=arquivo.size,
+                data_modificacao=arquivo.modificationTime,
+                checksum=checksum_arquivo(arquivo.path),
+                tabela=tipo,
+                ano=ano_do_arquivo(arquivo.name),
+            )
+            entradas.append(entrada)
+            if not anterior or anterior["checksum"] != entrada["checksum"]:
+                pendentes.append(entrada)
+    return entradas, pendentes
+
+
+with medir_etapa(metricas_etapas, ID_EXECUCAO, "manifesto") as registro:
+    manifesto = carregar_manifesto()
+    entradas_manifesto, arquivos_pendentes = comparar_com_manifesto(arquivos_por_tipo, manifesto)
+    registro["linhas_saida"] = len(arquivos_pendentes)
 
-# Unir as partes de cada tabela e armazenar no dicionário final
-for base_tabela, lista_dfs in particoes_dict.items():
-    if lista_dfs:  
-        df_unificado = lista_dfs[0]  # Começa com o primeiro DataFrame
-        for df_part in lista_dfs[1:]:  # União das partes restantes
-            df_unificado = df_unificado.union(df_part)
+# Partições (tipo, ano) afetadas pelos arquivos novos ou alterados
+particoes_afetadas = defaultdict(set)
+for entrada in arquivos_pendentes:
+    particoes_afetadas[entrada["tabela"]].add(entrada["ano"])
 
-        dfs_consolidados[base_tabela] = df_unificado  # Substitui as versões particionadas
+# Para regravar um ano é preciso ler todos os arquivos daquele ano (ex.: todas as partes de 2024Carga)
+arquivos_a_ler = {
+    tipo: [arquivo for arquivo in arquivos_por_tipo[tipo] if ano_do_arquivo(arquivo.name) in anos]
+    for tipo, anos in particoes_afetadas.items()
+}
 
-print(f"Tabelas consolidadas corretamente: {list(dfs_consolidados.keys())}")
+def anos_afetados_por(*tabelas, particoes=None):
+    """Anos com arquivos novos ou alterados em qualquer uma das tabelas (de particoes_afetadas, se particoes for None)."""
+    particoes = particoes_afetadas if particoes is None else particoes
+    return sorted({ano for tabela in tabelas for ano in particoes.get(tabela, []) if ano is not None})
 
 
+print(f"Arquivos novos ou alterados: {len(arquivos_pendentes)} de {len(entradas_manifesto)}")
+for tipo, anos in particoes_afetadas.items():
+    print(f"Tabela: {tipo}, Anos afetados: {sorted(anos, key=str)}")
+
 
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC Confirmando a união das tabelas
+# MAGIC Layout de armazenamento por tabela: colunas de partição, chaves de ordenação (Z-ORDER), tamanho alvo dos arquivos e, na bronze, codec e tamanho dos grupos de linhas do Parquet
+
+# COMMAND ----------
+
+# Configuração padrão: Delta particionado por Ano, sem ordenação nem buckets, arquivos de ~128 MB,
+# codec e grupos de linhas padrão do Spark
+LAYOUT_PADRAO = {
+    "particao": ["Ano"], "ordenacao": [], "tamanho_arquivo": "128mb", "buckets": None, "formato": "delta",
+    "compressao": None, "grupo_linhas": None,
+}
+
+# Ajustes por camada, aplicados antes dos ajustes por tabela: a bronze segue a política de
+# armazenamento comum à execução local (ARMAZENAMENTO_BRONZE, em antaq_comum.py)
+LAYOUT_CAMADAS = {"bronze": ARMAZENAMENTO_BRONZE}
+
+# Número de buckets comum às tabelas que são unidas por idatracacao na camada ouro
+BUCKETS_IDATRACACAO = 64
+
+# Ajustes por tabela (nomes das colunas já normalizados). Chaves com esquema ("ouro.carga")
+# valem só para aquela camada e têm precedência sobre as chaves sem esquema.
+LAYOUT_TABELAS = {
+    "atracacao": {"ordenacao": ["idatracacao"]},
+    "carga": {"ordenacao": ["idatracacao"]},
+    "temposatracacao": {"ordenacao": ["idatracacao"]},
+    "temposatracacaoparalisacao": {"ordenacao": ["idatracacao"]},
+    "carga_conteinerizada": {"ordenacao": ["idcarga"], "tamanho_arquivo": "64mb"},
+    "carga_hidrovia": {"ordenacao": ["idcarga"], "tamanho_arquivo": "32mb"},
+    "carga_regiao": {"ordenacao": ["idcarga"], "tamanho_arquivo": "32mb"},
+    "carga_rio": {"ordenacao": ["idcarga"], "tamanho_arquivo": "32mb"},
+    "taxaocupacao": {"particao": ["anotaxaocupacao"], "ordenacao": ["idberco"]},
+    "taxaocupacaocomcarga": {"particao": ["anotaxaocupacao"], "ordenacao": ["idberco"]},
+    "taxaocupacaotoatracacao": {"particao": ["anotaxaocupacao"], "ordenacao": ["idberco"]},
+    "ocupacao_berco": {"particao": ["anotaxaocupacao"], "ordenacao": ["idberco"], "tamanho_arquivo": "32mb"},
+    "indice_espacial": {"ordenacao": ["geohash"], "tamanho_arquivo": "32mb"},
+    "mart_fluxos": {"ordenacao": ["origem", "destino"], "tamanho_arquivo": "32mb"},
+    "sketch_tempos": {"ordenacao": ["dimensao", "medida", "chave"], "tamanho_arquivo": "32mb"},
+    "sketch_navios": {"ordenacao": ["dimensao", "chave"], "tamanho_arquivo": "32mb"},
+    "historico_navios": {"ordenacao": ["navio"], "tamanho_arquivo": "32mb"},
+}
+
+# Bronze: linhas ordenadas pelos textos de baixa cardinalidade, para o dicionário do Parquet (ORDENACAO_BRONZE)
+for _tabela_bronze, _ordenacao in ORDENACAO_BRONZE.items():
+    LAYOUT_TABELAS[f"bronze.{_tabela_bronze}"] = {"ordenacao": _ordenacao}
+
+# Fatos unidos por idatracacao na camada ouro: gravados em buckets (Parquet, pois o Delta não suporta
+# bucketBy) com o mesmo número de buckets, para que as junções não precisem de shuffle
+for _tabela_bucket in ["atracacao", "carga", "temposatracacao", "fato_atracacao", "fato_carga"]:
+    LAYOUT_TABELAS[f"ouro.{_tabela_bucket}"] = {
+        "ordenacao": [], "buckets": ("idatracacao", BUCKETS_IDATRACACAO), "formato": "parquet",
+    }
+
+
+def layout_da_tabela(tabela):
+    """Layout de uma tabela (ex.: "prata.carga"); tabelas de apoio não são particionadas."""
+    camada, _, nome = tabela.rpartition(".")
+    layout = {**LAYOUT_PADRAO, **LAYOUT_CAMADAS.get(camada, {})}
+    if nome in TABELAS_APOIO:
+        return {**layout, "particao": []}
+    return {**layout, **LAYOUT_TABELAS.get(nome, {}), **LAYOUT_TABELAS.get(tabela, {})}
+
+
+def escritor_da_tabela(df, layout):
+    """Escritor em modo overwrite com o codec e o tamanho dos grupos de linhas do layout, se definidos."""
+    escritor = df.write.mode("overwrite")
+    if layout["compressao"]:
+        escritor = escritor.option("compression", layout["compressao"])
+    if layout["grupo_linhas"]:
+        escritor = escritor.option("parquet.block.size", tamanho_em_bytes(layout["grupo_linhas"]))
+    return escritor
+
+
+def opcoes_append_idempotente(id_aplicacao):
+    """Opções do Delta que tornam um append desta execução idempotente.
+
+    Um novo append com o mesmo txnAppId e txnVersion (ID_EXECUCAO) é ignorado pelo Delta: a repetição
+    de uma tarefa pelo executar_grafo, ou da célula, não duplica as linhas já gravadas.
+    """
+    return {"txnAppId": f"antaq_{id_aplicacao}", "txnVersion": int(ID_EXECUCAO)}
+
+
+def gravar_tabela(df, tabela):
+    """Grava o DataFrame regravando apenas as partições presentes nele (dynamic partition overwrite).
+
+    Na primeira carga (ou com CARGA_COMPLETA) a tabela é recriada com as partições, os buckets e o
+    tamanho alvo de arquivo do layout; tabelas sem partição são sempre regravadas por completo.
+    Os dados são ordenados pelas chaves do layout dentro de cada arquivo.
+    """
+    invalidar_origem(cache_etapas, tabela)
+    invalidar_tabela(cache_consultas, tabela)
+    layout = layout_da_tabela(tabela)
+    particao = [coluna for coluna in layout["particao"] if coluna in df.columns]
+    ordenacao = [coluna for coluna in layout["ordenacao"] if coluna in df.columns]
+
+    if layout["buckets"]:
+        # Uma tarefa por bucket (o hash do repartition é o mesmo do bucketBy): cada tarefa grava um
+        # arquivo por partição, em vez de até numero_buckets arquivos por tarefa e partição
+        coluna_bucket, numero_buckets = layout["buckets"]
+        df = df.repartition(numero_buckets, coluna_bucket)
+    if ordenacao:
+        df = df.sortWithinPartitions(*particao, *ordenacao)
+    escritor = escritor_da_tabela(df, layout)
+
+    if particao and spark.catalog.tableExists(tabela) and not CARGA_COMPLETA:
+        if layout["buckets"]:
+            # Tabelas em buckets são Parquet: a regravação por partição usa insertInto, que respeita os buckets.
+            # O insertInto não recebe opções do escritor e lê o modo das opções da tabela, e não da sessão,
+            # que é compartilhada com as gravações concorrentes do executar_grafo
+            spark.sql(f"ALTER TABLE {tabela} SET SERDEPROPERTIES ('partitionOverwriteMode' = 'dynamic')")
+            df.select(*spark.table(tabela).columns).write.insertInto(tabela, overwrite=True)
+        else:
+            escritor.option("partitionOverwriteMode", "dynamic").saveAsTable(tabela)
+        return
+
+    if particao:
+        escritor = escritor.partitionBy(*particao)
+
+    if layout["buckets"]:
+        spark.sql(f"DROP TABLE IF EXISTS {tabela}")
+        escritor.format(layout["formato"]).bucketBy(numero_buckets, coluna_bucket).sortBy(coluna_bucket).saveAsTable(tabela)
+        return
+
+    escritor.option("overwriteSchema", "true").saveAsTable(tabela)
+    spark.sql(f"ALTER TABLE {tabela} SET TBLPROPERTIES ('delta.targetFileSize' = '{layout['tamanho_arquivo']}')")
+
+
+def otimizar_tabela(tabela, anos=None):
+    """Compacta e aplica Z-ORDER pelas chaves do layout, apenas nas partições dos anos informados."""
+    layout = layout_da_tabela(tabela)
+    if not layout["ordenacao"] or layout["formato"] != "delta":
+        return
+
+    filtro = ""
+    anos = [ano for ano in (anos or []) if ano is not None]
+    if anos and layout["particao"]:
+        filtro = f" WHERE {layout['particao'][0]} IN ({', '.join(str(ano) for ano in sorted(anos))})"
+    spark.sql(f"OPTIMIZE {tabela}{filtro} ZORDER BY ({', '.join(layout['ordenacao'])})")
+
+
+def _coluna_particao(tabela):
+    colunas = spark.table(tabela).columns
+    return next((coluna for coluna in layout_da_tabela(tabela)["particao"] if coluna in colunas), None)
+
+
+def _predicado_particao(coluna, valor):
+    """Predicado SQL de uma partição, com IS NULL para a partição nula e o valor como literal entre aspas."""
+    if valor is None:
+        return f"`{coluna}` IS NULL"
+    literal = str(valor).replace("\\", "\\\\").replace("'", "\\'")
+    return f"`{coluna}` = '{literal}'"
+
+
+def _filtrar_particoes(tabela, valores):
+    coluna = _coluna_particao(tabela)
+    df = spark.table(tabela)
+    if not coluna:
+        return df
+    valores = list(valores)
+    filtro = col(coluna).isin([valor for valor in valores if valor is not None])
+    return df.where(filtro | col(coluna).isNull() if None in valores else filtro)
+
+
+def arquivos_por_particao(tabela, valores=None):
+    """Arquivos da versão atual da tabela e seus tamanhos no disco: {valor da partição: {caminho: bytes}}.
+
+    Usa a coluna oculta _metadata, sem ler as colunas de dados; o valor é None em tabelas sem partição.
+    """
+    coluna = _coluna_particao(tabela)
+    df = spark.table(tabela) if valores is None else _filtrar_particoes(tabela, valores)
+    linhas = (
+        df.select((col(coluna) if coluna else lit(None)).alias("particao"), "_metadata.file_path", "_metadata.file_size")
+        .distinct()
+        .collect()
+    )
+    arquivos = defaultdict(dict)
+    for linha in linhas:
+        arquivos[linha["particao"]][linha["file_path"]] = linha["file_size"]
+    return dict(arquivos)
+
+
+def particoes_para_compactar(tabela, valores=None):
+    """Partições (entre os valores informados, ou todas) com mais arquivos que o necessário para o
+    tamanho alvo, ou gravadas com outro codec.
+
+    Retorna {valor da partição: número de arquivos após a compactação}.
+    """
+    layout = layout_da_tabela(tabela)
+    alvo = tamanho_em_bytes(layout["tamanho_arquivo"])
+    planos = {}
+    for valor, arquivos in arquivos_por_particao(tabela, valores).items():
+        numero = max(1, math.ceil(sum(arquivos.values()) / alvo))
+        # Os arquivos Parquet levam o codec no nome (ex.: part-00000-...c000.zstd.parquet)
+        outro_codec = layout["compressao"] and any(
+            not caminho.endswith(f".{layout['compressao']}.parquet") for caminho in arquivos
+        )
+        if len(arquivos) > numero or outro_codec:
+            planos[valor] = numero
+    return planos
+
+
+def medir_particoes(tabela, valores, medir_varredura=False):
+    """Arquivos e bytes no disco das partições e, se pedido, o tempo de uma varredura de todas as colunas."""
+    arquivos = arquivos_por_particao(tabela, valores)
+    segundos = None
+    if medir_varredura:
+        inicio = time.perf_counter()
+        _filtrar_particoes(tabela, valores).write.format("noop").mode("overwrite").save()
+        segundos = time.perf_counter() - inicio
+    return {
+        "arquivos": sum(len(caminhos) for caminhos in arquivos.values()),
+        "bytes": sum(sum(caminhos.values()) for caminhos in arquivos.values()),
+        "segundos": segundos,
+    }
+
+
+def compactar_tabela(tabela, valores=None, medir_varredura=False):
+    """Regrava as partições com arquivos pequenos (ou de outro codec) no tamanho alvo do layout.
+
+    Apenas as partições informadas são consideradas (todas, se valores for None). Cada partição é
+    regravada com replaceWhere e dataChange = false, como no OPTIMIZE: os dados não mudam e as
+    leituras em streaming da tabela não recebem as linhas de novo. A regravação segue a ordenação, o
+    codec e os grupos de linhas do layout. Retorna as partições compactadas e as medidas de antes e
+    depois (com o tempo de varredura só se medir_varredura), ou None se não houver o que compactar.
+    """
+    layout = layout_da_tabela(tabela)
+    if layout["formato"] != "delta":
+        return None
+    planos = particoes_para_compactar(tabela, valores)
+    if not planos:
+        return None
+
+    coluna = _coluna_particao(tabela)
+    ordenacao = [coluna_ordem for coluna_ordem in layout["ordenacao"] if coluna_ordem in spark.table(tabela).columns]
+    antes = medir_particoes(tabela, planos, medir_varredura)
+    for valor, numero in planos.items():
+        df = _filtrar_particoes(tabela, [valor]).repartition(numero)
+        if ordenacao:
+            df = df.sortWithinPartitions(*ordenacao)
+        escritor = escritor_da_tabela(df, layout).option("dataChange", "false")
+        if coluna:
+            escritor = escritor.option("replaceWhere", _predicado_particao(coluna, valor))
+        escritor.saveAsTable(tabela)
+    return {"particoes": sorted(planos, key=str), "antes": antes, "depois": medir_particoes(tabela, planos, medir_varredura)}
+
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Criando um Dataframe por tipo de tabela, em uma única leitura:
+
+# COMMAND ----------
+
+# Dicionário para armazenar os DataFrames consolidados por tipo de tabela
+dfs_por_tipo = {}
+
+# Linhas que não respeitaram o esquema tipado, por tabela
+dfs_quarentena = {}
+
+# Leituras persistidas de onde saem as linhas válidas e a quarentena, liberadas após a gravação da bronze
+dfs_lidos = {}
+
+for tipo, arquivos in arquivos_a_ler.items():
+    with medir_etapa(metricas_etapas, ID_EXECUCAO, "leitura", tipo):
+        dfs_por_tipo[tipo], df_quarentena, df_lido = ler_tipo(tipo, arquivos)
+    if df_quarentena is not None:
+        dfs_quarentena[tipo] = df_quarentena
+        dfs_lidos[tipo] = df_lido
+    print(f"Tabela importada: {tipo} ({len(arquivos)} arquivos)")
+
+print(f"Tabelas consolidadas corretamente: {list(dfs_por_tipo.keys())}")
+
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Comparando a profundidade do plano e o número de jobs com a leitura antiga (um DataFrame por arquivo unido com `union`), apenas com `EXECUTAR_COMPARACOES = True`:
 
 # COMMAND ----------
 
-df.columns
+# Com True, executa as comparações com as implementações antigas. Ficam fora da carga normal: a
+# comparação da leitura relê os cabeçalhos e monta as duas leituras de uma amostra dos arquivos
+EXECUTAR_COMPARACOES = False
+
+
+def profundidade_plano(df):
+    """Profundidade da árvore do plano lógico analisado (cada nível ocupa 3 caracteres no treeString)."""
+    linhas = df._jdf.queryExecution().analyzed().treeString().splitlines()
+    return max(len(re.match(r"^[:+\- ]*", linha).group(0)) // 3 for linha in linhas) + 1
+
+
+def contar_jobs(funcao, grupo):
+    """Executa a função e retorna (resultado, número de jobs Spark disparados por ela)."""
+    sc = spark.sparkContext
+    sc.setJobGroup(grupo, grupo)
+    try:
+        resultado = funcao()
+    finally:
+        sc.setLocalProperty("spark.jobGroup.id", None)
+    return resultado, len(sc.statusTracker().getJobIdsForGroup(grupo))
+
+
+def ler_tipo_legado(arquivos):
+    """Leitura antiga: um DataFrame por arquivo, encadeados com union posicional."""
+    dfs = [
+        spark.read.option("header", "true").option("sep", ";").csv(arquivo.path)
+             .withColumn("Ano", F.lit(arquivo.name[:4]))
+        for arquivo in arquivos
+    ]
+    return reduce(lambda esquerda, direita: esquerda.union(direita), dfs)
+
+
+if EXECUTAR_COMPARACOES and arquivos_por_tipo:
+    # A amostra é o tipo com mais arquivos, onde a leitura antiga encadeia mais uniões
+    tipo, arquivos = max(arquivos_por_tipo.items(), key=lambda item: len(item[1]))
+    df_legado, jobs_antes = contar_jobs(lambda: ler_tipo_legado(arquivos), f"legado_{tipo}")
+    (df_novo, _, df_lido), jobs_depois = contar_jobs(lambda: ler_tipo(tipo, arquivos), f"varredura_{tipo}")
+    if df_lido is not None:
+        df_lido.unpersist()
+    print(
+        f"Tabela: {tipo}, Arquivos: {len(arquivos)}, "
+        f"Profundidade do plano: {profundidade_plano(df_legado)} -> {profundidade_plano(df_novo)}, "
+        f"Jobs: {jobs_antes} -> {jobs_depois}"
+    )
 
 
 # COMMAND ----------
 
+# MAGIC %md
+# MAGIC Confirmando a união das tabelas
 
-def clean_column_names(df):
-    # Mapeamento de caracteres para substituição
-    replace_map = {
-        " ": "_", ";": "", "{": "", "}": "", "(": "", ")": "",
-        "\n": "", "\t": "", "=": "", "º":"o",
-        "é": "e", "á": "a", "ã": "a", "ç": "c", "í": "i", "ó": "o",
-        "ú": "u", "â": "a", "ê": "e", "ô": "o", "à": "a", "è": "e",
-        "ì": "i", "ò": "o", "ù": "u", "ü": "u", "ï": "i", "ö": "o",
-        "ñ": "n", "õ": "o", "ý": "y", "ÿ": "y",
-        "Á": "a", "É": "e", "Í": "i", "Ó": "o", "Ú": "u", "Â": "a",
-        "Ê": "e", "Ô": "o", "À": "a", "È": "e", "Ì": "i", "Ò": "o",
-        "Ù": "u", "Ü": "u", "Ï": "i", "Ö": "o", "Ñ": "n", "Õ": "o",
-        "Ý": "y", "Ÿ": "y"
-    }
+# COMMAND ----------
 
-    cleaned_columns = []
-    for col in df.columns:
-        new_col = col
-        # Substitui caracteres conforme o dicionário
-        for old_char, new_char in replace_map.items():
-            new_col = new_col.replace(old_char, new_char)
-        # Converte para minúsculas
-        new_col = new_col.lower()
-        # Substitui caracteres especiais e prefixos com números
-        new_col = re.sub(r'\W|^(?=\d)', '_', new_col)
-        cleaned_columns.append(new_col)
-
-    # Renomeando as colunas no DataFrame
-    for old_name, new_name in zip(df.columns, cleaned_columns):
-        df = df.withColumnRenamed(old_name, new_name)
+dfs_por_tipo["carga"].columns
 
-    return df
 
-# Aplicando a função de limpeza a todos os DataFrames no dicionário dfs_consolidados
-for nome_tabela, df in dfs_consolidados.items():
-    dfs_consolidados[nome_tabela] = clean_column_names(df)
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Padronização dos nomes das colunas (as tabelas com esquema registrado já são lidas com os nomes normalizados)
 
-# Verifique os novos nomes das colunas de um DataFrame de exemplo
-print(dfs_consolidados[list(dfs_consolidados.keys())[0]].columns)
+# COMMAND ----------
+
+# Aplicando a função de limpeza a todos os DataFrames no dicionário dfs_por_tipo e incluindo as colunas Ano e hash_linha
+for nome_tabela, df in dfs_por_tipo.items():
+    with medir_etapa(metricas_etapas, ID_EXECUCAO, "renomeacao", nome_tabela):
+        dfs_por_tipo[nome_tabela] = incluir_hash_linha(incluir_ano(clean_column_names(df)))
+
+# Cada leitura é usada pela gravação da bronze e da prata (e a de atracacao pelas conferências abaixo):
+# fica em cache para que os arquivos CSV não sejam lidos e convertidos novamente a cada ação
+for nome_tabela, df in dfs_por_tipo.items():
+    consumidores = ["bronze", "prata"] + (["verificacao_ano", "exemplo"] if nome_tabela == "atracacao" else [])
+    registrar_cache(cache_etapas, f"leitura.{nome_tabela}", df, consumidores)
 
+# Verifique os novos nomes das colunas de um DataFrame de exemplo
+if dfs_por_tipo:
+    print(dfs_por_tipo[list(dfs_por_tipo.keys())[0]].columns)
 
 
 # COMMAND ----------
@@ -230,84 +676,127 @@ spark.sql("CREATE SCHEMA IF NOT EXISTS bronze")
 
 # COMMAND ----------
 
-# Salvando as tabelas no banco de dados com overwriteSchema habilitado
-for table_name, df in dfs_consolidados.items():
-    df.write.mode("overwrite").option("overwriteSchema", "true").saveAsTable(f"bronze.{table_name}")
+def gravar_bronze(tabela):
+    with consumir(cache_etapas, f"leitura.{tabela}", "bronze") as df, \
+         medir_etapa(metricas_etapas, ID_EXECUCAO, "gravacao_bronze", tabela):
+        gravar_tabela(df, f"bronze.{tabela}")
 
 
+def gravar_quarentena(tabela, df_quarentena):
+    with medir_etapa(metricas_etapas, ID_EXECUCAO, "gravacao_quarentena", tabela):
+        # A contagem lê a leitura persistida; tabelas sem linhas inválidas não geram commits vazios
+        linhas = df_quarentena.count()
+        if linhas:
+            df_quarentena.write.mode("append").options(**opcoes_append_idempotente(f"quarentena_{tabela}")).saveAsTable("bronze.quarentena")
+    if linhas:
+        print(f"🚧 Tabela: {tabela}, Linhas em quarentena nesta carga: {linhas}")
 
-# COMMAND ----------
 
-# Executar comando SQL para listar as tabelas
-spark.sql("SHOW TABLES IN bronze").show()
+# Salvando as tabelas no banco de dados, regravando apenas os anos afetados, e as linhas que não
+# respeitaram o esquema na tabela de quarentena (appends concorrentes no Delta não conflitam, e a
+# repetição de uma tarefa não duplica a quarentena: opcoes_append_idempotente)
+tarefas_bronze = {f"bronze.{tabela}": ([], partial(gravar_bronze, tabela)) for tabela in dfs_por_tipo}
+tarefas_bronze.update({
+    f"quarentena.{tabela}": ([], partial(gravar_quarentena, tabela, df_quarentena))
+    for tabela, df_quarentena in dfs_quarentena.items()
+})
+executar_grafo(tarefas_bronze)
+
+# As leituras em cache (leitura.<tabela>) já foram materializadas pela bronze e continuam disponíveis para a prata
+for df_lido in dfs_lidos.values():
+    df_lido.unpersist()
+
+print(f"Registros em quarentena: {spark.table('bronze.quarentena').count() if spark.catalog.tableExists('bronze.quarentena') else 0}")
 
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC Testando com um exemplo
+# MAGIC Comparando o tempo de análise do plano: renomeação antiga (um `withColumnRenamed` por coluna, `renomear_coluna_a_coluna`) x projeção única, apenas com `EXECUTAR_COMPARACOES = True`
 
 # COMMAND ----------
 
-spark.sql("DESCRIBE bronze.2020atracacao").show()
 
-# COMMAND ----------
+def tempo_analise(funcao, df, repeticoes=5):
+    """Mediana, em ms, do tempo para montar e analisar o plano da renomeação."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(df)._jdf.queryExecution().assertAnalyzed()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return sorted(tempos)[len(tempos) // 2]
+
 
-spark.sql("SELECT * FROM bronze.2020atracacao LIMIT 10").show()
+# Tabelas da ANTAQ gravadas na bronze; o manifesto e a quarentena são tabelas de controle e ficam de fora
+TABELAS_CONTROLE_BRONZE = {TABELA_MANIFESTO.split(".")[1], "quarentena"}
 
+if EXECUTAR_COMPARACOES:
+    tabelas_bronze = [
+        tabela.name for tabela in spark.catalog.listTables("bronze")
+        if not tabela.isTemporary and tabela.name not in TABELAS_CONTROLE_BRONZE
+    ]
+    total_legado, total_novo = 0.0, 0.0
+
+    for tabela in tabelas_bronze:
+        # Restaura os nomes originais dos cabeçalhos, quando a tabela tem esquema registrado
+        nomes_originais = {normalizar_nome_coluna(nome): nome for nome, _ in ESQUEMAS_ANTAQ.get(tabela, [])}
+        df_bruto = spark.table(f"bronze.{tabela}")
+        df_bruto = df_bruto.toDF(*[nomes_originais.get(nome, nome) for nome in df_bruto.columns])
+
+        ms_legado = tempo_analise(renomear_coluna_a_coluna, df_bruto)
+        ms_novo = tempo_analise(clean_column_names, df_bruto)
+        total_legado += ms_legado
+        total_novo += ms_novo
+        print(f"Tabela: {tabela}, Colunas: {len(df_bruto.columns)}, Análise: {ms_legado:.1f} ms -> {ms_novo:.1f} ms")
+
+    print(f"Total: {total_legado:.1f} ms -> {total_novo:.1f} ms")
 
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC Unir todas as tabelas do mesmo tipo:
+# MAGIC Compactação da bronze: entre as partições gravadas nesta carga (`particoes_afetadas`), as que ficaram com arquivos pequenos (leituras em várias partes) ou com outro codec são regravadas no tamanho alvo, com a ordenação e o codec do layout. As tabelas de controle (manifesto e quarentena) e as partições não alteradas ficam de fora. O relatório compara arquivos e bytes no disco antes e depois, e o tempo de varredura das partições apenas com `EXECUTAR_COMPARACOES = True`.
 
 # COMMAND ----------
 
-# Defina a lista de anos antes de usar
-anos = ['2020', '2021', '2022', '2023', '2024']
+def compactar_bronze(tabela):
+    with medir_etapa(metricas_etapas, ID_EXECUCAO, "compactacao_bronze", tabela):
+        return compactar_tabela(f"bronze.{tabela}", particoes_afetadas[tabela], EXECUTAR_COMPARACOES)
 
-# Verificando as chaves em dfs_consolidados
-print("Tabelas carregadas em dfs_consolidados:")
-print(list(dfs_consolidados.keys()))
 
-# Dicionário para armazenar os DataFrames consolidados por tipo de tabela
-dfs_por_tipo = {}
+# Apenas as tabelas de dados gravadas nesta carga (dfs_por_tipo, sem manifesto e quarentena), nas partições que receberam arquivos
+compactacoes = executar_grafo({
+    f"compactacao.{tabela}": ([], partial(compactar_bronze, tabela)) for tabela in dfs_por_tipo
+})
 
-# Tipos de tabelas a serem processados
-tipos_tabelas = [
-    "Atracacao", "Carga_Conteinerizada", "Carga_Hidrovia", "Carga_Regiao", "Carga_Rio", 
-    "TaxaOcupacao", "TaxaOcupacaoComCarga", "TaxaOcupacaoTOAtracacao", "TemposAtracacao", 
-    "TemposAtracacaoParalisacao", "Carga"
-]
+for nome_tarefa, resultado in sorted(compactacoes.items()):
+    tabela = nome_tarefa.split(".", 1)[1]
+    if resultado is None:
+        print(f"Tabela: {tabela}, nada a compactar")
+        continue
+    antes, depois = resultado["antes"], resultado["depois"]
+    varredura = f", Varredura: {antes['segundos']:.1f} s -> {depois['segundos']:.1f} s" if antes["segundos"] is not None else ""
+    print(
+        f"🧱 Tabela: {tabela}, Partições: {resultado['particoes']}, Arquivos: {antes['arquivos']} -> {depois['arquivos']}, "
+        f"Disco: {antes['bytes'] / 1024 ** 2:.1f} MB -> {depois['bytes'] / 1024 ** 2:.1f} MB{varredura}"
+    )
 
-# Loop para processar cada tipo de tabela
-for tipo in tipos_tabelas:
-    dfs_anos_tipo = []  # Lista para armazenar os DataFrames de todos os anos para o tipo de tabela
-    
-    for ano in anos:
-        tabela = f"{ano}{tipo}"  # Nome da tabela para o ano e tipo
-        
-        # Verifica se a tabela existe no dicionário de DataFrames
-        if tabela in dfs_consolidados:
-            print(f"Carregando tabela: {tabela}")  # Mensagem de diagnóstico
-            
-            # Adiciona uma coluna "Ano" ao DataFrame antes da união
-            df_com_ano = dfs_consolidados[tabela].withColumn("Ano", F.lit(ano))
-            dfs_anos_tipo.append(df_com_ano)
-        else:
-            print(f"Tabela {tabela} não encontrada.")  # Mensagem de erro para tabela não encontrada
 
-    # Unindo todos os anos para o tipo específico
-    if dfs_anos_tipo:
-        df_tipo_consolidado = dfs_anos_tipo[0]
-        for df in dfs_anos_tipo[1:]:
-            df_tipo_consolidado = df_tipo_consolidado.union(df)
+# COMMAND ----------
 
-        # Adicionando ao dicionário de DataFrames por tipo com o nome da tabela em minúsculas
-        dfs_por_tipo[tipo.lower()] = df_tipo_consolidado
+# Executar comando SQL para listar as tabelas
+spark.sql("SHOW TABLES IN bronze").show()
 
-# Verifique os novos nomes das colunas de um DataFrame de exemplo em dfs_por_tipo
-print(dfs_por_tipo[list(dfs_por_tipo.keys())[0]].columns)
+# COMMAND ----------
 
+# MAGIC %md
+# MAGIC Testando com um exemplo
+
+# COMMAND ----------
+
+spark.sql("DESCRIBE bronze.atracacao").show()
+
+# COMMAND ----------
+
+spark.sql("SELECT * FROM bronze.atracacao WHERE Ano = 2020 LIMIT 10").show()
 
 
 # COMMAND ----------
@@ -317,7 +806,8 @@ print(dfs_por_tipo[list(dfs_por_tipo.keys())[0]].columns)
 
 # COMMAND ----------
 
-dfs_por_tipo["atracacao"].select("Ano").distinct().show()
+with consumir(cache_etapas, "leitura.atracacao", "verificacao_ano") as df:
+    df.select("Ano").distinct().show()
 
 
 # COMMAND ----------
@@ -337,8 +827,8 @@ print(list(dfs_por_tipo.keys()))
 # COMMAND ----------
 
 # Supondo que você queira ver as 5 primeiras linhas de uma tabela específica dentro do dicionário
-df_exemplo = dfs_por_tipo['atracacao']  
-df_exemplo.head()
+with consumir(cache_etapas, "leitura.atracacao", "exemplo") as df_exemplo:
+    df_exemplo.head()
 
 # COMMAND ----------
 
@@ -374,9 +864,88 @@ spark.sql("CREATE SCHEMA IF NOT EXISTS prata")
 
 # COMMAND ----------
 
-# Salvando as tabelas no esquema prata com overwriteSchema habilitado
-for table_name, df in dfs_por_tipo.items():
-    df.write.mode("overwrite").option("overwriteSchema", "true").saveAsTable(f"prata.{table_name}")
+# MAGIC %md
+# MAGIC Converter as datas para timestamp e calcular os tempos de atracação (T1 a T4, TA e TE) com expressões nativas do Spark (`preparar_prata`, em `antaq_spark.py`)
+
+# COMMAND ----------
+
+def gravar_prata(tabela):
+    with consumir(cache_etapas, f"leitura.{tabela}", "prata") as df, \
+         medir_etapa(metricas_etapas, ID_EXECUCAO, "gravacao_prata", tabela):
+        gravar_tabela(preparar_prata(tabela, df), f"prata.{tabela}")
+
+
+def otimizar_prata(tabela):
+    with medir_etapa(metricas_etapas, ID_EXECUCAO, "otimizacao_prata", tabela):
+        otimizar_tabela(f"prata.{tabela}", particoes_afetadas[tabela])
+
+
+# Salvando as tabelas no esquema prata, regravando apenas os anos afetados; cada tabela é otimizada
+# assim que termina de ser gravada, em paralelo com a gravação das demais
+tarefas_prata = {}
+for table_name in dfs_por_tipo:
+    tarefas_prata[f"prata.{table_name}"] = ([], partial(gravar_prata, table_name))
+    tarefas_prata[f"otimizacao.{table_name}"] = ([f"prata.{table_name}"], partial(otimizar_prata, table_name))
+executar_grafo(tarefas_prata)
+
+# As tabelas da prata são relidas pelas verificações de qualidade a seguir (perfil, duplicados,
+# perfil após o tratamento de nulos e, para atracacao e temposatracacao, a conferência dos tempos)
+for tabela in [t.name for t in spark.catalog.listTables("prata")]:
+    consumidores = ["perfil", "duplicados", "perfil_tratada"]
+    if tabela in ("atracacao", "temposatracacao") and anos_afetados_por("atracacao", "temposatracacao"):
+        consumidores.append("tempos")
+    registrar_cache(cache_etapas, f"prata.{tabela}", spark.table(f"prata.{tabela}"), consumidores, origens=[f"prata.{tabela}"])
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Atualizar o manifesto assim que os arquivos novos estão gravados na bronze e na prata (o executar_grafo levanta erro se alguma gravação falhar): uma falha nas etapas seguintes não faz os mesmos arquivos serem recarregados na próxima execução. Se a ouro falhar, basta executar novamente as células a partir dela, enquanto `particoes_afetadas` ainda estiver em memória.
+
+# COMMAND ----------
+
+if entradas_manifesto:
+    spark.createDataFrame(entradas_manifesto).write.mode("overwrite").option("overwriteSchema", "true").saveAsTable(TABELA_MANIFESTO)
+
+spark.table(TABELA_MANIFESTO).groupBy("tabela").agg(F.count("*").alias("arquivos"), F.sum("tamanho").alias("bytes")).show()
+
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Conferir os tempos calculados a partir das datas com os tempos informados em temposatracacao
+
+# COMMAND ----------
+
+TOLERANCIA_HORAS = 0.01
+
+anos_tempos = anos_afetados_por("atracacao", "temposatracacao")
+if anos_tempos:
+    # Todas as comparações em uma única agregação
+    expressoes = []
+    for nome in DURACOES_ATRACACAO:
+        diferenca = F.abs(F.col(nome) - F.col(f"{nome}_informado"))
+        expressoes += [
+            F.count(diferenca).alias(f"{nome}_comparados"),
+            F.count(F.when(diferenca > TOLERANCIA_HORAS, 1)).alias(f"{nome}_divergentes"),
+            F.max(diferenca).alias(f"{nome}_maior_diferenca"),
+        ]
+
+    with consumir(cache_etapas, "prata.atracacao", "tempos") as atracacao, \
+         consumir(cache_etapas, "prata.temposatracacao", "tempos") as temposatracacao, \
+         medir_etapa(metricas_etapas, ID_EXECUCAO, "qualidade_tempos", "atracacao"):
+        calculados = atracacao.filter(F.col("Ano").isin(anos_tempos)).select("idatracacao", *DURACOES_ATRACACAO)
+        informados = temposatracacao.select(
+            "idatracacao", *[F.col(coluna).alias(f"{nome}_informado") for nome, (_, _, coluna) in DURACOES_ATRACACAO.items()]
+        )
+        resultado = calculados.join(informados, on="idatracacao").agg(*expressoes).collect()[0]
+
+    for nome in DURACOES_ATRACACAO:
+        print(
+            f"⏱️ {nome}: comparados {resultado[f'{nome}_comparados']}, "
+            f"divergentes {resultado[f'{nome}_divergentes']}, "
+            f"maior diferença {resultado[f'{nome}_maior_diferenca']} h"
+        )
+
 
 # COMMAND ----------
 
@@ -413,15 +982,95 @@ spark.sql("DROP TABLE IF EXISTS prata.atracacao_limpa")
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC Verificar existência de valores nulos
+# MAGIC Perfil dos dados: nulos, distintos (aproximado), mínimo/máximo e valores mais frequentes de todas as colunas em uma única agregação por tabela
+
+# COMMAND ----------
+
+spark.sql("CREATE SCHEMA IF NOT EXISTS qualidade")
+
+TABELA_PROFILING = "qualidade.profiling"
+
+
+def perfilar_tabela(df, tabela, etapa, top_k=5):
+    """Calcula o perfil de todas as colunas em uma única passada e retorna uma linha por coluna."""
+    expressoes = [F.count(F.lit(1)).alias("total_linhas")]
+    for i, coluna in enumerate(df.columns):
+        c = F.col(f"`{coluna}`")
+        expressoes += [
+            F.count(F.when(c.isNull(), 1)).alias(f"{i}_nulos"),
+            F.approx_count_distinct(c).alias(f"{i}_distintos"),
+            F.min(c).cast("string").alias(f"{i}_minimo"),
+            F.max(c).cast("string").alias(f"{i}_maximo"),
+            F.to_json(F.expr(f"approx_top_k(`{coluna}`, {top_k})")).alias(f"{i}_frequentes"),
+        ]
+    resultado = df.agg(*expressoes).collect()[0]
+
+    return [
+        Row(
+            id_execucao=ID_EXECUCAO,
+            etapa=etapa,
+            tabela=tabela,
+            coluna=coluna,
+            tipo=tipo_coluna,
+            total_linhas=resultado["total_linhas"],
+            nulos=resultado[f"{i}_nulos"],
+            distintos_aprox=resultado[f"{i}_distintos"],
+            minimo=resultado[f"{i}_minimo"],
+            maximo=resultado[f"{i}_maximo"],
+            valores_frequentes=resultado[f"{i}_frequentes"],
+            data_execucao=datetime.now(),
+        )
+        for i, (coluna, tipo_coluna) in enumerate(df.dtypes)
+    ]
 
-# COMMAND ----------
 
+def perfil_anterior(tabela, etapa):
+    """Perfil da última execução anterior para a tabela e etapa, indexado pela coluna."""
+    if not spark.catalog.tableExists(TABELA_PROFILING):
+        return {}
+    anteriores = spark.table(TABELA_PROFILING).filter(
+        (F.col("tabela") == tabela) & (F.col("etapa") == etapa) & (F.col("id_execucao") < ID_EXECUCAO)
+    )
+    ultima = anteriores.agg(F.max("id_execucao")).collect()[0][0]
+    if ultima is None:
+        return {}
+    return {linha["coluna"]: linha for linha in anteriores.filter(F.col("id_execucao") == ultima).collect()}
+
+
+def gravar_perfil(linhas_perfil, etapa):
+    if linhas_perfil:
+        (spark.createDataFrame(linhas_perfil).write.mode("append")
+              .options(**opcoes_append_idempotente(f"profiling_{etapa}")).saveAsTable(TABELA_PROFILING))
+
+
+def imprimir_perfil(tabela, linhas_perfil, anterior):
+    """Mostra os nulos por coluna e a variação em relação à carga anterior."""
+    print(f"🔍 Tabela: {tabela}, Total de registros: {linhas_perfil[0]['total_linhas'] if linhas_perfil else 0}")
+    nulos = {linha["coluna"]: linha["nulos"] for linha in linhas_perfil}
+    print(f"🚨 Valores nulos por coluna: {nulos}")
+    for linha in linhas_perfil:
+        antes = anterior.get(linha["coluna"])
+        if antes is not None and antes["nulos"] != linha["nulos"]:
+            print(f"    Δ {linha['coluna']}: nulos {antes['nulos']} -> {linha['nulos']}")
+    print()
+
+
+def perfilar_prata(tabela):
+    with consumir(cache_etapas, f"prata.{tabela}", "perfil") as df, \
+         medir_etapa(metricas_etapas, ID_EXECUCAO, "qualidade_perfil", tabela):
+        return perfilar_tabela(df, tabela, "prata")
+
+
+# Os perfis são calculados em paralelo e impressos na ordem das tabelas
+perfis_por_tabela = executar_grafo({table: ([], partial(perfilar_prata, table)) for table in tabela_lista})
+
+perfis = []
 for table in tabela_lista:
-    df = spark.sql(f"SELECT * FROM prata.{table}")
-    null_counts = {col: df.filter(df[col].isNull()).count() for col in df.columns}
-    print(f"🔍 Tabela: {table}")
-    print(f"🚨 Valores nulos por coluna: {null_counts}\n")
+    linhas_perfil = perfis_por_tabela[table]
+    imprimir_perfil(table, linhas_perfil, perfil_anterior(table, "prata"))
+    perfis += linhas_perfil
+
+gravar_perfil(perfis, "prata")
 
 
 # COMMAND ----------
@@ -431,31 +1080,24 @@ for table in tabela_lista:
 
 # COMMAND ----------
 
-for table in tabela_lista:
-    # Obter os nomes das colunas da tabela
-    df = spark.table(f"prata.{table}")  
-    colunas = df.columns  # Lista de colunas da tabela
+def contar_duplicados(df):
+    """Quantidade de grupos duplicados: valores de hash_linha que aparecem em mais de uma linha."""
+    return (
+        df.groupBy("hash_linha").count()
+          .filter(F.col("count") > 1)
+          .count()
+    )
 
-    if not colunas:  # Se a tabela estiver vazia, pule
-        print(f"⚠️ Tabela {table} não tem colunas.")
-        continue
-
-    colunas_str = ", ".join([f"`{col}`" for col in colunas])  # Protege nomes de colunas com acentos/espaços
-
-    # Query para contar registros duplicados
-    count_duplicates = spark.sql(f"""
-        SELECT COUNT(*) 
-        FROM (
-            SELECT {colunas_str}, COUNT(*) AS cnt 
-            FROM prata.{table}
-            GROUP BY {colunas_str}
-            HAVING COUNT(*) > 1
-        )
-    """).collect()[0][0]
-
-    print(f"🛑 Tabela: {table}, Registros duplicados: {count_duplicates}")
 
+for table in tabela_lista:
+    with consumir(cache_etapas, f"prata.{table}", "duplicados") as df:
+        if "hash_linha" not in df.columns:
+            print(f"⚠️ Tabela {table} não tem a coluna hash_linha.")
+            continue
 
+        with medir_etapa(metricas_etapas, ID_EXECUCAO, "qualidade_duplicados", table):
+            count_duplicates = contar_duplicados(df)
+    print(f"🛑 Tabela: {table}, Grupos de registros duplicados: {count_duplicates}")
 
 
 # COMMAND ----------
@@ -468,18 +1110,20 @@ for table in tabela_lista:
 # Lista de tabelas para as quais queremos substituir valores nulos
 tabelas_para_substituir = ["atracacao", "carga"]
 
+perfis = []
 for table in tabela_lista:
-    df = spark.sql(f"SELECT * FROM prata.{table}")
-    
-    if table in tabelas_para_substituir:
-        # Substituir valores nulos por "Desconhecido"
-        df = df.fillna("Desconhecido")
-    
-    # Contar valores nulos por coluna após a substituição (deve ser 0 para todas as colunas se a substituição foi feita)
-    null_counts = {col: df.filter(df[col].isNull()).count() for col in df.columns}
-    
-    print(f"🔍 Tabela: {table}")
-    print(f"🚨 Valores nulos por coluna após substituição: {null_counts}\n")
+    with consumir(cache_etapas, f"prata.{table}", "perfil_tratada") as df:
+        if table in tabelas_para_substituir:
+            # Substituir valores nulos por "Desconhecido"
+            df = df.fillna("Desconhecido")
+
+        # Perfil após a substituição (nulos devem ser 0 nas colunas de texto das tabelas tratadas)
+        with medir_etapa(metricas_etapas, ID_EXECUCAO, "qualidade_perfil_tratada", table):
+            linhas_perfil = perfilar_tabela(df, table, "prata_tratada")
+    imprimir_perfil(table, linhas_perfil, perfil_anterior(table, "prata_tratada"))
+    perfis += linhas_perfil
+
+gravar_perfil(perfis, "prata_tratada")
 
 
 # COMMAND ----------
@@ -489,13 +1133,157 @@ for table in tabela_lista:
 
 # COMMAND ----------
 
-spark.sql("""
-    CREATE OR REPLACE TABLE prata.carga_conteinerizada AS
-    SELECT DISTINCT * 
-    FROM prata.carga_conteinerizada
-""")
+# Remover duplicados pelo hash_linha, regravando apenas os anos afetados nesta carga
+tabelas_para_deduplicar = ["carga_conteinerizada"]
+
+for table in tabelas_para_deduplicar:
+    anos_afetados = [ano for ano in particoes_afetadas.get(table, []) if ano is not None]
+    if not anos_afetados:
+        continue
+    df = spark.table(f"prata.{table}").filter(F.col("Ano").isin(anos_afetados))
+    with medir_etapa(metricas_etapas, ID_EXECUCAO, "deduplicacao_prata", table):
+        gravar_tabela(df.dropDuplicates(["hash_linha"]), f"prata.{table}")
+
+
 
+# COMMAND ----------
 
+# MAGIC %md
+# MAGIC Verificar a integridade referencial entre as tabelas de fatos com anti-joins em broadcast
+
+# COMMAND ----------
+
+# Um anti-join completo entre filha e pai embaralha (shuffle) as duas tabelas. Aqui as chaves
+# distintas de cada pai são calculadas uma vez, persistidas e enviadas por broadcast: cada filha é
+# lida uma única vez nos anos afetados, agregada por chave, e o left_anti contra as chaves do pai
+# encontra as órfãs sem shuffle das tabelas grandes. A verificação é exata.
+
+TABELA_INTEGRIDADE = "qualidade.integridade_referencial"
+
+ESQUEMA_INTEGRIDADE = """
+    id_execucao STRING, tabela STRING, coluna STRING, tabela_pai STRING, coluna_pai STRING, anos STRING,
+    linhas BIGINT, chaves_nulas BIGINT, suspeitas BIGINT, orfas BIGINT, chaves_orfas BIGINT,
+    amostra_orfas ARRAY<BIGINT>, data_execucao TIMESTAMP
+"""
+
+# (tabela filha, coluna) -> (tabela pai, coluna)
+RELACOES_INTEGRIDADE = {
+    ("carga", "idatracacao"): ("atracacao", "idatracacao"),
+    ("temposatracacao", "idatracacao"): ("atracacao", "idatracacao"),
+    ("temposatracacaoparalisacao", "idatracacao"): ("temposatracacao", "idatracacao"),
+    ("carga_conteinerizada", "idcarga"): ("carga", "idcarga"),
+    ("carga_rio", "idcarga"): ("carga", "idcarga"),
+    ("carga_hidrovia", "idcarga"): ("carga", "idcarga"),
+    ("carga_regiao", "idcarga"): ("carga", "idcarga"),
+}
+
+TAMANHO_AMOSTRA_ORFAS = 20
+
+
+def chaves_do_pai(pai, coluna_pai):
+    """Chaves distintas não nulas do pai, persistidas para as filhas que o referenciam."""
+    return (
+        spark.table(f"prata.{pai}")
+             .select(F.col(coluna_pai).alias("chave"))
+             .filter(F.col("chave").isNotNull())
+             .distinct()
+             .persist()
+    )
+
+
+def verificar_relacao(filha, coluna, pai, coluna_pai, chaves_pai, anos):
+    """Agrega a filha por chave em uma única leitura e procura as chaves ausentes no pai; retorna o registro da verificação."""
+    df = spark.table(f"prata.{filha}")
+    if anos and not CARGA_COMPLETA:
+        df = df.filter(F.col("Ano").isin(anos))
+
+    # Agregação parcial nos executores: uma linha por chave da filha, com o número de linhas
+    resumo = df.groupBy(F.col(coluna).alias("chave")).count().persist()
+    totais = resumo.agg(
+        F.sum("count").alias("linhas"),
+        F.sum(F.when(F.col("chave").isNull(), F.col("count"))).alias("chaves_nulas"),
+    ).collect()[0]
+
+    confirmadas = (
+        resumo.filter(F.col("chave").isNotNull())
+              .join(F.broadcast(chaves_pai), on="chave", how="left_anti")
+              .persist()
+    )
+    resultado = confirmadas.agg(F.sum("count"), F.count(F.lit(1))).collect()[0]
+    orfas, chaves_orfas = resultado[0] or 0, resultado[1]
+    amostra = []
+    if chaves_orfas:
+        amostra = [linha["chave"] for linha in confirmadas.orderBy("chave").limit(TAMANHO_AMOSTRA_ORFAS).collect()]
+    confirmadas.unpersist()
+    resumo.unpersist()
+
+    # suspeitas é mantida no esquema da tabela; com a verificação exata, é igual a orfas
+    return Row(
+        id_execucao=ID_EXECUCAO,
+        tabela=filha,
+        coluna=coluna,
+        tabela_pai=pai,
+        coluna_pai=coluna_pai,
+        anos=",".join(str(ano) for ano in anos) if anos and not CARGA_COMPLETA else "todos",
+        linhas=totais["linhas"] or 0,
+        chaves_nulas=totais["chaves_nulas"] or 0,
+        suspeitas=orfas,
+        orfas=orfas,
+        chaves_orfas=chaves_orfas,
+        amostra_orfas=amostra,
+        data_execucao=datetime.now(),
+    )
+
+
+def gravar_integridade(registros):
+    if registros:
+        (spark.createDataFrame(registros, ESQUEMA_INTEGRIDADE).write.mode("append")
+              .options(**opcoes_append_idempotente("integridade")).saveAsTable(TABELA_INTEGRIDADE))
+
+
+# Só as relações com anos novos na filha ou no pai são verificadas; as chaves de cada pai são todas as
+# da tabela, pois a filha pode referenciar um registro de outro ano
+anos_relacao = {
+    relacao: anos_afetados_por(relacao[0], pai)
+    for relacao, (pai, _) in RELACOES_INTEGRIDADE.items()
+}
+relacoes_a_verificar = {
+    relacao: destino for relacao, destino in RELACOES_INTEGRIDADE.items() if anos_relacao[relacao] or CARGA_COMPLETA
+}
+chaves_pais = {}
+
+
+def montar_chaves(pai, coluna_pai):
+    with medir_etapa(metricas_etapas, ID_EXECUCAO, "qualidade_chaves_pai", pai):
+        chaves = chaves_do_pai(pai, coluna_pai)
+        quantidade = chaves.count()
+    chaves_pais[(pai, coluna_pai)] = chaves
+    print(f"🔑 Chaves de {pai}.{coluna_pai}: {quantidade}")
+
+
+def verificar_integridade(filha, coluna, pai, coluna_pai):
+    with medir_etapa(metricas_etapas, ID_EXECUCAO, "qualidade_integridade", filha):
+        return verificar_relacao(filha, coluna, pai, coluna_pai, chaves_pais[(pai, coluna_pai)], anos_relacao[(filha, coluna)])
+
+
+tarefas_integridade = {}
+for (filha, coluna), (pai, coluna_pai) in relacoes_a_verificar.items():
+    tarefas_integridade[f"chaves.{pai}.{coluna_pai}"] = ([], partial(montar_chaves, pai, coluna_pai))
+    tarefas_integridade[f"integridade.{filha}.{coluna}"] = (
+        [f"chaves.{pai}.{coluna_pai}"], partial(verificar_integridade, filha, coluna, pai, coluna_pai)
+    )
+resultados_integridade = executar_grafo(tarefas_integridade)
+
+registros_integridade = [resultados_integridade[f"integridade.{filha}.{coluna}"] for filha, coluna in relacoes_a_verificar]
+for registro in registros_integridade:
+    print(
+        f"🔗 {registro['tabela']}.{registro['coluna']} -> {registro['tabela_pai']}.{registro['coluna_pai']}: "
+        f"{registro['linhas']} linhas, {registro['chaves_nulas']} chaves nulas, {registro['orfas']} órfãs "
+        f"({registro['chaves_orfas']} chaves), amostra: {registro['amostra_orfas'][:5]}"
+    )
+gravar_integridade(registros_integridade)
+for chaves in chaves_pais.values():
+    chaves.unpersist()
 
 # COMMAND ----------
 
@@ -538,12 +1326,730 @@ for table in tabela_lista:
 
 # COMMAND ----------
 
+def gravar_ouro(tabela, anos_afetados):
+    # Carregar do esquema "prata" apenas os anos afetados nesta carga
+    df = spark.table(f"prata.{tabela}")
+    if anos_afetados and not CARGA_COMPLETA:
+        df = df.filter(F.col("Ano").isin(anos_afetados))
+
+    # Salvar o DataFrame no esquema "ouro", regravando apenas os anos afetados
+    with medir_etapa(metricas_etapas, ID_EXECUCAO, "gravacao_ouro", tabela):
+        gravar_tabela(df, f"ouro.{tabela}")
+
+
+def otimizar_ouro(tabela, anos_afetados):
+    with medir_etapa(metricas_etapas, ID_EXECUCAO, "otimizacao_ouro", tabela):
+        otimizar_tabela(f"ouro.{tabela}", anos_afetados)
+
+
+tarefas_ouro = {}
 for table in tabela_lista:
-    # Carregar a tabela do esquema "prata"
-    df = spark.sql(f"SELECT * FROM prata.{table}")
-    
-    # Salvar o DataFrame no novo esquema "ouro" com a opção overwriteSchema
-    df.write.option("overwriteSchema", "true").mode("overwrite").saveAsTable(f"ouro.{table}")
+    if table not in particoes_afetadas:
+        continue
+    anos_afetados = [ano for ano in particoes_afetadas[table] if ano is not None]
+    tarefas_ouro[f"ouro.{table}"] = ([], partial(gravar_ouro, table, anos_afetados))
+    tarefas_ouro[f"otimizacao.{table}"] = ([f"ouro.{table}"], partial(otimizar_ouro, table, anos_afetados))
+executar_grafo(tarefas_ouro)
+
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Modelo estrela da camada ouro: dimensões de porto, berço, terminal, mercadoria e local (origem/destino), e dimensões pequenas para os textos de baixa cardinalidade (tipo de navegação, tipo de operação, natureza da carga e sentido), todas com chaves substitutas inteiras, e tabelas fato apenas com as chaves e as medidas. Os atributos das chaves já cadastradas são atualizados por MERGE a cada carga (tipo 1, sem histórico)
+
+# COMMAND ----------
+
+
+def atualizar_dimensao(nome_dimensao, df_atributos, chave_natural, coluna_sk):
+    """Inclui na dimensão as chaves naturais ainda não cadastradas, com chaves substitutas sequenciais.
+
+    As chaves já existentes são preservadas entre cargas, para que as tabelas fato antigas continuem válidas,
+    e os seus atributos são sobrescritos pelos da carga atual (MERGE, tipo 1: sem histórico das versões).
+    """
+    tabela = f"ouro.{nome_dimensao}"
+    invalidar_tabela(cache_consultas, tabela)
+    df_atributos = df_atributos.filter(F.col(chave_natural).isNotNull()).dropDuplicates([chave_natural])
+
+    existe = spark.catalog.tableExists(tabela) and not CARGA_COMPLETA
+    maior_sk = 0
+    novos = df_atributos
+    if existe:
+        existentes = spark.table(tabela)
+        maior_sk = existentes.agg(F.max(coluna_sk)).collect()[0][0] or 0
+        novos = novos.join(existentes.select(chave_natural), on=chave_natural, how="left_anti")
+    novos = novos.withColumn(coluna_sk, (F.row_number().over(Window.orderBy(chave_natural)) + maior_sk).cast("int"))
+    novos = novos.select(coluna_sk, *[coluna for coluna in novos.columns if coluna != coluna_sk])
+
+    if not existe:
+        novos.write.mode("overwrite").option("overwriteSchema", "true").saveAsTable(tabela)
+        return
+
+    # Chaves novas entram com as chaves substitutas seguintes; as existentes só são reescritas se algum atributo mudou
+    atributos = [coluna for coluna in df_atributos.columns if coluna != chave_natural]
+    mescla = (
+        DeltaTable.forName(spark, tabela).alias("d")
+                  .merge(df_atributos.join(novos.select(chave_natural, coluna_sk), on=chave_natural, how="left").alias("n"),
+                         f"d.{chave_natural} = n.{chave_natural}")
+    )
+    if atributos:
+        mescla = mescla.whenMatchedUpdate(
+            condition=" OR ".join(f"NOT (d.{coluna} <=> n.{coluna})" for coluna in atributos),
+            set={coluna: f"n.{coluna}" for coluna in atributos},
+        )
+    mescla.whenNotMatchedInsert(values={coluna: f"n.{coluna}" for coluna in novos.columns}).execute()
+
+
+def ler_tabela_apoio(tabela, colunas):
+    """Tabela de apoio da camada prata com as colunas renomeadas ({origem: destino}), ou None se não existir."""
+    if not spark.catalog.tableExists(f"prata.{tabela}"):
+        return None
+    return spark.table(f"prata.{tabela}").select([F.col(origem).alias(destino) for origem, destino in colunas.items()])
+
+
+def atualizar_dimensoes(anos):
+    """Atualiza as dimensões a partir das atracações e cargas dos anos afetados e das tabelas de apoio."""
+    atracacao = spark.table("ouro.atracacao").filter(F.col("Ano").isin(anos))
+    carga = spark.table("ouro.carga").filter(F.col("Ano").isin(anos))
+
+    atualizar_dimensao(
+        "dim_porto",
+        atracacao.select(
+            "cdtup", "porto_atracacao", "complexo_portuario", "tipo_da_autoridade_portuaria",
+            "municipio", "uf", "sguf", "regiao_geografica", "regiao_hidrografica", "coordenadas",
+        ),
+        "cdtup", "sk_porto",
+    )
+    portos = spark.table("ouro.dim_porto").select("cdtup", "sk_porto")
+
+    atualizar_dimensao(
+        "dim_berco",
+        atracacao.select("idberco", "berco", "cdtup").join(F.broadcast(portos), on="cdtup", how="left").drop("cdtup"),
+        "idberco", "sk_berco",
+    )
+    atualizar_dimensao("dim_terminal", atracacao.select("terminal"), "terminal", "sk_terminal")
+
+    # Textos de baixa cardinalidade dos fatos: uma dimensão pequena por atributo. O tipo de navegação
+    # da atracação e o da carga têm o mesmo domínio e compartilham a dim_navegacao
+    navegacoes = atracacao.select(F.col("tipo_de_navegacao_da_atracacao").alias("tipo_navegacao")).unionByName(carga.select("tipo_navegacao"))
+    atualizar_dimensao("dim_navegacao", navegacoes, "tipo_navegacao", "sk_navegacao")
+    atualizar_dimensao("dim_operacao", atracacao.select("tipo_de_operacao"), "tipo_de_operacao", "sk_operacao")
+    atualizar_dimensao("dim_natureza_carga", carga.select("natureza_da_carga"), "natureza_da_carga", "sk_natureza_carga")
+    atualizar_dimensao("dim_sentido", carga.select("sentido"), "sentido", "sk_sentido")
+
+    # Mercadorias: códigos presentes nas cargas mais os do cadastro, com os atributos do cadastro
+    mercadorias = carga.select("cdmercadoria")
+    cadastro = ler_tabela_apoio("mercadoria", {
+        "cdmercadoria": "cdmercadoria", "cdncmsh2": "cdncmsh2", "grupo_de_mercadoria": "grupo_de_mercadoria",
+        "mercadoria": "mercadoria", "nomenclatura_simplificada_mercadoria": "nomenclatura_simplificada_mercadoria",
+    })
+    if cadastro is not None:
+        mercadorias = mercadorias.unionByName(cadastro.select("cdmercadoria")).distinct().join(cadastro, on="cdmercadoria", how="left")
+    atualizar_dimensao("dim_mercadoria", mercadorias, "cdmercadoria", "sk_mercadoria")
+
+    # Locais de origem e destino compartilham a mesma dimensão
+    locais = carga.select(F.col("origem").alias("codigo")).unionByName(carga.select(F.col("destino").alias("codigo")))
+    cadastros = [
+        ler_tabela_apoio("origem_carga", {
+            "origem": "codigo", "origem_nome": "nome", "cidade_origem": "cidade", "uf_origem": "uf",
+            "pais_origem": "pais", "continente_origem": "continente", "blocoeconomico_origem": "bloco_economico",
+        }),
+        ler_tabela_apoio("destino_carga", {
+            "destino": "codigo", "nome_destino": "nome", "cidade_destino": "cidade", "uf_destino": "uf",
+            "pais_destino": "pais", "continente_destino": "continente", "blocoeconomico_destino": "bloco_economico",
+        }),
+    ]
+    cadastros = [cadastro for cadastro in cadastros if cadastro is not None]
+    if cadastros:
+        cadastro = reduce(DataFrame.unionByName, cadastros).dropDuplicates(["codigo"])
+        locais = locais.unionByName(cadastro.select("codigo")).distinct().join(cadastro, on="codigo", how="left")
+    atualizar_dimensao("dim_local", locais, "codigo", "sk_local")
+
+
+def construir_fato_atracacao(anos):
+    """Atracações com as chaves de porto, berço, terminal, tipo de navegação e tipo de operação no lugar dos textos."""
+    atracacao = spark.table("ouro.atracacao").filter(F.col("Ano").isin(anos))
+    navegacoes = spark.table("ouro.dim_navegacao").select(F.col("tipo_navegacao").alias("tipo_de_navegacao_da_atracacao"), "sk_navegacao")
+    return (
+        atracacao.join(F.broadcast(spark.table("ouro.dim_porto").select("cdtup", "sk_porto")), on="cdtup", how="left")
+                 .join(F.broadcast(spark.table("ouro.dim_berco").select("idberco", "sk_berco")), on="idberco", how="left")
+                 .join(F.broadcast(spark.table("ouro.dim_terminal").select("terminal", "sk_terminal")), on="terminal", how="left")
+                 .join(F.broadcast(navegacoes), on="tipo_de_navegacao_da_atracacao", how="left")
+                 .join(F.broadcast(spark.table("ouro.dim_operacao").select("tipo_de_operacao", "sk_operacao")), on="tipo_de_operacao", how="left")
+                 .select(
+                     "idatracacao", "Ano", "sk_porto", "sk_berco", "sk_terminal", "sk_navegacao", "sk_operacao",
+                     "data_chegada", "data_atracacao", "data_inicio_operacao", "data_termino_operacao", "data_desatracacao",
+                 )
+    )
+
+
+def construir_fato_carga(anos):
+    """Cargas com as chaves de mercadoria, origem, destino, natureza, tipo de navegação e sentido no lugar dos códigos."""
+    carga = spark.table("ouro.carga").filter(F.col("Ano").isin(anos))
+    locais = spark.table("ouro.dim_local").select("codigo", "sk_local")
+    return (
+        carga.join(F.broadcast(spark.table("ouro.dim_mercadoria").select("cdmercadoria", "sk_mercadoria")), on="cdmercadoria", how="left")
+             .join(F.broadcast(locais.withColumnRenamed("codigo", "origem").withColumnRenamed("sk_local", "sk_origem")), on="origem", how="left")
+             .join(F.broadcast(locais.withColumnRenamed("codigo", "destino").withColumnRenamed("sk_local", "sk_destino")), on="destino", how="left")
+             .join(F.broadcast(spark.table("ouro.dim_natureza_carga").select("natureza_da_carga", "sk_natureza_carga")), on="natureza_da_carga", how="left")
+             .join(F.broadcast(spark.table("ouro.dim_navegacao").select("tipo_navegacao", "sk_navegacao")), on="tipo_navegacao", how="left")
+             .join(F.broadcast(spark.table("ouro.dim_sentido").select("sentido", "sk_sentido")), on="sentido", how="left")
+             .select(
+                 "idcarga", "idatracacao", "Ano", "sk_mercadoria", "sk_origem", "sk_destino",
+                 "sk_natureza_carga", "sk_navegacao", "sk_sentido",
+                 "vlpesocargabruta", "teu", "qtcarga",
+             )
+    )
+
+
+anos_estrela = anos_afetados_por("atracacao", "carga")
+
+
+def gravar_estrela(nome, construir):
+    with medir_etapa(metricas_etapas, ID_EXECUCAO, "gravacao_ouro", nome):
+        construir()
+
+
+if anos_estrela:
+    # Os fatos buscam as chaves substitutas nas dimensões: dependem delas e podem ser gravados em paralelo
+    executar_grafo({
+        "dimensoes": ([], partial(gravar_estrela, "dimensoes", lambda: atualizar_dimensoes(anos_estrela))),
+        "fato_atracacao": (["dimensoes"], partial(gravar_estrela, "fato_atracacao",
+                           lambda: gravar_tabela(construir_fato_atracacao(anos_estrela), "ouro.fato_atracacao"))),
+        "fato_carga": (["dimensoes"], partial(gravar_estrela, "fato_carga",
+                       lambda: gravar_tabela(construir_fato_carga(anos_estrela), "ouro.fato_carga"))),
+    })
+    print(f"Modelo estrela atualizado para os anos: {anos_estrela}")
+
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Índice espacial de portos e berços: as coordenadas ("lat, lon") são interpretadas uma vez por porto e cada porto e berço recebe o geohash da sua posição. Buscas por raio e pelo porto mais próximo filtram o índice pelos prefixos de geohash que cobrem a área (data skipping pela ordenação por `geohash`) e calculam a distância apenas para esses candidatos; o mapa de calor agrega atracações e carga pelo prefixo do geohash.
+
+# COMMAND ----------
+
+ESQUEMA_INDICE_PORTOS = "sk_porto INT, cdtup STRING, latitude DOUBLE, longitude DOUBLE, geohash STRING"
+
+
+def construir_indice_espacial():
+    """Uma linha por porto e por berço com latitude, longitude e geohash.
+
+    As coordenadas são do porto informante: os berços herdam a posição do seu porto.
+    """
+    linhas = []
+    for porto in spark.table("ouro.dim_porto").select("sk_porto", "cdtup", "coordenadas").collect():
+        coordenadas = interpretar_coordenadas(porto["coordenadas"])
+        if coordenadas is not None:
+            linhas.append((porto["sk_porto"], porto["cdtup"], *coordenadas, geohash(*coordenadas)))
+    portos = spark.createDataFrame(linhas, ESQUEMA_INDICE_PORTOS)
+    bercos = spark.table("ouro.dim_berco").select("sk_berco", "idberco", "sk_porto").join(F.broadcast(portos), on="sk_porto")
+
+    colunas = ["sk_porto", "latitude", "longitude", "geohash"]
+    return (
+        portos.select(F.lit("porto").alias("tipo"), F.col("cdtup").alias("chave"), F.lit(None).cast("int").alias("sk_berco"), *colunas)
+              .unionByName(bercos.select(F.lit("berco").alias("tipo"), F.col("idberco").alias("chave"), "sk_berco", *colunas))
+    )
+
+
+def _filtro_prefixos(prefixos):
+    """Filtro por prefixo de geohash (startswith), aproveitado pelo data skipping do Delta."""
+    return reduce(lambda esquerda, direita: esquerda | direita, [F.col("geohash").startswith(prefixo) for prefixo in prefixos])
+
+
+def portos_no_raio(latitude, longitude, raio_km, tipo="porto"):
+    """Portos (ou berços) a até raio_km do ponto, do mais próximo ao mais distante."""
+    _, prefixos = celulas_busca(latitude, longitude, raio_km)
+    return (
+        spark.table("ouro.indice_espacial")
+             .filter((F.col("tipo") == tipo) & _filtro_prefixos(prefixos))
+             .withColumn("distancia_km", distancia_ate(latitude, longitude))
+             .filter(F.col("distancia_km") <= raio_km)
+             .orderBy("distancia_km")
+    )
+
+
+def porto_mais_proximo(latitude, longitude, tipo="porto"):
+    """Porto (ou berço) mais próximo do ponto, ampliando a busca célula a célula.
+
+    O primeiro candidato encontrado define um raio; a busca nesse raio garante que nenhum porto
+    mais próximo ficou fora das células consultadas.
+    """
+    indice = spark.table("ouro.indice_espacial").filter(F.col("tipo") == tipo)
+    for precisao in range(GEOHASH_PRECISAO, 0, -1):
+        prefixos = vizinhos_geohash(geohash(latitude, longitude, precisao))
+        candidato = (
+            indice.filter(_filtro_prefixos(prefixos))
+                  .select(distancia_ate(latitude, longitude).alias("distancia_km"))
+                  .agg(F.min("distancia_km")).collect()[0][0]
+        )
+        if candidato is not None:
+            return portos_no_raio(latitude, longitude, candidato, tipo).limit(1)
+    return None
+
+
+def mapa_calor(precisao=4, anos=None):
+    """Atracações e peso bruto de carga por célula de geohash (prefixo com a precisão informada)."""
+    atracacoes = spark.table("ouro.mart_atracacoes")
+    carga = spark.table("ouro.fato_carga").join(spark.table("ouro.fato_atracacao").select("idatracacao", "sk_porto"), on="idatracacao")
+    if anos:
+        atracacoes = atracacoes.filter(F.col("Ano").isin(anos))
+        carga = carga.filter(F.col("Ano").isin(anos))
+
+    portos = (
+        spark.table("ouro.indice_espacial").filter(F.col("tipo") == "porto")
+             .select("sk_porto", F.substring("geohash", 1, precisao).alias("celula"), "latitude", "longitude")
+    )
+    return (
+        portos.join(atracacoes.groupBy("sk_porto").agg(F.sum("qtd_atracacoes").alias("atracacoes")), on="sk_porto", how="left")
+              .join(carga.groupBy("sk_porto").agg(F.sum("vlpesocargabruta").alias("peso_bruto")), on="sk_porto", how="left")
+              .groupBy("celula")
+              .agg(
+                  F.avg("latitude").alias("latitude"),
+                  F.avg("longitude").alias("longitude"),
+                  F.count("*").alias("portos"),
+                  F.coalesce(F.sum("atracacoes"), F.lit(0)).alias("atracacoes"),
+                  F.coalesce(F.sum("peso_bruto"), F.lit(0)).alias("peso_bruto"),
+              )
+    )
+
+
+if anos_estrela:
+    gravar_tabela(construir_indice_espacial(), "ouro.indice_espacial")
+    print(f"Índice espacial atualizado: {spark.table('ouro.indice_espacial').groupBy('tipo').count().collect()}")
+
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Exemplos: portos a até 100 km de Santos, berço mais próximo e as células com mais atracações
+
+# COMMAND ----------
+
+if spark.catalog.tableExists("ouro.indice_espacial"):
+    latitude_exemplo, longitude_exemplo = -23.9608, -46.3336
+    portos_no_raio(latitude_exemplo, longitude_exemplo, 100).show(truncate=False)
+    mais_proximo = porto_mais_proximo(latitude_exemplo, longitude_exemplo, tipo="berco")
+    if mais_proximo is not None:
+        mais_proximo.show(truncate=False)
+    mapa_calor(precisao=3).orderBy(F.desc("atracacoes")).show(10, truncate=False)
+
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Marts agregados da camada ouro para as perguntas de negócio
+# MAGIC
+# MAGIC Cada mart guarda somas e contagens parciais por ano (agregados combináveis): as médias são calculadas na consulta como soma/contagem, e uma nova carga recalcula apenas os anos afetados.
+
+# COMMAND ----------
+
+
+def navegacoes_da_atracacao():
+    """dim_navegacao com o tipo de navegação no nome da coluna da atracação, para os marts."""
+    return spark.table("ouro.dim_navegacao").select("sk_navegacao", F.col("tipo_navegacao").alias("tipo_de_navegacao_da_atracacao"))
+
+
+def construir_mart_atracacoes(anos):
+    """Atracações por ano, porto, terminal e tipo de navegação, com somas/contagens de TAtracado e TEstadia.
+
+    Atende às perguntas de tempo médio de atracação por porto, terminais e portos mais utilizados
+    e tempo médio de viagem por tipo de navegação. Agrupa pelas chaves substitutas do modelo estrela.
+    """
+    atracacao = spark.table("ouro.fato_atracacao").filter(F.col("Ano").isin(anos))
+    tempos = spark.table("ouro.temposatracacao").select("idatracacao", "tatracado", "testadia")
+    return (
+        atracacao.join(tempos, on="idatracacao", how="left")
+                 .join(F.broadcast(navegacoes_da_atracacao()), on="sk_navegacao", how="left")
+                 .groupBy("Ano", "sk_porto", "sk_terminal", "tipo_de_navegacao_da_atracacao")
+                 .agg(
+                     F.count("*").alias("qtd_atracacoes"),
+                     F.sum("tatracado").alias("soma_tatracado"),
+                     F.count("tatracado").alias("qtd_tatracado"),
+                     F.sum("testadia").alias("soma_testadia"),
+                     F.count("testadia").alias("qtd_testadia"),
+                 )
+    )
+
+
+def construir_mart_carga(anos):
+    """Peso bruto movimentado por ano da carga, ano da atracação, natureza, mercadoria e tipo de navegação.
+
+    O ano da atracação fica em coluna própria (ano_atracacao, nula quando a carga não tem atracação),
+    e a partição é o ano do arquivo de carga, para que a regravação por ano continue correta.
+    """
+    carga = (
+        spark.table("ouro.fato_carga").filter(F.col("Ano").isin(anos))
+             .join(F.broadcast(spark.table("ouro.dim_natureza_carga")), on="sk_natureza_carga", how="left")
+    )
+    atracacao = (
+        spark.table("ouro.fato_atracacao").select("idatracacao", F.col("Ano").alias("ano_atracacao"), "sk_navegacao")
+             .join(F.broadcast(navegacoes_da_atracacao()), on="sk_navegacao", how="left")
+             .drop("sk_navegacao")
+    )
+    return (
+        carga.join(atracacao, on="idatracacao", how="left")
+             .groupBy("Ano", "ano_atracacao", "natureza_da_carga", "sk_mercadoria", "tipo_de_navegacao_da_atracacao")
+             .agg(
+                 F.sum("vlpesocargabruta").alias("soma_vlpesocargabruta"),
+                 F.count("*").alias("qtd_cargas"),
+             )
+    )
+
+
+def construir_mart_fluxos(anos):
+    """Matriz origem-destino: carga movimentada por ano, origem, destino, natureza e tipo de navegação.
+
+    Os atributos dos locais (ATRIBUTOS_LOCAL_FLUXOS: nome, UF, país, continente e bloco econômico)
+    são copiados da dim_local com os prefixos origem_ e destino_, para que as consultas de rotas e
+    as fatias de fluxo leiam apenas o mart; sem o cadastro de locais, os atributos ficam nulos.
+    """
+    fluxos = (
+        spark.table("ouro.fato_carga").filter(F.col("Ano").isin(anos))
+             .groupBy("Ano", "sk_origem", "sk_destino", "sk_natureza_carga", "sk_navegacao")
+             .agg(
+                 F.sum("vlpesocargabruta").alias("soma_vlpesocargabruta"),
+                 F.sum("teu").alias("soma_teu"),
+                 F.sum("qtcarga").alias("soma_qtcarga"),
+                 F.count("*").alias("qtd_cargas"),
+             )
+             .join(F.broadcast(spark.table("ouro.dim_natureza_carga")), on="sk_natureza_carga", how="left")
+             .join(F.broadcast(spark.table("ouro.dim_navegacao")), on="sk_navegacao", how="left")
+    )
+    locais = spark.table("ouro.dim_local")
+    colunas_locais = []
+    for lado in ["origem", "destino"]:
+        atributos = [
+            (F.col(atributo) if atributo in locais.columns else F.lit(None).cast("string")).alias(f"{lado}_{atributo}")
+            for atributo in ATRIBUTOS_LOCAL_FLUXOS
+        ]
+        fluxos = fluxos.join(
+            F.broadcast(locais.select(F.col("sk_local").alias(f"sk_{lado}"), F.col("codigo").alias(lado), *atributos)),
+            on=f"sk_{lado}", how="left",
+        )
+        colunas_locais += [lado] + [f"{lado}_{atributo}" for atributo in ATRIBUTOS_LOCAL_FLUXOS]
+    return fluxos.select(
+        "Ano", "sk_origem", "sk_destino", *colunas_locais, "natureza_da_carga", "tipo_navegacao",
+        "soma_vlpesocargabruta", "soma_teu", "soma_qtcarga", "qtd_cargas",
+    )
+
+
+def construir_sketch_tempos(anos):
+    """Sketch de percentis de TAtracado e TEstadia por ano e por porto, berço e tipo de navegação.
+
+    Histograma em escala logarítmica (consulta_sketch_tempos, em antaq_comum.py): os anos são
+    combinados somando as quantidades de cada balde, e os percentis têm erro relativo de até 1%.
+    """
+    return spark.sql(consulta_sketch_tempos(anos))
+
+
+def construir_sketch_navios(anos):
+    """Registros do HyperLogLog dos navios (nº do IMO) por ano e por porto, berço e tipo de navegação.
+
+    Os anos são combinados pelo maior posto de cada registro (consulta_sketch_navios, em antaq_comum.py).
+    """
+    return spark.sql(consulta_sketch_navios(
+        "xxhash64(n.no_do_imo)", f"shiftrightunsigned(xxhash64(n.no_do_imo), {BITS_HLL})", anos
+    ))
+
+
+def construir_historico_navios(anos):
+    """Atracações de cada navio com porto, datas, tempos e totais de carga, ordenadas pelo navio em cada ano.
+
+    A ordenação global da consulta (consulta_historico_navios, em antaq_comum.py) faz cada arquivo
+    cobrir um intervalo contínuo de navios: com o navio na primeira coluna, as estatísticas de mínimo
+    e máximo do Delta descartam os demais arquivos na busca de um navio.
+    """
+    return spark.sql(consulta_historico_navios(anos))
+
+
+# Mart -> (tabelas de origem, função que monta o mart para uma lista de anos)
+MARTS_OURO = {
+    "mart_atracacoes": (["atracacao", "temposatracacao"], construir_mart_atracacoes),
+    "mart_carga": (["carga", "atracacao"], construir_mart_carga),
+    "mart_fluxos": (["carga"], construir_mart_fluxos),
+    "sketch_tempos": (["atracacao", "temposatracacao"], construir_sketch_tempos),
+    "sketch_navios": (["atracacao"], construir_sketch_navios),
+    "historico_navios": (["atracacao", "carga", "temposatracacao"], construir_historico_navios),
+}
+
+def gravar_mart(nome_mart, construir_mart, anos):
+    with medir_etapa(metricas_etapas, ID_EXECUCAO, "gravacao_ouro", nome_mart):
+        gravar_tabela(construir_mart(anos), f"ouro.{nome_mart}")
+    print(f"Mart atualizado: ouro.{nome_mart}, Anos: {anos}")
+
+
+# Os marts são independentes entre si e gravados em paralelo
+tarefas_marts = {}
+for nome_mart, (tabelas_origem, construir_mart) in MARTS_OURO.items():
+    anos = anos_afetados_por(*tabelas_origem)
+    if anos:
+        tarefas_marts[nome_mart] = ([], partial(gravar_mart, nome_mart, construir_mart, anos))
+executar_grafo(tarefas_marts)
+
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Fluxos de carga entre origens e destinos: rotas e fatias (ex.: de uma UF para um país) consultadas apenas na matriz origem-destino (`ouro.mart_fluxos`), sem varrer a tabela de cargas
+
+# COMMAND ----------
+
+def fluxos(anos=None, **filtros):
+    """Fluxos agregados por origem e destino, com filtros de igualdade nas colunas do mart (ex.: origem_uf="SP")."""
+    df = spark.table("ouro.mart_fluxos")
+    if anos:
+        df = df.filter(F.col("Ano").isin(anos))
+    for coluna, valor in filtros.items():
+        df = df.filter(F.col(coluna) == valor)
+    return (
+        df.groupBy("origem", "origem_nome", "origem_uf", "origem_pais", "destino", "destino_nome", "destino_uf", "destino_pais")
+          .agg(
+              F.sum("soma_vlpesocargabruta").alias("total_movimentado"),
+              F.sum("soma_teu").alias("total_teu"),
+              F.sum("qtd_cargas").alias("qtd_cargas"),
+          )
+    )
+
+
+def principais_rotas(k=10, anos=None, **filtros):
+    """As k rotas (origem -> destino) com maior peso bruto movimentado."""
+    return fluxos(anos, **filtros).orderBy(F.desc("total_movimentado")).limit(k)
+
+
+if spark.catalog.tableExists("ouro.mart_fluxos"):
+    linhas_mart, linhas_carga = spark.table("ouro.mart_fluxos").count(), spark.table("ouro.fato_carga").count()
+    print(f"Matriz origem-destino: {linhas_mart} linhas, fato_carga: {linhas_carga} linhas ({linhas_carga / max(linhas_mart, 1):.0f}x)")
+    principais_rotas(10).show(truncate=False)
+    principais_rotas(10, origem_uf="SP", destino_pais="China").show(truncate=False)
+
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Percentis dos tempos e navios distintos a partir dos sketches (`ouro.sketch_tempos` e `ouro.sketch_navios`): qualquer intervalo de anos é respondido combinando os sketches das partições, sem reler os fatos. A comparação com os percentis exatos (que ordenam todas as atracações) mostra o erro das estimativas.
+
+# COMMAND ----------
+
+def percentis_tempos(dimensao, medida="testadia", anos=None):
+    """p50, p90 e p99 da medida (tatracado ou testadia, em horas) por chave da dimensão (porto, berco ou navegacao)."""
+    return spark.sql(consulta_percentis(dimensao, medida, anos))
+
+
+def navios_distintos(dimensao, anos=None):
+    """Estimativa de navios distintos (nº do IMO) por chave da dimensão, nos anos informados."""
+    return spark.sql(consulta_navios_distintos(dimensao, anos))
+
+
+if spark.catalog.tableExists("ouro.sketch_tempos"):
+    anos_sketch = sorted(linha["Ano"] for linha in spark.table("ouro.sketch_tempos").select("Ano").distinct().collect())
+    estimados = percentis_tempos("navegacao", "testadia", anos_sketch)
+    exatos = (
+        spark.table("ouro.fato_atracacao").filter(F.col("Ano").isin(anos_sketch))
+             .join(spark.table("ouro.temposatracacao").select("idatracacao", "testadia"), on="idatracacao")
+             .filter(F.col("testadia").isNotNull())
+             .groupBy(F.col("sk_navegacao").cast("string").alias("chave"))
+             .agg(F.expr("percentile(testadia, array(0.5, 0.9, 0.99))").alias("exatos"))
+    )
+    (
+        estimados.join(exatos, on="chave")
+                 .join(spark.table("ouro.dim_navegacao").select(F.col("sk_navegacao").cast("string").alias("chave"), "tipo_navegacao"), on="chave", how="left")
+                 .select(
+                     "chave", "tipo_navegacao", "quantidade", "p50", "p90", "p99",
+                     *[F.round((F.col(f"p{p}") / F.col("exatos")[i] - 1) * 100, 2).alias(f"erro_p{p}_pct") for i, p in enumerate([50, 90, 99])],
+                 )
+                 .show(truncate=False)
+    )
+
+    navios_distintos("navegacao", anos_sketch).show(truncate=False)
+    (
+        navios_distintos("porto", anos_sketch[-2:])
+            .join(spark.table("ouro.dim_porto").select(F.col("sk_porto").cast("string").alias("chave"), "porto_atracacao"), on="chave", how="left")
+            .show(10, truncate=False)
+    )
+
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Verificar que as junções por idatracacao entre tabelas em buckets não geram shuffle (Exchange) no plano físico
+
+# COMMAND ----------
+
+
+def exchanges_na_chave(df, chave="idatracacao"):
+    """Linhas do plano físico com Exchange (shuffle) particionado pela chave informada."""
+    plano = df._jdf.queryExecution().executedPlan().toString()
+    return [linha.strip() for linha in plano.splitlines() if "Exchange hashpartitioning(" + chave in linha]
+
+
+# Sem o modelo estrela (ex.: nenhuma carga de atracação ou carga ainda) não há junções a verificar
+if all(spark.catalog.tableExists(f"ouro.{tabela}") for tabela in ["fato_atracacao", "fato_carga", "temposatracacao"]):
+    anos_verificacao = [linha["Ano"] for linha in spark.table("ouro.fato_atracacao").select("Ano").distinct().collect()]
+    juncoes_em_buckets = {
+        "mart_atracacoes": construir_mart_atracacoes(anos_verificacao),
+        "mart_carga": construir_mart_carga(anos_verificacao),
+        "carga_x_atracacao": spark.table("ouro.carga").join(spark.table("ouro.atracacao"), on="idatracacao"),
+        "temposatracacao_x_atracacao": spark.table("ouro.temposatracacao").join(spark.table("ouro.atracacao"), on="idatracacao"),
+    }
+
+    for nome_juncao, df in juncoes_em_buckets.items():
+        exchanges = exchanges_na_chave(df)
+        assert not exchanges, f"Junção {nome_juncao} com shuffle em idatracacao: {exchanges}"
+        print(f"✅ Junção {nome_juncao}: sem Exchange em idatracacao")
+
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Série compacta de ocupação por berço: uma linha por berço e ano, com os minutos ocupados de cada dia em um vetor de 366 posições para as três variantes (total, com carga e por tipo de operação), e as taxas mensais e anual já calculadas
+
+# COMMAND ----------
+
+# Tabela de origem -> (coluna de minutos, sufixo das colunas na série compacta)
+VARIANTES_OCUPACAO = {
+    "taxaocupacao": ("tempoemminutosdias", "ocupado"),
+    "taxaocupacaocomcarga": ("tempoemminutosdiasflagcarga", "com_carga"),
+    "taxaocupacaotoatracacao": ("tempoemminutosdiastoatracacao", "to_atracacao"),
+}
+
+MINUTOS_POR_DIA = 1440
+
+
+def agregar_ocupacao(tabela, coluna_minutos, sufixo, anos):
+    """Agrega uma variante em uma linha por berço e ano: vetor diário, minutos por mês e total do ano.
+
+    Na taxaocupacaotoatracacao os minutos dos diferentes tipos de operação do mesmo dia são somados.
+    """
+    df = spark.table(f"ouro.{tabela}").filter(F.col("anotaxaocupacao").isin(anos))
+    data = F.make_date("anotaxaocupacao", "mestaxaocupacao", "diataxaocupacao")
+    diario = (
+        df.groupBy("idberco", "anotaxaocupacao", F.dayofyear(data).alias("dia_do_ano"), F.col("mestaxaocupacao"))
+          .agg(F.sum(coluna_minutos).cast("int").alias("minutos"))
+    )
+    minutos_por_dia = F.map_from_entries(F.collect_list(F.struct("dia_do_ano", "minutos")))
+    return (
+        diario.groupBy("idberco", "anotaxaocupacao")
+              .agg(
+                  minutos_por_dia.alias("_mapa"),
+                  F.array(*[F.sum(F.when(F.col("mestaxaocupacao") == mes, F.col("minutos")).otherwise(0)) for mes in range(1, 13)])
+                   .alias(f"minutos_mensal_{sufixo}"),
+                  F.sum("minutos").alias(f"minutos_ano_{sufixo}"),
+              )
+              .withColumn(
+                  f"minutos_diarios_{sufixo}",
+                  F.transform(F.sequence(F.lit(1), F.lit(366)), lambda dia: F.coalesce(F.element_at("_mapa", dia), F.lit(0))),
+              )
+              .drop("_mapa")
+    )
+
+
+def construir_ocupacao_berco(anos):
+    """Une as três variantes lado a lado e calcula as taxas mensais e anual de ocupação."""
+    variantes = [
+        agregar_ocupacao(tabela, coluna, sufixo, anos)
+        for tabela, (coluna, sufixo) in VARIANTES_OCUPACAO.items()
+        if spark.catalog.tableExists(f"ouro.{tabela}")
+    ]
+    df = reduce(lambda esquerda, direita: esquerda.join(direita, on=["idberco", "anotaxaocupacao"], how="full"), variantes)
+
+    ano = F.col("anotaxaocupacao")
+    df = df.withColumn("dias_no_ano", F.dayofyear(F.make_date(ano, F.lit(12), F.lit(31))))
+    for _, sufixo in VARIANTES_OCUPACAO.values():
+        if f"minutos_ano_{sufixo}" not in df.columns:
+            continue
+        df = df.withColumn(
+            f"taxa_mensal_{sufixo}",
+            F.transform(
+                f"minutos_mensal_{sufixo}",
+                lambda minutos, i: minutos / (F.dayofmonth(F.last_day(F.make_date(ano, i + 1, F.lit(1)))) * MINUTOS_POR_DIA),
+            ),
+        ).withColumn(
+            f"taxa_anual_{sufixo}", F.col(f"minutos_ano_{sufixo}") / (F.col("dias_no_ano") * MINUTOS_POR_DIA)
+        )
+    return df
+
+
+def top_bercos_ocupacao(ano, k=10, mes=None, variante="ocupado"):
+    """Berços com maior taxa de ocupação no ano (ou no mês informado), lidos da série compacta."""
+    df = spark.table("ouro.ocupacao_berco").filter(F.col("anotaxaocupacao") == ano)
+    if mes is None:
+        taxa, minutos = F.col(f"taxa_anual_{variante}"), F.col(f"minutos_ano_{variante}")
+    else:
+        taxa, minutos = F.element_at(f"taxa_mensal_{variante}", mes), F.element_at(f"minutos_mensal_{variante}", mes)
+    return df.select("idberco", minutos.alias("minutos_ocupados"), taxa.alias("taxa_ocupacao")).orderBy(F.desc("taxa_ocupacao")).limit(k)
+
+
+def curva_ocupacao_berco(idberco, ano, variante="ocupado"):
+    """Minutos ocupados por dia do berço no ano, um registro por dia."""
+    return (
+        spark.table("ouro.ocupacao_berco")
+             .filter((F.col("anotaxaocupacao") == ano) & (F.col("idberco") == idberco))
+             .select(F.posexplode(f"minutos_diarios_{variante}").alias("posicao", "minutos"), "dias_no_ano")
+             .filter(F.col("posicao") < F.col("dias_no_ano"))
+             .select((F.col("posicao") + 1).alias("dia_do_ano"), "minutos")
+    )
+
+
+anos_ocupacao = anos_afetados_por(*VARIANTES_OCUPACAO)
+if anos_ocupacao:
+    with medir_etapa(metricas_etapas, ID_EXECUCAO, "gravacao_ouro", "ocupacao_berco"):
+        gravar_tabela(construir_ocupacao_berco(anos_ocupacao), "ouro.ocupacao_berco")
+    with medir_etapa(metricas_etapas, ID_EXECUCAO, "otimizacao_ouro", "ocupacao_berco"):
+        otimizar_tabela("ouro.ocupacao_berco", anos_ocupacao)
+    print(f"Série de ocupação atualizada para os anos: {anos_ocupacao}")
+
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ## Modo streaming
+# MAGIC
+# MAGIC Para as entregas diárias do SDP: o diretório de chegada é monitorado com o Structured Streaming e os arquivos novos são processados em micro-lotes, com os mesmos esquemas tipados e a mesma associação nome do arquivo -> tabela. A bronze recebe os lotes em append, a prata faz MERGE pelo `hash_linha` (com checkpoint do stream) e a ouro é atualizada apenas nos anos recebidos. As funções ficam em `pipeline_streaming.py`, que também pode ser executado fora do Databricks com o Spark em modo local.
+
+# COMMAND ----------
+
+from pipeline_streaming import iniciar_streaming
+
+# Com True, inicia o stream sobre o diretório de chegada (os arquivos de lá não passam pelo manifesto)
+MODO_STREAMING = False
+DIRETORIO_CHEGADA = "dbfs:/FileStore/antaq_chegada/"
+DIRETORIO_CHECKPOINT_STREAMING = "dbfs:/FileStore/checkpoints/antaq_streaming"
+
+
+def atualizar_ouro_streaming(anos_por_tipo):
+    """Atualiza a ouro com os anos recebidos no micro-lote, com as mesmas etapas da carga em lote.
+
+    Os anos do lote ficam em um dicionário local: particoes_afetadas, da carga em lote, não é alterado.
+    """
+    particoes = {tipo: set(anos) for tipo, anos in anos_por_tipo.items()}
+
+    for tipo, anos in anos_por_tipo.items():
+        df = spark.table(f"prata.{tipo}")
+        anos_validos = [ano for ano in anos if ano is not None]
+        if anos_validos:
+            df = df.filter(F.col("Ano").isin(anos_validos))
+        gravar_tabela(df, f"ouro.{tipo}")
+
+    anos_estrela = anos_afetados_por("atracacao", "carga", particoes=particoes)
+    if anos_estrela:
+        atualizar_dimensoes(anos_estrela)
+        gravar_tabela(construir_fato_atracacao(anos_estrela), "ouro.fato_atracacao")
+        gravar_tabela(construir_fato_carga(anos_estrela), "ouro.fato_carga")
+        gravar_tabela(construir_indice_espacial(), "ouro.indice_espacial")
+
+    for nome_mart, (tabelas_origem, construir_mart) in MARTS_OURO.items():
+        anos = anos_afetados_por(*tabelas_origem, particoes=particoes)
+        if anos:
+            gravar_tabela(construir_mart(anos), f"ouro.{nome_mart}")
+
+    anos_ocupacao = anos_afetados_por(*VARIANTES_OCUPACAO, particoes=particoes)
+    if anos_ocupacao:
+        gravar_tabela(construir_ocupacao_berco(anos_ocupacao), "ouro.ocupacao_berco")
+
+
+if MODO_STREAMING:
+    consulta_streaming = iniciar_streaming(spark, DIRETORIO_CHEGADA, DIRETORIO_CHECKPOINT_STREAMING, atualizar_ouro_streaming)
+    print(f"Stream iniciado: {consulta_streaming.name} ({consulta_streaming.id})")
 
 
 # COMMAND ----------
@@ -599,19 +2105,17 @@ for row in result:
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC SELECT 
-# MAGIC     a.porto_atracacao,
-# MAGIC     AVG(t.tatracado) AS tempo_medio_atracacao
+# MAGIC SELECT /*+ BROADCAST(p) */
+# MAGIC     p.porto_atracacao,
+# MAGIC     SUM(m.soma_tatracado) / SUM(m.qtd_tatracado) AS tempo_medio_atracacao
 # MAGIC FROM 
-# MAGIC     ouro.atracacao a
-# MAGIC JOIN 
-# MAGIC     ouro.temposatracacao t ON a.idatracacao = t.idatracacao
-# MAGIC WHERE 
-# MAGIC     t.tatracado IS NOT NULL
+# MAGIC     ouro.mart_atracacoes m
+# MAGIC LEFT JOIN 
+# MAGIC     ouro.dim_porto p ON m.sk_porto = p.sk_porto
 # MAGIC GROUP BY 
-# MAGIC     a.porto_atracacao
+# MAGIC     p.porto_atracacao
 # MAGIC HAVING 
-# MAGIC     AVG(t.tatracado) IS NOT NULL
+# MAGIC     SUM(m.qtd_tatracado) > 0
 # MAGIC ORDER BY 
 # MAGIC     tempo_medio_atracacao DESC;
 
@@ -630,12 +2134,12 @@ for row in result:
 
 # MAGIC %sql
 # MAGIC SELECT 
-# MAGIC     a.Ano,
-# MAGIC     SUM(c.vlpesocargabruta) AS total_carga_movimentada
-# MAGIC FROM ouro.carga c
-# MAGIC JOIN ouro.atracacao a ON c.idatracacao = a.idatracacao
-# MAGIC GROUP BY a.Ano
-# MAGIC ORDER BY a.Ano DESC;
+# MAGIC     ano_atracacao AS Ano,
+# MAGIC     SUM(soma_vlpesocargabruta) AS total_carga_movimentada
+# MAGIC FROM ouro.mart_carga
+# MAGIC WHERE ano_atracacao IS NOT NULL
+# MAGIC GROUP BY ano_atracacao
+# MAGIC ORDER BY Ano DESC;
 # MAGIC
 
 # COMMAND ----------
@@ -654,9 +2158,9 @@ for row in result:
 # MAGIC %sql
 # MAGIC SELECT 
 # MAGIC     natureza_da_carga,
-# MAGIC     SUM(vlpesocargabruta) AS total_movimentado
+# MAGIC     SUM(soma_vlpesocargabruta) AS total_movimentado
 # MAGIC FROM 
-# MAGIC     ouro.carga
+# MAGIC     ouro.mart_carga
 # MAGIC GROUP BY 
 # MAGIC     natureza_da_carga
 # MAGIC ORDER BY total_movimentado DESC;
@@ -675,13 +2179,15 @@ for row in result:
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC SELECT 
-# MAGIC     terminal,
-# MAGIC     COUNT(*) AS numero_atracacoes
+# MAGIC SELECT /*+ BROADCAST(t) */
+# MAGIC     t.terminal,
+# MAGIC     SUM(m.qtd_atracacoes) AS numero_atracacoes
 # MAGIC FROM 
-# MAGIC     ouro.atracacao
+# MAGIC     ouro.mart_atracacoes m
+# MAGIC LEFT JOIN 
+# MAGIC     ouro.dim_terminal t ON m.sk_terminal = t.sk_terminal
 # MAGIC GROUP BY 
-# MAGIC     terminal
+# MAGIC     t.terminal
 # MAGIC ORDER BY 
 # MAGIC     numero_atracacoes DESC;
 
@@ -699,13 +2205,15 @@ for row in result:
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC SELECT 
-# MAGIC     porto_atracacao,
-# MAGIC     COUNT(*) AS numero_atracacoes
+# MAGIC SELECT /*+ BROADCAST(p) */
+# MAGIC     p.porto_atracacao,
+# MAGIC     SUM(m.qtd_atracacoes) AS numero_atracacoes
 # MAGIC FROM 
-# MAGIC     ouro.atracacao
+# MAGIC     ouro.mart_atracacoes m
+# MAGIC LEFT JOIN 
+# MAGIC     ouro.dim_porto p ON m.sk_porto = p.sk_porto
 # MAGIC GROUP BY 
-# MAGIC     porto_atracacao
+# MAGIC     p.porto_atracacao
 # MAGIC ORDER BY 
 # MAGIC     numero_atracacoes DESC;
 
@@ -723,13 +2231,13 @@ for row in result:
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC SELECT 
-# MAGIC     c.cdmercadoria AS tipo_mercadoria,
-# MAGIC     SUM(c.vlpesocargabruta) AS total_movimentado
-# MAGIC FROM ouro.carga c
-# MAGIC JOIN ouro.atracacao a ON c.idatracacao = a.idatracacao
-# MAGIC WHERE a.tipo_de_navegacao_da_atracacao = 'Longo Curso'
-# MAGIC GROUP BY c.cdmercadoria
+# MAGIC SELECT /*+ BROADCAST(d) */
+# MAGIC     d.cdmercadoria AS tipo_mercadoria,
+# MAGIC     SUM(m.soma_vlpesocargabruta) AS total_movimentado
+# MAGIC FROM ouro.mart_carga m
+# MAGIC LEFT JOIN ouro.dim_mercadoria d ON m.sk_mercadoria = d.sk_mercadoria
+# MAGIC WHERE m.tipo_de_navegacao_da_atracacao = 'Longo Curso'
+# MAGIC GROUP BY d.cdmercadoria
 # MAGIC ORDER BY total_movimentado DESC;
 
 # COMMAND ----------
@@ -748,13 +2256,12 @@ for row in result:
 # MAGIC %sql
 # MAGIC SELECT 
 # MAGIC     idberco,
-# MAGIC     SUM(tempoemminutosdias) AS TotalTempoOcupacao
+# MAGIC     minutos_ano_ocupado AS TotalTempoOcupacao,
+# MAGIC     taxa_anual_ocupado AS TaxaOcupacao
 # MAGIC FROM 
-# MAGIC     ouro.taxaocupacao
+# MAGIC     ouro.ocupacao_berco
 # MAGIC WHERE 
-# MAGIC     anotaxaocupacao = '2023'
-# MAGIC GROUP BY 
-# MAGIC     idberco
+# MAGIC     anotaxaocupacao = 2023
 # MAGIC ORDER BY 
 # MAGIC     TotalTempoOcupacao DESC
 # MAGIC LIMIT 1;
@@ -766,6 +2273,23 @@ for row in result:
 
 # COMMAND ----------
 
+for ano in [2020, 2021, 2022, 2023, 2024]:
+    print(f"Ano: {ano}")
+    top_bercos_ocupacao(ano, k=3).show()
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Curva diária de ocupação do berço com maior ocupação em 2023
+
+# COMMAND ----------
+
+berco_mais_ocupado = top_bercos_ocupacao(2023, k=1).collect()
+if berco_mais_ocupado:
+    curva_ocupacao_berco(berco_mais_ocupado[0]["idberco"], 2023).show(366)
+
+# COMMAND ----------
+
 # MAGIC %md
 # MAGIC ### Qual o tempo médio de viagem por tipo de navio?
 
@@ -773,16 +2297,14 @@ for row in result:
 
 # MAGIC %sql
 # MAGIC SELECT 
-# MAGIC     a.tipo_de_navegacao_da_atracacao AS TipoNavio,
-# MAGIC     AVG(t.testadia) AS TempoMedioViagem
+# MAGIC     tipo_de_navegacao_da_atracacao AS TipoNavio,
+# MAGIC     SUM(soma_testadia) / NULLIF(SUM(qtd_testadia), 0) AS TempoMedioViagem
 # MAGIC FROM 
-# MAGIC     ouro.temposatracacao t
-# MAGIC JOIN 
-# MAGIC     ouro.atracacao a ON t.idatracacao = a.idatracacao
+# MAGIC     ouro.mart_atracacoes
 # MAGIC WHERE 
-# MAGIC     a.tipo_de_navegacao_da_atracacao IS NOT NULL
+# MAGIC     tipo_de_navegacao_da_atracacao IS NOT NULL
 # MAGIC GROUP BY 
-# MAGIC     a.tipo_de_navegacao_da_atracacao
+# MAGIC     tipo_de_navegacao_da_atracacao
 # MAGIC ORDER BY TempoMedioViagem DESC;
 
 # COMMAND ----------
@@ -793,6 +2315,192 @@ for row in result:
 
 # COMMAND ----------
 
+# MAGIC %md
+# MAGIC ### Quais são as principais rotas (origem e destino) por peso movimentado?
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC SELECT
+# MAGIC     origem, origem_uf, origem_pais, destino, destino_uf, destino_pais,
+# MAGIC     SUM(soma_vlpesocargabruta) AS total_movimentado,
+# MAGIC     SUM(qtd_cargas) AS qtd_cargas
+# MAGIC FROM
+# MAGIC     ouro.mart_fluxos
+# MAGIC GROUP BY
+# MAGIC     origem, origem_uf, origem_pais, destino, destino_uf, destino_pais
+# MAGIC ORDER BY total_movimentado DESC
+# MAGIC LIMIT 10;
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ## Arquivos e bytes lidos por consulta
+# MAGIC
+# MAGIC As mesmas consultas das perguntas acima (`CONSULTAS_OURO`, em `antaq_comum.py`), executadas em Python para medir quantos arquivos e bytes cada uma lê após a poda de partições e o data skipping do layout.
+
+# COMMAND ----------
+
+def _nos_do_plano(plano):
+    """Percorre o plano físico executado, entrando nos estágios do Adaptive Query Execution."""
+    classe = plano.getClass().getSimpleName()
+    if classe == "AdaptiveSparkPlanExec":
+        yield from _nos_do_plano(plano.executedPlan())
+        return
+    if classe.endswith("QueryStageExec"):
+        yield from _nos_do_plano(plano.plan())
+        return
+
+    yield plano
+    filhos = plano.children()
+    for i in range(filhos.size()):
+        yield from _nos_do_plano(filhos.apply(i))
+
+
+def _valor_metrica(plano, nome):
+    metrica = plano.metrics().get(nome)
+    return metrica.get().value() if metrica.isDefined() else 0
+
+
+def metricas_varredura(df):
+    """Executa o DataFrame e retorna, por tabela lida, os arquivos e bytes efetivamente varridos."""
+    df.collect()
+    varreduras = defaultdict(lambda: {"arquivos": 0, "bytes": 0})
+    for no in _nos_do_plano(df._jdf.queryExecution().executedPlan()):
+        if not no.metrics().contains("numFiles"):
+            continue
+        try:
+            tabela = no.tableIdentifier().get().unquotedString()
+        except Exception:
+            tabela = no.nodeName()
+        varreduras[tabela]["arquivos"] += _valor_metrica(no, "numFiles")
+        varreduras[tabela]["bytes"] += _valor_metrica(no, "filesSize")
+    return dict(varreduras)
+
+
+for nome_consulta, consulta in CONSULTAS_OURO.items():
+    with medir_etapa(metricas_etapas, ID_EXECUCAO, "consulta_ouro", nome_consulta):
+        varreduras = metricas_varredura(spark.sql(consulta))
+    print(f"🔎 Consulta: {nome_consulta}")
+    for tabela, metricas in varreduras.items():
+        print(f"    {tabela}: {metricas['arquivos']} arquivos, {metricas['bytes'] / 1024 ** 2:.1f} MB")
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ## Cache de resultados das consultas
+# MAGIC
+# MAGIC `consultar_ouro` devolve o resultado gravado em disco quando a mesma consulta (após normalizar espaços, comentários e maiúsculas) já foi executada sobre as mesmas versões das tabelas. A versão é a do log do Delta ou, nas tabelas Parquet em buckets, a lista dos arquivos, consultada uma vez por tabela na execução; uma carga que regrava uma tabela remove do cache apenas as consultas que a leram.
+
+# COMMAND ----------
+
+def versao_tabela(tabela):
+    """Versão atual da tabela: a do log de transações no Delta, ou a impressão digital dos arquivos no Parquet.
+
+    Consultada uma vez por tabela em cada execução (o cache guarda a versão até a próxima gravação).
+    """
+    if layout_da_tabela(tabela)["formato"] == "delta":
+        return DeltaTable.forName(spark, tabela).history(1).select("version").first()["version"]
+    return hashlib.md5("\n".join(sorted(spark.table(tabela).inputFiles())).encode("utf-8")).hexdigest()
+
+
+def consultar_ouro(consulta):
+    """Resultado da consulta como DataFrame do pandas, do cache quando as tabelas lidas não mudaram."""
+    resultado, _ = consultar(cache_consultas, consulta, versao_tabela, lambda sql: spark.sql(sql).toPandas())
+    return resultado
+
+
+# Cada pergunta executada duas vezes: a segunda leitura vem do cache
+for nome_consulta, consulta in CONSULTAS_OURO.items():
+    tempos = []
+    for _ in range(2):
+        acertos, inicio = cache_consultas["acertos"], time.perf_counter()
+        resultado = consultar_ouro(consulta)
+        tempos.append(f"{time.perf_counter() - inicio:.2f} s{' (cache)' if cache_consultas['acertos'] > acertos else ''}")
+    print(f"🔎 Consulta: {nome_consulta}, Linhas: {len(resultado)}, Tempos: {' -> '.join(tempos)}")
+
+resumo_cache(cache_consultas)
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Histórico de atracações de um navio (`ouro.historico_navios`): as escalas em ordem cronológica, com porto, berço, tempos e totais de carga, lidas apenas dos arquivos cujo intervalo de navios contém o procurado, sem varrer as atracações nem juntar as cargas
+
+# COMMAND ----------
+
+def historico_navio(imo=None, capitania=None, anos=None):
+    """Escalas do navio pelo nº do IMO (ou, sem ele, pelo nº da capitania), como DataFrame do pandas.
+
+    O resultado fica no cache de consultas até a próxima gravação de ouro.historico_navios.
+    """
+    return consultar_ouro(consulta_historico_navio(identificador_navio(imo, capitania), anos))
+
+
+if spark.catalog.tableExists("ouro.historico_navios"):
+    navio_exemplo = spark.table("ouro.historico_navios").filter(F.col("no_do_imo").isNotNull()).select("no_do_imo").first()
+    if navio_exemplo is not None:
+        inicio = time.perf_counter()
+        escalas = historico_navio(imo=navio_exemplo["no_do_imo"])
+        print(
+            f"🚢 Navio {navio_exemplo['no_do_imo']}: {len(escalas)} escalas, "
+            f"{escalas['soma_vlpesocargabruta'].sum():,.0f} t de carga bruta, {time.perf_counter() - inicio:.2f} s"
+        )
+        print(escalas.head(20).to_string(index=False))
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Exportar os resultados das consultas em Parquet, para comparação com a execução local (`pipeline_local.py --comparar-com`)
+
+# COMMAND ----------
+
+# Diretório de destino (ex.: "dbfs:/FileStore/resultados_ouro"); com None a exportação é ignorada
+DIRETORIO_RESULTADOS_OURO = None
+
+if DIRETORIO_RESULTADOS_OURO:
+    for nome_consulta, consulta in CONSULTAS_OURO.items():
+        spark.sql(consulta).coalesce(1).write.mode("overwrite").parquet(f"{DIRETORIO_RESULTADOS_OURO}/{nome_consulta}")
+        print(f"Resultado exportado: {DIRETORIO_RESULTADOS_OURO}/{nome_consulta}")
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Relatório do cache desta execução: nível de armazenamento, memória e disco ocupados, acertos e falhas por DataFrame
+
+# COMMAND ----------
+
+relatorio_cache(cache_etapas)
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Métricas por etapa desta execução (tempo de parede, linhas, bytes gravados, shuffle, spill e GC), gravadas em `qualidade.metricas_etapas`
+
+# COMMAND ----------
+
+# Arquivo JSON lines adicional com as mesmas métricas (ex.: "/dbfs/FileStore/metricas_etapas.jsonl"); None para não gravar
+ARQUIVO_METRICAS = None
+
+gravar_metricas(metricas_etapas, arquivo_jsonl=ARQUIVO_METRICAS)
+
+(
+    spark.table("qualidade.metricas_etapas")
+         .filter(F.col("id_execucao") == ID_EXECUCAO)
+         .groupBy("etapa")
+         .agg(
+             F.round(F.sum("segundos"), 1).alias("segundos"),
+             F.sum("linhas_saida").alias("linhas_saida"),
+             F.sum("bytes_gravados").alias("bytes_gravados"),
+             F.sum("shuffle_gravacao_bytes").alias("shuffle_gravacao_bytes"),
+             F.sum("spill_disco_bytes").alias("spill_disco_bytes"),
+             F.sum("tempo_gc_ms").alias("tempo_gc_ms"),
+         )
+         .orderBy(F.desc("segundos"))
+         .show(truncate=False)
+)
+
+# COMMAND ----------
+
 # MAGIC %md
 # MAGIC ## Autoavaliação
 # MAGIC
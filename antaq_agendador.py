@@ -0,0 +1,142 @@
+"""Execução concorrente das tarefas do pipeline da ANTAQ como um grafo de dependências.
+
+Cada tarefa é uma entrada {nome: (dependencias, funcao)}, no mesmo formato de MARTS_OURO no
+notebook. As tarefas cujas dependências já terminaram são submetidas a um pool limitado de
+threads; cada thread usa o seu próprio pool do fair scheduler do Spark (spark.scheduler.pool),
+para que uma tabela pequena não espere na fila atrás dos estágios de uma tabela grande.
+
+Tarefas que falham são repetidas (ex.: conflitos de escrita concorrente do Delta); as que
+dependem de uma tarefa que falhou não são executadas. Ao final, o relatório mostra o caminho
+crítico do grafo: o tempo de parede total fica limitado por essa cadeia, e não pela soma das tarefas.
+
+Com spark.scheduler.mode = FAIR (padrão no Databricks), os pools são criados sob demanda.
+"""
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from pyspark import SparkContext
+
+# Threads simultâneas: acima disso, as tarefas disputam os mesmos núcleos do cluster
+MAXIMO_TAREFAS_SIMULTANEAS = 4
+
+# Execuções por tarefa (a primeira e as repetições), com espera crescente entre elas
+TENTATIVAS_TAREFA = 3
+ESPERA_REPETICAO_S = 5
+
+
+def validar_grafo(tarefas):
+    """Verifica se as dependências existem e se o grafo não tem ciclos."""
+    for nome, (dependencias, _) in tarefas.items():
+        ausentes = [dependencia for dependencia in dependencias if dependencia not in tarefas]
+        if ausentes:
+            raise ValueError(f"Tarefa {nome} depende de tarefas inexistentes: {ausentes}")
+
+    visitadas, em_visita = set(), set()
+
+    def visitar(nome):
+        if nome in em_visita:
+            raise ValueError(f"Ciclo no grafo de tarefas passando por {nome}")
+        if nome in visitadas:
+            return
+        em_visita.add(nome)
+        for dependencia in tarefas[nome][0]:
+            visitar(dependencia)
+        em_visita.discard(nome)
+        visitadas.add(nome)
+
+    for nome in tarefas:
+        visitar(nome)
+
+
+def _executar_tarefa(nome, funcao, pool):
+    """Executa a tarefa no pool do fair scheduler, repetindo em caso de erro.
+
+    Retorna (resultado, erro, inicio, fim, tentativas).
+    """
+    sc = SparkContext.getOrCreate()
+    sc.setLocalProperty("spark.scheduler.pool", pool)
+    inicio = time.time()
+    try:
+        for tentativa in range(1, TENTATIVAS_TAREFA + 1):
+            try:
+                return funcao(), None, inicio, time.time(), tentativa
+            except Exception as erro:
+                if tentativa == TENTATIVAS_TAREFA:
+                    return None, erro, inicio, time.time(), tentativa
+                print(f"🔁 Tarefa {nome}: tentativa {tentativa} falhou ({type(erro).__name__}: {erro}), repetindo")
+                time.sleep(ESPERA_REPETICAO_S * tentativa)
+    finally:
+        # As threads do pool são reutilizadas: a propriedade não pode vazar para a próxima tarefa
+        sc.setLocalProperty("spark.scheduler.pool", None)
+
+
+def executar_grafo(tarefas, maximo_simultaneas=MAXIMO_TAREFAS_SIMULTANEAS, prefixo_pool="antaq"):
+    """Executa as tarefas respeitando as dependências e retorna {nome: resultado}.
+
+    Levanta RuntimeError ao final se alguma tarefa falhar após as repetições; as tarefas
+    independentes da que falhou são executadas normalmente.
+    """
+    validar_grafo(tarefas)
+    pendentes = dict(tarefas)
+    execucoes, resultados, erros, ignoradas = {}, {}, {}, []
+    inicio = time.time()
+
+    with ThreadPoolExecutor(max_workers=maximo_simultaneas, thread_name_prefix=prefixo_pool) as executor:
+        em_execucao = {}
+        while pendentes or em_execucao:
+            for nome, (dependencias, funcao) in list(pendentes.items()):
+                if any(dependencia in erros or dependencia in ignoradas for dependencia in dependencias):
+                    ignoradas.append(nome)
+                    del pendentes[nome]
+                elif all(dependencia in execucoes for dependencia in dependencias):
+                    futuro = executor.submit(_executar_tarefa, nome, funcao, f"{prefixo_pool}_{nome}")
+                    em_execucao[futuro] = nome
+                    del pendentes[nome]
+
+            if not em_execucao:
+                continue
+            concluidos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                nome = em_execucao.pop(futuro)
+                resultado, erro, inicio_tarefa, fim_tarefa, tentativas = futuro.result()
+                if erro is not None:
+                    erros[nome] = erro
+                    print(f"❌ Tarefa {nome}: {type(erro).__name__}: {erro}")
+                    traceback.print_exception(type(erro), erro, erro.__traceback__)
+                    continue
+                execucoes[nome] = (inicio_tarefa, fim_tarefa, tentativas)
+                resultados[nome] = resultado
+
+    imprimir_relatorio(tarefas, execucoes, time.time() - inicio)
+    if erros or ignoradas:
+        raise RuntimeError(f"Tarefas com erro: {sorted(erros)}; não executadas por dependência: {sorted(ignoradas)}")
+    return resultados
+
+
+def caminho_critico(tarefas, execucoes):
+    """Cadeia de dependências com a maior soma de durações: (duração total, [nomes])."""
+    melhor = {}
+
+    def mais_longo(nome):
+        if nome not in melhor:
+            inicio, fim, _ = execucoes[nome]
+            anteriores = [mais_longo(dependencia) for dependencia in tarefas[nome][0] if dependencia in execucoes]
+            duracao, cadeia = max(anteriores, default=(0.0, []))
+            melhor[nome] = (duracao + fim - inicio, cadeia + [nome])
+        return melhor[nome]
+
+    return max((mais_longo(nome) for nome in execucoes), default=(0.0, []))
+
+
+def imprimir_relatorio(tarefas, execucoes, segundos_total):
+    """Duração de cada tarefa, caminho crítico e comparação com a execução sequencial."""
+    soma = sum(fim - inicio for inicio, fim, _ in execucoes.values())
+    duracao_critica, cadeia = caminho_critico(tarefas, execucoes)
+
+    for nome, (inicio, fim, tentativas) in sorted(execucoes.items(), key=lambda item: item[1][0]):
+        marca = "⭐" if nome in cadeia else "  "
+        repeticoes = f" ({tentativas} tentativas)" if tentativas > 1 else ""
+        print(f"{marca} {nome}: {fim - inicio:.1f} s{repeticoes}")
+    print(f"⏱️ Tempo total: {segundos_total:.1f} s, soma das tarefas: {soma:.1f} s, "
+          f"caminho crítico: {duracao_critica:.1f} s ({' -> '.join(cadeia)})")
@@ -0,0 +1,144 @@
+"""Cache gerenciado dos DataFrames intermediários do pipeline da ANTAQ.
+
+Um DataFrame é registrado com a lista dos consumidores que vão usá-lo (ex.: gravação da bronze
+e da prata). Só é persistido quando há mais de um consumidor; o nível de armazenamento é escolhido
+pela estimativa de tamanho do otimizador em relação à memória de armazenamento livre nos
+executores, e o cache é liberado (unpersist) assim que o último consumidor termina.
+
+Cada entrada também guarda as tabelas de origem: quando uma delas é regravada, invalidar_origem
+libera as entradas derivadas, para que nenhum consumidor leia uma versão desatualizada.
+
+O relatório mostra, por entrada, o nível escolhido, a estimativa, a memória e o disco ocupados
+e os acertos (consumidor encontrou os dados já materializados) e falhas do cache.
+"""
+import threading
+from contextlib import contextmanager
+
+from pyspark import SparkContext, StorageLevel
+from pyspark.sql import SparkSession
+
+# Estimativas acima desta fração da memória de armazenamento livre vão direto para o disco
+FRACAO_MEMORIA_CACHE = 0.3
+
+NIVEL_MEMORIA = StorageLevel.MEMORY_AND_DISK
+NIVEL_DISCO = StorageLevel.DISK_ONLY
+
+
+def criar_cache():
+    # A trava protege as entradas: os consumidores podem rodar em paralelo (executar_grafo)
+    return {"entradas": {}, "trava": threading.Lock()}
+
+
+def estimar_tamanho(df):
+    """Tamanho estimado pelo otimizador (tamanho dos arquivos lidos, ajustado pelas projeções)."""
+    return int(df._jdf.queryExecution().optimizedPlan().stats().sizeInBytes().toString())
+
+
+def memoria_livre():
+    """Memória de armazenamento livre somada entre os executores, em bytes."""
+    status = SparkContext.getOrCreate()._jsc.sc().getExecutorMemoryStatus().values().iterator()
+    livre = 0
+    while status.hasNext():
+        livre += status.next()._2()
+    return livre
+
+
+def escolher_nivel(estimativa, livre):
+    return NIVEL_MEMORIA if estimativa <= livre * FRACAO_MEMORIA_CACHE else NIVEL_DISCO
+
+
+def _dados_em_cache(df):
+    """CachedRDDBuilder do DataFrame no CacheManager do Spark, ou None se não estiver em cache."""
+    spark = SparkSession.builder.getOrCreate()
+    dados = spark._jsparkSession.sharedState().cacheManager().lookupCachedData(df._jdf)
+    return dados.get().cachedRepresentation().cacheBuilder() if dados.isDefined() else None
+
+
+def _atualizar_ocupacao(entrada):
+    """Memória e disco ocupados pelo RDD do cache (maior valor observado na execução)."""
+    construtor = _dados_em_cache(entrada["df"])
+    if construtor is None or not construtor.isCachedColumnBuffersLoaded():
+        return
+    id_rdd = construtor.cachedColumnBuffers().id()
+    for info in SparkContext.getOrCreate()._jsc.sc().getRDDStorageInfo():
+        if info.id() == id_rdd:
+            entrada["bytes_memoria"] = max(entrada["bytes_memoria"], info.memSize())
+            entrada["bytes_disco"] = max(entrada["bytes_disco"], info.diskSize())
+
+
+def registrar_cache(cache, nome, df, consumidores, origens=()):
+    """Registra o DataFrame e seus consumidores; persiste apenas se houver mais de um consumidor."""
+    consumidores = set(consumidores)
+    persistir = len(consumidores) > 1
+    estimativa = estimar_tamanho(df)
+    nivel = escolher_nivel(estimativa, memoria_livre()) if persistir else None
+
+    with cache["trava"]:
+        anterior = cache["entradas"].get(nome)
+        if anterior is not None and anterior["persistido"]:
+            anterior["df"].unpersist()
+        cache["entradas"][nome] = {
+            "df": df.persist(nivel) if persistir else df,
+            "consumidores": consumidores,
+            "origens": set(origens),
+            "persistido": persistir,
+            "nivel": str(nivel) if persistir else "sem cache",
+            "estimativa": estimativa,
+            "bytes_memoria": 0,
+            "bytes_disco": 0,
+            "acertos": 0,
+            "falhas": 0,
+        }
+
+
+def _liberar(entrada):
+    if entrada["persistido"]:
+        entrada["df"].unpersist()
+        entrada["persistido"] = False
+
+
+@contextmanager
+def consumir(cache, nome, consumidor):
+    """Entrega o DataFrame ao consumidor; ao final do bloco, libera o cache se ele era o último."""
+    entrada = cache["entradas"][nome]
+    if entrada["persistido"]:
+        construtor = _dados_em_cache(entrada["df"])
+        carregado = construtor is not None and construtor.isCachedColumnBuffersLoaded()
+        with cache["trava"]:
+            entrada["acertos" if carregado else "falhas"] += 1
+    try:
+        yield entrada["df"]
+    finally:
+        if entrada["persistido"]:
+            _atualizar_ocupacao(entrada)
+        with cache["trava"]:
+            entrada["consumidores"].discard(consumidor)
+            if not entrada["consumidores"]:
+                _liberar(entrada)
+
+
+def invalidar_origem(cache, tabela):
+    """Libera as entradas derivadas da tabela, antes que ela seja regravada."""
+    with cache["trava"]:
+        for nome, entrada in cache["entradas"].items():
+            if tabela in entrada["origens"] and entrada["persistido"]:
+                print(f"♻️ Cache {nome} invalidado: {tabela} será regravada")
+                _liberar(entrada)
+
+
+def relatorio_cache(cache):
+    """Imprime o relatório da execução e libera as entradas que ainda estiverem em cache."""
+    total_memoria = total_disco = 0
+    for nome, entrada in sorted(cache["entradas"].items()):
+        total_memoria += entrada["bytes_memoria"]
+        total_disco += entrada["bytes_disco"]
+        pendentes = f", consumidores pendentes: {sorted(entrada['consumidores'])}" if entrada["consumidores"] else ""
+        print(
+            f"🗄️ {nome}: {entrada['nivel']}, estimativa {entrada['estimativa'] / 1024 ** 2:.1f} MB, "
+            f"memória {entrada['bytes_memoria'] / 1024 ** 2:.1f} MB, disco {entrada['bytes_disco'] / 1024 ** 2:.1f} MB, "
+            f"acertos {entrada['acertos']}, falhas {entrada['falhas']}{pendentes}"
+        )
+        _liberar(entrada)
+    acertos = sum(entrada["acertos"] for entrada in cache["entradas"].values())
+    falhas = sum(entrada["falhas"] for entrada in cache["entradas"].values())
+    print(f"Total: acertos {acertos}, falhas {falhas}, memória {total_memoria / 1024 ** 2:.1f} MB, disco {total_disco / 1024 ** 2:.1f} MB")
@@ -0,0 +1,153 @@
+"""Cache em disco dos resultados das consultas da camada ouro.
+
+A chave de cada resultado é o texto normalizado da consulta (espaços, comentários de linha e
+maiúsculas fora das strings não importam) mais a versão de cada tabela lida por ela. Quando uma
+carga altera uma tabela, a versão muda e a consulta deixa de encontrar o resultado antigo;
+invalidar_tabela remove do disco apenas as entradas que leram aquela tabela.
+
+Os resultados ficam em Parquet no disco local do driver, com um índice JSON; quando o total
+passa do limite, as entradas usadas há mais tempo são removidas (LRU).
+
+Independente do motor: a versão das tabelas e a execução da consulta são funções informadas
+por quem usa o cache (o notebook usa o histórico do Delta e o Spark). A versão de cada tabela é
+consultada uma vez por sessão do cache e guardada até invalidar_tabela, chamada pelas gravações;
+alterações feitas por outros processos só são vistas ao abrir o cache de novo.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+
+LIMITE_BYTES_PADRAO = 512 * 1024 ** 2
+
+ARQUIVO_INDICE = "indice.json"
+
+# Tabelas qualificadas pelo esquema das camadas (ex.: ouro.mart_carga), como em todas as consultas do projeto
+PADRAO_TABELAS = re.compile(r"\b((?:bronze|prata|ouro|qualidade)\.[a-z_][a-z0-9_]*)\b")
+PADRAO_LITERAIS = re.compile(r"('(?:[^']|'')*')")
+
+
+def normalizar_consulta(consulta):
+    """Texto canônico da consulta: sem comentários de linha, espaços colapsados e minúsculas fora das strings.
+
+    Comentários /*+ ... */ são mantidos, pois são dicas para o otimizador do Spark.
+    """
+    partes = PADRAO_LITERAIS.split(consulta.strip().rstrip(";"))
+    normalizadas = []
+    for i, parte in enumerate(partes):
+        if i % 2:
+            normalizadas.append(parte)
+            continue
+        parte = re.sub(r"--[^\n]*", " ", parte)
+        normalizadas.append(re.sub(r"\s+", " ", parte).lower())
+    return "".join(normalizadas).strip()
+
+
+def tabelas_da_consulta(consulta_normalizada):
+    return sorted(set(PADRAO_TABELAS.findall(consulta_normalizada)))
+
+
+def abrir_cache(diretorio, limite_bytes=LIMITE_BYTES_PADRAO):
+    """Abre (ou cria) o cache no diretório, carregando o índice das entradas já gravadas."""
+    os.makedirs(diretorio, exist_ok=True)
+    caminho_indice = os.path.join(diretorio, ARQUIVO_INDICE)
+    indice = {}
+    if os.path.exists(caminho_indice):
+        with open(caminho_indice, encoding="utf-8") as arquivo:
+            indice = json.load(arquivo)
+    # Entradas cujo arquivo foi apagado fora do cache são descartadas
+    indice = {chave: entrada for chave, entrada in indice.items() if os.path.exists(_caminho_resultado(diretorio, chave))}
+    return {"diretorio": diretorio, "limite_bytes": limite_bytes, "indice": indice, "trava": threading.Lock(),
+            "versoes": {}, "acertos": 0, "falhas": 0}
+
+
+def _caminho_resultado(diretorio, chave):
+    return os.path.join(diretorio, f"{chave}.parquet")
+
+
+def _gravar_indice(cache):
+    caminho = os.path.join(cache["diretorio"], ARQUIVO_INDICE)
+    with open(caminho + ".tmp", "w", encoding="utf-8") as arquivo:
+        json.dump(cache["indice"], arquivo, ensure_ascii=False, indent=1)
+    os.replace(caminho + ".tmp", caminho)
+
+
+def _remover(cache, chave):
+    cache["indice"].pop(chave, None)
+    try:
+        os.remove(_caminho_resultado(cache["diretorio"], chave))
+    except FileNotFoundError:
+        pass
+
+
+def _aplicar_limite(cache):
+    """Remove as entradas usadas há mais tempo até o total caber no limite."""
+    total = sum(entrada["bytes"] for entrada in cache["indice"].values())
+    for chave, entrada in sorted(cache["indice"].items(), key=lambda item: item[1]["ultimo_acesso"]):
+        if total <= cache["limite_bytes"]:
+            break
+        total -= entrada["bytes"]
+        _remover(cache, chave)
+
+
+def consultar(cache, consulta, versao_da_tabela, executar):
+    """Resultado da consulta (DataFrame do pandas) e se veio do cache.
+
+    versao_da_tabela(tabela) identifica o estado atual de cada tabela lida; executar(consulta)
+    executa a consulta no motor e retorna um DataFrame do pandas.
+    """
+    normalizada = normalizar_consulta(consulta)
+    versoes = {}
+    for tabela in tabelas_da_consulta(normalizada):
+        if tabela not in cache["versoes"]:
+            cache["versoes"][tabela] = str(versao_da_tabela(tabela))
+        versoes[tabela] = cache["versoes"][tabela]
+    chave = hashlib.sha256(json.dumps([normalizada, versoes], sort_keys=True).encode("utf-8")).hexdigest()[:32]
+    caminho = _caminho_resultado(cache["diretorio"], chave)
+
+    with cache["trava"]:
+        entrada = cache["indice"].get(chave)
+        if entrada is not None:
+            entrada["ultimo_acesso"] = time.time()
+            entrada["acessos"] += 1
+            cache["acertos"] += 1
+            _gravar_indice(cache)
+            return pd.read_parquet(caminho), True
+        cache["falhas"] += 1
+
+    resultado = executar(consulta)
+    resultado.to_parquet(caminho, index=False)
+    with cache["trava"]:
+        cache["indice"][chave] = {
+            "consulta": normalizada,
+            "versoes": versoes,
+            "bytes": os.path.getsize(caminho),
+            "criado_em": time.time(),
+            "ultimo_acesso": time.time(),
+            "acessos": 1,
+        }
+        _aplicar_limite(cache)
+        _gravar_indice(cache)
+    return resultado, False
+
+
+def invalidar_tabela(cache, tabela):
+    """Remove as entradas que leram a tabela e a versão guardada; retorna quantas foram removidas."""
+    with cache["trava"]:
+        cache["versoes"].pop(tabela, None)
+        afetadas = [chave for chave, entrada in cache["indice"].items() if tabela in entrada["versoes"]]
+        for chave in afetadas:
+            _remover(cache, chave)
+        if afetadas:
+            _gravar_indice(cache)
+    return len(afetadas)
+
+
+def resumo_cache(cache):
+    total = sum(entrada["bytes"] for entrada in cache["indice"].values())
+    print(f"🗃️ Cache de consultas: {len(cache['indice'])} resultados, {total / 1024 ** 2:.1f} MB "
+          f"de {cache['limite_bytes'] / 1024 ** 2:.0f} MB, acertos {cache['acertos']}, falhas {cache['falhas']}")
@@ -0,0 +1,685 @@
+"""Definições comuns ao pipeline da ANTAQ, sem dependência do Spark.
+
+Usadas pelo notebook do Databricks e pelas execuções locais: registro de esquemas do
+Catálogo de Dados, normalização dos nomes de colunas e identificação das tabelas pelos
+nomes dos arquivos.
+"""
+import math
+import re
+import unicodedata
+from collections import defaultdict
+
+
+# Tipos de cada coluna, na mesma ordem dos cabeçalhos dos arquivos da ANTAQ.
+# O esquema é aplicado na própria leitura: não há passo de inferência e as
+# agregações da camada ouro passam a trabalhar com tipos numéricos nativos.
+# Colunas TIMESTAMP são lidas como texto na bronze e convertidas na camada prata.
+ESQUEMAS_ANTAQ = {
+    "atracacao": [
+        ("IDAtracacao", "BIGINT"),
+        ("CDTUP", "STRING"),
+        ("IDBerco", "STRING"),
+        ("Berço", "STRING"),
+        ("Porto Atracação", "STRING"),
+        ("Coordenadas", "STRING"),
+        ("Apelido Instalação Portuária", "STRING"),
+        ("Complexo Portuário", "STRING"),
+        ("Tipo da Autoridade Portuária", "STRING"),
+        ("Data Atracação", "TIMESTAMP"),
+        ("Data Chegada", "TIMESTAMP"),
+        ("Data Desatracação", "TIMESTAMP"),
+        ("Data Início Operação", "TIMESTAMP"),
+        ("Data Término Operação", "TIMESTAMP"),
+        ("Tipo de Operação", "STRING"),
+        ("Tipo de Navegação da Atracação", "STRING"),
+        ("Nacionalidade do Armador", "INT"),
+        ("FlagMCOperacaoAtracacao", "INT"),
+        ("Terminal", "STRING"),
+        ("Município", "STRING"),
+        ("UF", "STRING"),
+        ("SGUF", "STRING"),
+        ("Região Geográfica", "STRING"),
+        ("Região Hidrográfica", "STRING"),
+        ("Instalação Portuária em Rio", "STRING"),
+        ("Nº da Capitania", "STRING"),
+        ("Nº do IMO", "STRING"),
+    ],
+    "carga": [
+        ("IDCarga", "BIGINT"),
+        ("IDAtracacao", "BIGINT"),
+        ("Origem", "STRING"),
+        ("Destino", "STRING"),
+        ("CDMercadoria", "STRING"),
+        ("Tipo Operação da Carga", "STRING"),
+        ("Carga Geral Acondicionamento", "STRING"),
+        ("ConteinerEstado", "STRING"),
+        ("Tipo Navegação", "STRING"),
+        ("FlagAutorizacao", "STRING"),
+        ("FlagCabotagem", "INT"),
+        ("FlagCabotagemMovimentacao", "INT"),
+        ("FlagConteinerTamanho", "STRING"),
+        ("FlagLongoCurso", "INT"),
+        ("FlagMCOperacaoCarga", "INT"),
+        ("FlagOffshore", "INT"),
+        ("FlagTransporteViaInterioir", "INT"),
+        ("Percurso Transporte em vias Interiores", "STRING"),
+        ("Percurso Transporte Interiores", "STRING"),
+        ("STNaturezaCarga", "STRING"),
+        ("STSH2", "STRING"),
+        ("STSH4", "STRING"),
+        ("Natureza da Carga", "STRING"),
+        ("Sentido", "STRING"),
+        ("TEU", "DECIMAL(18,2)"),
+        ("QTCarga", "BIGINT"),
+        ("VLPesoCargaBruta", "DECIMAL(18,3)"),
+    ],
+    "carga_conteinerizada": [
+        ("IDCarga", "BIGINT"),
+        ("CDMercadoriaConteinerizada", "STRING"),
+        ("VLPesoCargaConteinerizada", "DECIMAL(18,3)"),
+    ],
+    "carga_hidrovia": [
+        ("IDCarga", "BIGINT"),
+        ("Hidrovia", "STRING"),
+        ("ValorMovimentado", "DECIMAL(18,3)"),
+    ],
+    "carga_regiao": [
+        ("IDCarga", "BIGINT"),
+        ("Região Hidrográfica", "STRING"),
+        ("ValorMovimentado", "DECIMAL(18,3)"),
+    ],
+    "carga_rio": [
+        ("IDCarga", "BIGINT"),
+        ("Rio", "STRING"),
+        ("ValorMovimentado", "DECIMAL(18,3)"),
+    ],
+    "destino_carga": [
+        ("Destino", "STRING"),
+        ("Nome Destino", "STRING"),
+        ("CDBigramaDestino", "STRING"),
+        ("CDTrigramaDestino", "STRING"),
+        ("CDTUPDestino", "STRING"),
+        ("Rio Destino", "STRING"),
+        ("Região Hidrográfica Destino", "STRING"),
+        ("UF.Destino", "STRING"),
+        ("Cidade Destino", "STRING"),
+        ("País Destino", "STRING"),
+        ("Continente Destino", "STRING"),
+        ("BlocoEconomico_Destino", "STRING"),
+    ],
+    "origem_carga": [
+        ("Origem", "STRING"),
+        ("Origem Nome", "STRING"),
+        ("CDBigramaOrigem", "STRING"),
+        ("CDTrigramaOrigem", "STRING"),
+        ("CDTUPOrigem", "STRING"),
+        ("Rio Origem", "STRING"),
+        ("Região Hidrográfica Origem", "STRING"),
+        ("UF.Origem", "STRING"),
+        ("Cidade Origem", "STRING"),
+        ("País Origem", "STRING"),
+        ("Continente Origem", "STRING"),
+        ("BlocoEconomico_Origem", "STRING"),
+    ],
+    "mercadoria": [
+        ("CDMercadoria", "STRING"),
+        ("CDNCMSH2", "STRING"),
+        ("Tipo Conteiner", "STRING"),
+        ("Grupo de Mercadoria", "STRING"),
+        ("Mercadoria", "STRING"),
+        ("Nomenclatura Simplificada Mercadoria", "STRING"),
+    ],
+    "mercadoria_conteinerizada": [
+        ("CDMercadoriaConteinerizada", "STRING"),
+        ("CDGrupoMercadoriaConteinerizada", "STRING"),
+        ("Grupo Mercadoria Conteinerizada", "STRING"),
+        ("Mercadoria Conteinerizada", "STRING"),
+        ("Nomenclatura Simplificada Mercadoria Conteinerizada", "STRING"),
+    ],
+    "taxaocupacao": [
+        ("IDBerco", "STRING"),
+        ("DiaTaxaOcupacao", "INT"),
+        ("MêsTaxaOcupacao", "INT"),
+        ("AnoTaxaOcupacao", "INT"),
+        ("TempoEmMinutosdias", "DECIMAL(10,2)"),
+    ],
+    "taxaocupacaocomcarga": [
+        ("IDBerco", "STRING"),
+        ("DiaTaxaOcupacao", "INT"),
+        ("MêsTaxaOcupacao", "INT"),
+        ("AnoTaxaOcupacao", "INT"),
+        ("TempoEmMinutosdiasFlagCarga", "DECIMAL(10,2)"),
+    ],
+    "taxaocupacaotoatracacao": [
+        ("IDBerco", "STRING"),
+        ("DSTipoOperacaoAtracacaoTaxaOcupacao", "STRING"),
+        ("DiaTaxaOcupacao", "INT"),
+        ("MêsTaxaOcupacao", "INT"),
+        ("AnoTaxaOcupacao", "INT"),
+        ("TempoEmMinutosdiasTOAtracacao", "DECIMAL(10,2)"),
+    ],
+    "temposatracacao": [
+        ("IDAtracacao", "BIGINT"),
+        ("TEsperaAtracacao", "DECIMAL(18,4)"),
+        ("TEsperaInicioOp", "DECIMAL(18,4)"),
+        ("TOperacao", "DECIMAL(18,4)"),
+        ("TEsperaDesatracacao", "DECIMAL(18,4)"),
+        ("TAtracado", "DECIMAL(18,4)"),
+        ("TEstadia", "DECIMAL(18,4)"),
+    ],
+    "temposatracacaoparalisacao": [
+        ("IDTemposDescontos", "BIGINT"),
+        ("IDAtracacao", "BIGINT"),
+        ("DescricaoTempoDesconto", "STRING"),
+        ("DTInicio", "TIMESTAMP"),
+        ("DTTermino", "TIMESTAMP"),
+    ],
+}
+
+# Nomes alternativos com que as tabelas de apoio são publicadas pela ANTAQ
+ALIASES_TABELAS = {
+    "instalacao_origem": "origem_carga",
+    "instalacaoorigem": "origem_carga",
+    "origemcarga": "origem_carga",
+    "instalacao_destino": "destino_carga",
+    "instalacaodestino": "destino_carga",
+    "destinocarga": "destino_carga",
+    "mercadoriaconteinerizada": "mercadoria_conteinerizada",
+}
+
+# Tabelas de apoio não possuem ano e são sempre regravadas por completo
+TABELAS_APOIO = ["destino_carga", "origem_carga", "mercadoria", "mercadoria_conteinerizada"]
+
+def _montar_tabela_traducao():
+    """Tabela de tradução para str.translate: espaços viram "_", pontuação é removida e letras acentuadas perdem o acento."""
+    tabela = {" ": "_", "º": "o"}
+    for caractere in ";{}()\n\t=":
+        tabela[caractere] = None
+    # Latin-1 Supplement e Latin Extended-A: "Ç" -> "c", "ã" -> "a", ...
+    for codigo in range(0xC0, 0x180):
+        caractere = chr(codigo)
+        base = unicodedata.normalize("NFKD", caractere).encode("ascii", "ignore").decode()
+        if base:
+            tabela[caractere] = base.lower()
+    return str.maketrans(tabela)
+
+
+TABELA_TRADUCAO_COLUNAS = _montar_tabela_traducao()
+PADRAO_CARACTERES_INVALIDOS = re.compile(r"\W|^(?=\d)")
+
+
+def normalizar_nome_coluna(nome):
+    """Normaliza um nome de coluna (ex.: "Nº do IMO" -> "no_do_imo", "Data Início Operação" -> "data_inicio_operacao")."""
+    return PADRAO_CARACTERES_INVALIDOS.sub("_", nome.translate(TABELA_TRADUCAO_COLUNAS).lower())
+
+
+def verificar_colisoes(nomes_originais, nomes_normalizados):
+    """Falha se duas colunas diferentes forem normalizadas para o mesmo nome."""
+    origens = defaultdict(list)
+    for original, normalizado in zip(nomes_originais, nomes_normalizados):
+        origens[normalizado].append(original)
+    colisoes = {normalizado: originais for normalizado, originais in origens.items() if len(originais) > 1}
+    if colisoes:
+        raise ValueError(f"Colunas com o mesmo nome após a normalização: {colisoes}")
+
+
+def tipo_da_tabela(nome_tabela):
+    """Retorna a chave do registro de esquemas para um nome de arquivo/tabela (ex.: 2020Carga_txt_part1 -> carga)."""
+    tipo = re.sub(r"(\.txt)?(_txt)?(_part\d+)?$", "", nome_tabela)
+    tipo = re.sub(r"^\d{4}", "", tipo).lower()
+    return ALIASES_TABELAS.get(tipo, tipo)
+
+
+def ano_do_arquivo(nome_arquivo):
+    """Ano no início do nome do arquivo (ex.: 2021Carga_txt_part1 -> 2021), ou None para as tabelas de apoio."""
+    encontrado = re.match(r"^(\d{4})", nome_arquivo)
+    return int(encontrado.group(1)) if encontrado else None
+
+
+# Tabelas de ocupação são particionadas pelo ano da ocupação, como no LAYOUT_TABELAS do notebook
+PARTICAO_OCUPACAO = "anotaxaocupacao"
+
+
+def particao_da_tabela(tabela, colunas):
+    """Coluna de partição da tabela: ano da ocupação, Ano ou nenhuma (tabelas de apoio)."""
+    if tabela in TABELAS_APOIO:
+        return None
+    if PARTICAO_OCUPACAO in colunas:
+        return PARTICAO_OCUPACAO
+    return "Ano" if "Ano" in colunas else None
+
+
+# Política de armazenamento da bronze: codec, tamanho dos grupos de linhas e tamanho alvo dos
+# arquivos, usados pelo LAYOUT_TABELAS do notebook e pela execução local
+ARMAZENAMENTO_BRONZE = {"compressao": "zstd", "grupo_linhas": "128mb", "tamanho_arquivo": "128mb"}
+
+# Ordem das linhas nos arquivos da bronze. Textos de baixa cardinalidade (UF, região, natureza da
+# carga...) se repetem em todas as linhas; o Parquet já os grava com dicionário, e ordenar as linhas
+# por eles (hierarquia geográfica primeiro, pois UF e SGUF estão contidas na região) transforma os
+# índices do dicionário em longas sequências, comprimidas por RLE. Os identificadores vêm por último
+# para manter a sequência dentro de cada grupo: sem eles, a carga ficava maior do que na ordem original.
+ORDENACAO_BRONZE = {
+    "atracacao": ["regiao_geografica", "sguf", "uf", "complexo_portuario", "idatracacao"],
+    "carga": ["natureza_da_carga", "tipo_navegacao", "idatracacao", "idcarga"],
+}
+
+UNIDADES_TAMANHO = {"b": 1, "kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3}
+
+
+def tamanho_em_bytes(tamanho):
+    """Converte um tamanho do layout (ex.: "128mb") em bytes."""
+    encontrado = re.fullmatch(r"(\d+)\s*([kmg]?b)", str(tamanho).strip().lower())
+    if not encontrado:
+        raise ValueError(f"Tamanho inválido: {tamanho!r} (use, por exemplo, '128mb')")
+    return int(encontrado.group(1)) * UNIDADES_TAMANHO[encontrado.group(2)]
+
+
+# Tempo calculado -> (data inicial, data final, coluna correspondente em temposatracacao)
+DURACOES_ATRACACAO = {
+    "t1_espera_atracacao": ("data_chegada", "data_atracacao", "tesperaatracacao"),
+    "t2_espera_inicio_op": ("data_atracacao", "data_inicio_operacao", "tesperainicioop"),
+    "t3_operacao": ("data_inicio_operacao", "data_termino_operacao", "toperacao"),
+    "t4_espera_desatracacao": ("data_termino_operacao", "data_desatracacao", "tesperadesatracacao"),
+    "ta_atracado": ("data_atracacao", "data_desatracacao", "tatracado"),
+    "te_estadia": ("data_chegada", "data_desatracacao", "testadia"),
+}
+
+
+def colunas_data_hora(tipo):
+    """Colunas declaradas como TIMESTAMP no registro de esquemas, com os nomes normalizados."""
+    return [normalizar_nome_coluna(nome) for nome, tipo_coluna in ESQUEMAS_ANTAQ.get(tipo, []) if tipo_coluna == "TIMESTAMP"]
+
+
+# Atributos da dim_local copiados para a matriz origem-destino (ouro.mart_fluxos), com os prefixos
+# origem_ e destino_: as consultas de rotas e fatias de fluxo não precisam de junções
+ATRIBUTOS_LOCAL_FLUXOS = ["nome", "uf", "pais", "continente", "bloco_economico"]
+
+
+# Sketches mergeáveis da ouro, gravados por partição de ano em formato longo (uma linha por balde
+# ou registro): a combinação de vários anos é uma soma (percentis) ou um máximo (navios distintos)
+# por balde, em SQL comum ao Spark e ao DuckDB, sem reler os fatos.
+#
+# Percentis (ouro.sketch_tempos): histograma em escala logarítmica, como o DDSketch. O balde i
+# contém os valores em (GAMA^(i-1), GAMA^i], e qualquer percentil é estimado com erro relativo de
+# até PRECISAO_RELATIVA_SKETCH. Tempos abaixo de um minuto contam no balde de um minuto.
+PRECISAO_RELATIVA_SKETCH = 0.01
+GAMA_SKETCH = (1 + PRECISAO_RELATIVA_SKETCH) / (1 - PRECISAO_RELATIVA_SKETCH)
+MINIMO_SKETCH_HORAS = 1 / 60
+PERCENTIS_PADRAO = (0.5, 0.9, 0.99)
+
+# Navios distintos (ouro.sketch_navios): registros do HyperLogLog sobre o hash do nº do IMO, com
+# 2^BITS_HLL registros (erro padrão de ~1,04 / sqrt(2^BITS_HLL), 1,6%)
+BITS_HLL = 12
+REGISTROS_HLL = 2 ** BITS_HLL
+
+# Dimensão -> coluna de fato_atracacao usada como chave do sketch; medidas de temposatracacao (horas)
+DIMENSOES_SKETCH = {"porto": "sk_porto", "berco": "sk_berco", "navegacao": "sk_navegacao"}
+MEDIDAS_SKETCH = ["tatracado", "testadia"]
+
+
+def indice_sketch(coluna):
+    """Expressão SQL do balde do valor no sketch de percentis."""
+    return (
+        f"CAST(CEIL(LN(GREATEST(CAST({coluna} AS DOUBLE), {MINIMO_SKETCH_HORAS!r})) / LN({GAMA_SKETCH!r})) AS INT)"
+    )
+
+
+def posto_hll(resto):
+    """Expressão SQL do posto no HyperLogLog: posição do primeiro bit 1 (zeros à direita + 1) do resto do hash.
+
+    resto são os 64 - BITS_HLL bits do hash que não escolhem o registro, como BIGINT não negativo.
+    """
+    return f"CASE WHEN {resto} = 0 THEN {64 - BITS_HLL + 1} ELSE CAST(ROUND(LOG2({resto} & -{resto})) AS INT) + 1 END"
+
+
+def _filtro_anos(anos, coluna="Ano"):
+    return f" AND {coluna} IN ({', '.join(str(ano) for ano in sorted(anos))})" if anos else ""
+
+
+def _escolher(coluna_seletor, colunas):
+    """CASE que escolhe, pelo valor do seletor, a coluna correspondente ({valor: coluna})."""
+    casos = " ".join(f"WHEN '{valor}' THEN {coluna}" for valor, coluna in colunas.items())
+    return f"CASE {coluna_seletor} {casos} END"
+
+
+def consulta_sketch_tempos(anos=None):
+    """Consulta que monta ouro.sketch_tempos: quantidade de atracações por ano, dimensão, chave, medida e balde.
+
+    Cada atracação é combinada (CROSS JOIN) com os pares dimensão x medida, em uma única leitura dos fatos.
+    """
+    pares = ", ".join(f"('{dimensao}', '{medida}')" for dimensao in DIMENSOES_SKETCH for medida in MEDIDAS_SKETCH)
+    chave = _escolher("d.dimensao", {dimensao: f"CAST(a.{coluna} AS STRING)" for dimensao, coluna in DIMENSOES_SKETCH.items()})
+    valor = _escolher("d.medida", {medida: f"t.{medida}" for medida in MEDIDAS_SKETCH})
+    return f"""
+        SELECT Ano, dimensao, chave, medida, {indice_sketch("valor")} AS indice, COUNT(*) AS quantidade
+        FROM (
+            SELECT a.Ano, d.dimensao, {chave} AS chave, d.medida, {valor} AS valor
+            FROM ouro.fato_atracacao a
+            JOIN ouro.temposatracacao t ON a.idatracacao = t.idatracacao
+            CROSS JOIN (VALUES {pares}) AS d(dimensao, medida)
+            WHERE 1 = 1{_filtro_anos(anos, "a.Ano")}
+        ) tempos
+        WHERE chave IS NOT NULL AND valor IS NOT NULL
+        GROUP BY Ano, dimensao, chave, medida, {indice_sketch("valor")}
+    """
+
+
+def consulta_sketch_navios(expressao_hash, expressao_resto, anos=None):
+    """Consulta que monta ouro.sketch_navios: maior posto de cada registro do HyperLogLog por ano, dimensão e chave.
+
+    O hash do nº do IMO depende do motor: expressao_hash é o hash de 64 bits de no_do_imo e
+    expressao_resto, o mesmo hash deslocado BITS_HLL bits à direita, como BIGINT não negativo.
+    """
+    dimensoes = ", ".join(f"('{dimensao}')" for dimensao in DIMENSOES_SKETCH)
+    chave = _escolher("d.dimensao", {dimensao: f"CAST(a.{coluna} AS STRING)" for dimensao, coluna in DIMENSOES_SKETCH.items()})
+    return f"""
+        SELECT Ano, dimensao, chave, registro, MAX({posto_hll("resto")}) AS posto
+        FROM (
+            SELECT a.Ano, d.dimensao, {chave} AS chave,
+                   CAST({expressao_hash} & {REGISTROS_HLL - 1} AS INT) AS registro, {expressao_resto} AS resto
+            FROM ouro.fato_atracacao a
+            JOIN ouro.atracacao n ON a.idatracacao = n.idatracacao
+            CROSS JOIN (VALUES {dimensoes}) AS d(dimensao)
+            WHERE NULLIF(TRIM(n.no_do_imo), '') IS NOT NULL{_filtro_anos(anos, "a.Ano")}
+        ) navios
+        WHERE chave IS NOT NULL
+        GROUP BY Ano, dimensao, chave, registro
+    """
+
+
+def nome_percentil(percentil):
+    """Nome da coluna do percentil (ex.: 0.5 -> p50, 0.999 -> p99_9)."""
+    return f"p{percentil * 100:g}".replace(".", "_")
+
+
+def consulta_percentis(dimensao, medida, anos=None, percentis=PERCENTIS_PADRAO):
+    """Consulta dos percentis da medida por chave da dimensão, combinando os anos informados (todos, se None)."""
+    # Valor do balde: 2 * GAMA^i / (GAMA + 1), o ponto com o mesmo erro relativo até as duas bordas
+    colunas = ",\n               ".join(
+        f"2 * POWER({GAMA_SKETCH!r}, MIN(CASE WHEN acumulado > {percentil!r} * (total - 1) THEN indice END)) "
+        f"/ ({GAMA_SKETCH!r} + 1) AS {nome_percentil(percentil)}"
+        for percentil in percentis
+    )
+    return f"""
+        WITH baldes AS (
+            SELECT chave, indice, SUM(quantidade) AS quantidade
+            FROM ouro.sketch_tempos
+            WHERE dimensao = '{dimensao}' AND medida = '{medida}'{_filtro_anos(anos)}
+            GROUP BY chave, indice
+        ), acumulado AS (
+            SELECT chave, indice,
+                   SUM(quantidade) OVER (PARTITION BY chave ORDER BY indice ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS acumulado,
+                   SUM(quantidade) OVER (PARTITION BY chave) AS total
+            FROM baldes
+        )
+        SELECT chave, MAX(total) AS quantidade,
+        {colunas}
+        FROM acumulado
+        GROUP BY chave
+        ORDER BY quantidade DESC, chave
+    """
+
+
+def consulta_navios_distintos(dimensao, anos=None):
+    """Consulta da estimativa de navios distintos por chave da dimensão, combinando os anos informados."""
+    # Estimativa bruta: alfa * m^2 / soma(2^-posto), com os registros vazios (posto 0) somando 1 cada
+    alfa_m2 = 0.7213 / (1 + 1.079 / REGISTROS_HLL) * REGISTROS_HLL ** 2
+    return f"""
+        WITH registros AS (
+            SELECT chave, registro, MAX(posto) AS posto
+            FROM ouro.sketch_navios
+            WHERE dimensao = '{dimensao}'{_filtro_anos(anos)}
+            GROUP BY chave, registro
+        ), resumo AS (
+            SELECT chave, COUNT(*) AS ocupados,
+                   CAST({alfa_m2!r} AS DOUBLE) / (SUM(POWER(2.0, -posto)) + {REGISTROS_HLL} - COUNT(*)) AS bruta
+            FROM registros
+            GROUP BY chave
+        )
+        -- Poucos registros ocupados: contagem linear (m * ln(m / vazios)), mais precisa nesse intervalo
+        SELECT chave,
+               CAST(ROUND(CASE
+                   WHEN bruta <= {2.5 * REGISTROS_HLL} AND ocupados < {REGISTROS_HLL}
+                       THEN {REGISTROS_HLL} * LN(CAST({REGISTROS_HLL} AS DOUBLE) / ({REGISTROS_HLL} - ocupados))
+                   ELSE bruta
+               END) AS BIGINT) AS navios_distintos
+        FROM resumo
+        ORDER BY navios_distintos DESC, chave
+    """
+
+
+# Histórico de navios (ouro.historico_navios): uma linha por atracação com o identificador do navio,
+# o nº do IMO ou, sem ele, o nº da capitania com o prefixo PREFIXO_CAPITANIA. A tabela é gravada
+# ordenada pelo navio dentro de cada ano, com o navio na primeira coluna: as estatísticas de mínimo e
+# máximo por arquivo (Delta) ou grupo de linhas (Parquet) fazem a busca de um navio ler poucos
+# arquivos por ano, qualquer que seja o tamanho dos fatos.
+PREFIXO_CAPITANIA = "CAP-"
+
+EXPRESSAO_NAVIO = (
+    f"COALESCE(NULLIF(TRIM(a.no_do_imo), ''), '{PREFIXO_CAPITANIA}' || NULLIF(TRIM(a.no_da_capitania), ''))"
+)
+
+
+def identificador_navio(imo=None, capitania=None):
+    """Valor da coluna navio para o nº do IMO ou, sem ele, para o nº da capitania."""
+    if imo is not None and str(imo).strip():
+        return str(imo).strip()
+    if capitania is not None and str(capitania).strip():
+        return f"{PREFIXO_CAPITANIA}{str(capitania).strip()}"
+    raise ValueError("Informe o nº do IMO ou o nº da capitania do navio")
+
+
+def consulta_historico_navios(anos=None):
+    """Consulta que monta ouro.historico_navios: cada atracação do navio com porto, datas, tempos e totais de carga.
+
+    A partição é o ano da atracação; as cargas são somadas por atracação em qualquer ano do arquivo de carga.
+    """
+    return f"""
+        SELECT {EXPRESSAO_NAVIO} AS navio, a.no_do_imo, a.no_da_capitania, a.idatracacao,
+               a.data_chegada, a.data_atracacao, a.data_desatracacao,
+               a.cdtup, a.porto_atracacao, a.berco, a.terminal,
+               a.tipo_de_navegacao_da_atracacao, a.tipo_de_operacao, t.tatracado, t.testadia,
+               COALESCE(c.qtd_cargas, 0) AS qtd_cargas, c.soma_vlpesocargabruta, c.soma_teu, c.soma_qtcarga,
+               a.Ano
+        FROM ouro.atracacao a
+        LEFT JOIN ouro.temposatracacao t ON a.idatracacao = t.idatracacao
+        LEFT JOIN (
+            SELECT idatracacao, COUNT(*) AS qtd_cargas, SUM(vlpesocargabruta) AS soma_vlpesocargabruta,
+                   SUM(teu) AS soma_teu, SUM(qtcarga) AS soma_qtcarga
+            FROM ouro.carga
+            GROUP BY idatracacao
+        ) c ON a.idatracacao = c.idatracacao
+        WHERE {EXPRESSAO_NAVIO} IS NOT NULL{_filtro_anos(anos, "a.Ano")}
+        ORDER BY a.Ano, navio, a.data_atracacao, a.idatracacao
+    """
+
+
+def consulta_historico_navio(navio, anos=None):
+    """Escalas do navio em ordem cronológica; a igualdade em navio permite ignorar os arquivos pelas estatísticas."""
+    navio = navio.replace("'", "''")
+    return f"""
+        SELECT navio, Ano, idatracacao, data_chegada, data_atracacao, data_desatracacao,
+               cdtup, porto_atracacao, berco, terminal, tipo_de_navegacao_da_atracacao, tipo_de_operacao,
+               tatracado, testadia, qtd_cargas, soma_vlpesocargabruta, soma_teu, soma_qtcarga
+        FROM ouro.historico_navios
+        WHERE navio = '{navio}'{_filtro_anos(anos)}
+        ORDER BY data_atracacao, idatracacao
+    """
+
+
+# Consultas das perguntas de negócio sobre a camada ouro. Escritas em SQL comum ao Spark e ao
+# DuckDB, para que a execução local responda às mesmas perguntas (as dicas BROADCAST são
+# comentários para o DuckDB).
+CONSULTAS_OURO = {
+    "tempo_medio_atracacao_por_porto": """
+        SELECT /*+ BROADCAST(p) */ p.porto_atracacao, SUM(m.soma_tatracado) / SUM(m.qtd_tatracado) AS tempo_medio_atracacao
+        FROM ouro.mart_atracacoes m
+        LEFT JOIN ouro.dim_porto p ON m.sk_porto = p.sk_porto
+        GROUP BY p.porto_atracacao
+        HAVING SUM(m.qtd_tatracado) > 0
+        ORDER BY tempo_medio_atracacao DESC
+    """,
+    "volume_carga_por_ano": """
+        SELECT ano_atracacao AS Ano, SUM(soma_vlpesocargabruta) AS total_carga_movimentada
+        FROM ouro.mart_carga
+        WHERE ano_atracacao IS NOT NULL
+        GROUP BY ano_atracacao
+        ORDER BY Ano DESC
+    """,
+    "total_por_natureza_carga": """
+        SELECT natureza_da_carga, SUM(soma_vlpesocargabruta) AS total_movimentado
+        FROM ouro.mart_carga
+        GROUP BY natureza_da_carga
+        ORDER BY total_movimentado DESC
+    """,
+    "terminais_mais_utilizados": """
+        SELECT /*+ BROADCAST(t) */ t.terminal, SUM(m.qtd_atracacoes) AS numero_atracacoes
+        FROM ouro.mart_atracacoes m
+        LEFT JOIN ouro.dim_terminal t ON m.sk_terminal = t.sk_terminal
+        GROUP BY t.terminal
+        ORDER BY numero_atracacoes DESC
+    """,
+    "portos_mais_atracacoes": """
+        SELECT /*+ BROADCAST(p) */ p.porto_atracacao, SUM(m.qtd_atracacoes) AS numero_atracacoes
+        FROM ouro.mart_atracacoes m
+        LEFT JOIN ouro.dim_porto p ON m.sk_porto = p.sk_porto
+        GROUP BY p.porto_atracacao
+        ORDER BY numero_atracacoes DESC
+    """,
+    "mercadorias_longo_curso": """
+        SELECT /*+ BROADCAST(d) */ d.cdmercadoria AS tipo_mercadoria, SUM(m.soma_vlpesocargabruta) AS total_movimentado
+        FROM ouro.mart_carga m
+        LEFT JOIN ouro.dim_mercadoria d ON m.sk_mercadoria = d.sk_mercadoria
+        WHERE m.tipo_de_navegacao_da_atracacao = 'Longo Curso'
+        GROUP BY d.cdmercadoria
+        ORDER BY total_movimentado DESC
+    """,
+    "berco_maior_ocupacao_2023": """
+        SELECT idberco, minutos_ano_ocupado AS TotalTempoOcupacao, taxa_anual_ocupado AS TaxaOcupacao
+        FROM ouro.ocupacao_berco
+        WHERE anotaxaocupacao = 2023
+        ORDER BY TotalTempoOcupacao DESC
+        LIMIT 1
+    """,
+    "tempo_medio_viagem_por_tipo": """
+        SELECT tipo_de_navegacao_da_atracacao AS TipoNavio,
+               SUM(soma_testadia) / NULLIF(SUM(qtd_testadia), 0) AS TempoMedioViagem
+        FROM ouro.mart_atracacoes
+        WHERE tipo_de_navegacao_da_atracacao IS NOT NULL
+        GROUP BY tipo_de_navegacao_da_atracacao
+        ORDER BY TempoMedioViagem DESC
+    """,
+    "principais_rotas_por_peso": """
+        SELECT origem, origem_uf, origem_pais, destino, destino_uf, destino_pais,
+               SUM(soma_vlpesocargabruta) AS total_movimentado, SUM(qtd_cargas) AS qtd_cargas
+        FROM ouro.mart_fluxos
+        GROUP BY origem, origem_uf, origem_pais, destino, destino_uf, destino_pais
+        ORDER BY total_movimentado DESC
+        LIMIT 10
+    """,
+}
+
+# Percentis do tempo de estadia por tipo de navegação, em todos os anos, a partir dos sketches
+CONSULTAS_OURO["percentis_estadia_por_navegacao"] = consulta_percentis("navegacao", "testadia")
+
+
+# Coordenadas do porto informante ("lat, lon" em graus decimais, conforme o Catálogo de Dados)
+PADRAO_COORDENADAS = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*[,;]\s*(-?\d+(?:\.\d+)?)\s*$")
+
+# Precisão do geohash gravado no índice espacial: células de ~150 m x 150 m; as buscas usam prefixos
+GEOHASH_PRECISAO = 7
+_BASE32_GEOHASH = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+RAIO_TERRA_KM = 6371.0088
+KM_POR_GRAU = math.pi * RAIO_TERRA_KM / 180
+
+
+def interpretar_coordenadas(texto):
+    """(latitude, longitude) a partir do texto "lat, lon", ou None se o texto for inválido ou fora dos limites."""
+    encontrado = PADRAO_COORDENADAS.match(texto or "")
+    if not encontrado:
+        return None
+    latitude, longitude = float(encontrado.group(1)), float(encontrado.group(2))
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+
+def geohash(latitude, longitude, precisao=GEOHASH_PRECISAO):
+    """Geohash do ponto: bits de longitude e latitude intercalados, 5 bits por caractere."""
+    limites = [[-90.0, 90.0], [-180.0, 180.0]]
+    codigo, valor, bits, eixo = [], 0, 0, 1
+    while len(codigo) < precisao:
+        minimo, maximo = limites[eixo]
+        meio = (minimo + maximo) / 2
+        coordenada = longitude if eixo else latitude
+        valor = valor * 2 + (coordenada >= meio)
+        limites[eixo] = [meio, maximo] if coordenada >= meio else [minimo, meio]
+        eixo, bits = 1 - eixo, bits + 1
+        if bits == 5:
+            codigo.append(_BASE32_GEOHASH[valor])
+            valor, bits = 0, 0
+    return "".join(codigo)
+
+
+def dimensoes_geohash(precisao):
+    """Altura e largura, em graus, de uma célula de geohash com a precisão informada."""
+    bits = 5 * precisao
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def vizinhos_geohash(codigo):
+    """A célula e as oito vizinhas (menos nos polos, onde não há vizinhas ao norte ou ao sul)."""
+    altura, largura = dimensoes_geohash(len(codigo))
+    latitude_min, longitude_min = _canto_geohash(codigo)
+    centro_latitude, centro_longitude = latitude_min + altura / 2, longitude_min + largura / 2
+
+    celulas = set()
+    for passo_latitude in (-1, 0, 1):
+        latitude = centro_latitude + passo_latitude * altura
+        if not -90 < latitude < 90:
+            continue
+        for passo_longitude in (-1, 0, 1):
+            longitude = (centro_longitude + passo_longitude * largura + 180) % 360 - 180
+            celulas.add(geohash(latitude, longitude, len(codigo)))
+    return sorted(celulas)
+
+
+def _canto_geohash(codigo):
+    """Latitude e longitude mínimas (canto sudoeste) da célula."""
+    limites = [[-90.0, 90.0], [-180.0, 180.0]]
+    eixo = 1
+    for caractere in codigo:
+        valor = _BASE32_GEOHASH.index(caractere)
+        for deslocamento in range(4, -1, -1):
+            minimo, maximo = limites[eixo]
+            meio = (minimo + maximo) / 2
+            limites[eixo] = [meio, maximo] if valor >> deslocamento & 1 else [minimo, meio]
+            eixo = 1 - eixo
+    return limites[0][0], limites[1][0]
+
+
+def precisao_para_raio(latitude, raio_km):
+    """Maior precisão cujas células cobrem o raio: a célula do ponto e as vizinhas contêm todo o círculo."""
+    # A largura em km encolhe com a latitude: usa a latitude mais distante do equador dentro do raio
+    latitude_extrema = min(90.0, abs(latitude) + raio_km / KM_POR_GRAU)
+    for precisao in range(GEOHASH_PRECISAO, 0, -1):
+        altura, largura = dimensoes_geohash(precisao)
+        largura_km = largura * KM_POR_GRAU * math.cos(math.radians(latitude_extrema))
+        if min(altura * KM_POR_GRAU, largura_km) >= raio_km:
+            return precisao
+    return 1
+
+
+def celulas_busca(latitude, longitude, raio_km):
+    """(precisão, prefixos de geohash) que cobrem o círculo: os candidatos de uma busca por raio."""
+    precisao = precisao_para_raio(latitude, raio_km)
+    return precisao, vizinhos_geohash(geohash(latitude, longitude, precisao))
+
+
+def distancia_km(latitude1, longitude1, latitude2, longitude2):
+    """Distância pela fórmula de haversine, em km."""
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    delta_phi, delta_lambda = phi2 - phi1, math.radians(longitude2 - longitude1)
+    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(math.sqrt(a))
@@ -0,0 +1,129 @@
+"""Instrumentação das etapas do pipeline da ANTAQ no Spark.
+
+Cada etapa é executada dentro de medir_etapa, que associa os jobs disparados a um grupo
+(setJobGroup) e, ao final, soma as métricas das tarefas desses jobs: linhas e bytes lidos e
+gravados, shuffle, spill e tempo de GC. As métricas vêm da API REST da interface do Spark
+(/api/v1/applications/<id>/stages/<estagio>), a mesma usada pela aba Stages.
+
+Como o Spark é preguiçoso, etapas que apenas montam o plano (leitura, renomeação) registram só o
+tempo de parede; a leitura dos arquivos aparece nas métricas da etapa que grava o resultado.
+
+Cada etapa é impressa como uma linha JSON e acumulada na lista informada; gravar_metricas
+acrescenta a lista à tabela de métricas (e, opcionalmente, a um arquivo JSON lines).
+"""
+import json
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from pyspark import SparkContext
+from pyspark.sql import SparkSession
+
+TABELA_METRICAS = "qualidade.metricas_etapas"
+
+ESQUEMA_METRICAS = """
+    id_execucao STRING, etapa STRING, tabela STRING, inicio TIMESTAMP, segundos DOUBLE,
+    jobs INT, tarefas BIGINT, linhas_entrada BIGINT, linhas_saida BIGINT, bytes_lidos BIGINT,
+    bytes_gravados BIGINT, shuffle_leitura_bytes BIGINT, shuffle_gravacao_bytes BIGINT,
+    spill_memoria_bytes BIGINT, spill_disco_bytes BIGINT, tempo_execucao_ms BIGINT, tempo_gc_ms BIGINT
+"""
+
+# Métricas das tarefas (campos da API REST por estágio) -> colunas da tabela de métricas
+METRICAS_ESTAGIO = {
+    "numCompleteTasks": "tarefas",
+    "inputRecords": "linhas_entrada",
+    "outputRecords": "linhas_saida",
+    "inputBytes": "bytes_lidos",
+    "outputBytes": "bytes_gravados",
+    "shuffleReadBytes": "shuffle_leitura_bytes",
+    "shuffleWriteBytes": "shuffle_gravacao_bytes",
+    "memoryBytesSpilled": "spill_memoria_bytes",
+    "diskBytesSpilled": "spill_disco_bytes",
+    "executorRunTime": "tempo_execucao_ms",
+    "jvmGcTime": "tempo_gc_ms",
+}
+
+# Os eventos das tarefas chegam à interface de forma assíncrona: espera até os estágios terminarem
+ESPERA_METRICAS_S = 5
+ESTADOS_FINAIS = {"COMPLETE", "FAILED", "SKIPPED"}
+
+
+def _consultar_estagio(url_base, id_estagio):
+    """Tentativas do estágio na API REST; lista vazia se a interface não estiver acessível."""
+    try:
+        with urllib.request.urlopen(f"{url_base}/stages/{id_estagio}", timeout=5) as resposta:
+            return json.load(resposta)
+    except (OSError, ValueError):
+        return []
+
+
+def metricas_dos_jobs(sc, ids_jobs):
+    """Soma as métricas das tarefas de todos os estágios dos jobs; None nas métricas indisponíveis."""
+    ids_estagios = sorted({
+        id_estagio
+        for id_job in ids_jobs
+        for id_estagio in (getattr(sc.statusTracker().getJobInfo(id_job), "stageIds", None) or [])
+    })
+    totais = dict.fromkeys(METRICAS_ESTAGIO.values())
+    if not ids_estagios or not sc.uiWebUrl:
+        return totais
+
+    url_base = f"{sc.uiWebUrl.rstrip('/')}/api/v1/applications/{sc.applicationId}"
+    limite = time.monotonic() + ESPERA_METRICAS_S
+    while True:
+        tentativas = [tentativa for id_estagio in ids_estagios for tentativa in _consultar_estagio(url_base, id_estagio)]
+        if all(tentativa.get("status") in ESTADOS_FINAIS for tentativa in tentativas) or time.monotonic() > limite:
+            break
+        time.sleep(0.2)
+
+    if tentativas:
+        totais = {coluna: sum(tentativa.get(campo) or 0 for tentativa in tentativas) for campo, coluna in METRICAS_ESTAGIO.items()}
+    return totais
+
+
+@contextmanager
+def medir_etapa(metricas, id_execucao, etapa, tabela=None):
+    """Mede a etapa executada no bloco e acrescenta o registro à lista metricas.
+
+    O registro é entregue ao bloco: etapas executadas no driver (descoberta, manifesto) podem
+    informar linhas_saida diretamente, já que não disparam jobs.
+    """
+    # SparkContext.getOrCreate em vez da sessão ativa: nas threads de executar_grafo não há sessão ativa
+    sc = SparkContext.getOrCreate()
+    grupo = f"{etapa}_{tabela or ''}_{uuid.uuid4().hex[:8]}"
+    registro = {"id_execucao": id_execucao, "etapa": etapa, "tabela": tabela, "inicio": datetime.now()}
+
+    sc.setJobGroup(grupo, f"{etapa} {tabela or ''}".strip())
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        registro["segundos"] = round(time.perf_counter() - inicio, 3)
+        sc.setLocalProperty("spark.jobGroup.id", None)
+        sc.setLocalProperty("spark.job.description", None)
+
+        ids_jobs = sc.statusTracker().getJobIdsForGroup(grupo)
+        registro["jobs"] = len(ids_jobs)
+        informadas = {coluna: valor for coluna, valor in registro.items() if coluna in METRICAS_ESTAGIO.values()}
+        registro.update(metricas_dos_jobs(sc, ids_jobs))
+        registro.update(informadas)
+
+        metricas.append(registro)
+        print(json.dumps(registro, default=str, ensure_ascii=False))
+
+
+def gravar_metricas(metricas, tabela=TABELA_METRICAS, arquivo_jsonl=None):
+    """Acrescenta os registros à tabela de métricas e, se informado, a um arquivo JSON lines."""
+    if not metricas:
+        return
+    spark = SparkSession.builder.getOrCreate()
+    colunas = [definicao.split()[0] for definicao in ESQUEMA_METRICAS.split(",")]
+    linhas = [tuple(registro.get(coluna) for coluna in colunas) for registro in metricas]
+    spark.createDataFrame(linhas, ESQUEMA_METRICAS).write.mode("append").saveAsTable(tabela)
+
+    if arquivo_jsonl:
+        with open(arquivo_jsonl, "a", encoding="utf-8") as arquivo:
+            for registro in metricas:
+                arquivo.write(json.dumps(registro, default=str, ensure_ascii=False) + "\n")
@@ -0,0 +1,185 @@
+"""Leitura tipada e preparação das camadas da ANTAQ no Spark.
+
+Funções compartilhadas pelo notebook do Databricks e pelo modo streaming (pipeline_streaming.py):
+leitura dos arquivos com o esquema do registro, quarentena, colunas Ano e hash_linha e
+conversão das datas da camada prata.
+"""
+from functools import reduce
+
+from pyspark import StorageLevel
+from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
+
+from antaq_comum import (
+    DURACOES_ATRACACAO,
+    ESQUEMAS_ANTAQ,
+    RAIO_TERRA_KM,
+    colunas_data_hora,
+    normalizar_nome_coluna,
+    particao_da_tabela,
+    verificar_colisoes,
+)
+
+# Coluna que recebe a linha original quando ela não respeita o esquema
+COLUNA_CORROMPIDA = "_corrupt_record"
+
+# Opções comuns de leitura dos arquivos .txt da ANTAQ.
+# Caso os arquivos venham com vírgula como separador decimal, incluir "locale": "pt-BR".
+OPCOES_LEITURA_CSV = {
+    "header": "true",
+    "sep": ";",
+    "mode": "PERMISSIVE",
+    "columnNameOfCorruptRecord": COLUNA_CORROMPIDA,
+}
+
+
+def clean_column_names(df):
+    """Normaliza todos os nomes de colunas do DataFrame em uma única projeção."""
+    cleaned_columns = [normalizar_nome_coluna(nome) for nome in df.columns]
+    verificar_colisoes(df.columns, cleaned_columns)
+    if cleaned_columns == df.columns:
+        return df
+    return df.toDF(*cleaned_columns)
+
+
+def renomear_coluna_a_coluna(df):
+    """Renomeação antiga, mantida como referência nas comparações: uma projeção por coluna renomeada."""
+    for nome in df.columns:
+        df = df.withColumnRenamed(nome, normalizar_nome_coluna(nome))
+    return df
+
+
+def esquema_ddl(tipo, cabecalho=None):
+    """Monta o esquema em formato DDL, incluindo a coluna de registros corrompidos.
+
+    Quando o cabeçalho do arquivo é informado, as colunas seguem a ordem do cabeçalho,
+    de modo que o tipo de cada coluna é associado pelo nome e não pela posição.
+    Os nomes já saem normalizados, dispensando a renomeação após a leitura.
+    """
+    tipos = {normalizar_nome_coluna(nome): tipo_coluna for nome, tipo_coluna in ESQUEMAS_ANTAQ[tipo]}
+    if cabecalho is None:
+        cabecalho = [nome for nome, _ in ESQUEMAS_ANTAQ[tipo]]
+
+    nomes = [normalizar_nome_coluna(nome) for nome in cabecalho]
+    verificar_colisoes(cabecalho, nomes)
+
+    # Datas permanecem como texto na leitura: a conversão é feita uma única vez na camada prata
+    tipos = {nome: "STRING" if tipo_coluna == "TIMESTAMP" else tipo_coluna for nome, tipo_coluna in tipos.items()}
+    colunas = [f"`{nome}` {tipos.get(nome, 'STRING')}" for nome in nomes]
+    colunas.append(f"`{COLUNA_CORROMPIDA}` STRING")
+    return ", ".join(colunas)
+
+
+def ler_tabela_antaq(caminhos, tipo, cabecalho=None):
+    """Lê um ou mais arquivos da ANTAQ aplicando o esquema tipado do registro.
+
+    Os arquivos são lidos em uma única varredura e cada linha recebe o caminho do
+    arquivo de origem na coluna "_arquivo_origem".
+    """
+    leitor = SparkSession.getActiveSession().read.options(**OPCOES_LEITURA_CSV)
+    if tipo in ESQUEMAS_ANTAQ:
+        leitor = leitor.schema(esquema_ddl(tipo, cabecalho))
+    else:
+        print(f"⚠️ Tabela sem esquema registrado, lida como texto: {tipo}")
+    return leitor.csv(caminhos).withColumn("_arquivo_origem", F.col("_metadata.file_path"))
+
+
+def separar_quarentena(df, nome_tabela):
+    """Separa as linhas que não respeitaram o esquema. Retorna (df_valido, df_quarentena, df_lido).
+
+    O Spark não permite consultar uma leitura de CSV usando apenas a coluna de registros corrompidos,
+    pois a detecção depende das colunas lidas: as duas partes são derivadas da leitura persistida
+    (df_lido), que quem chama libera com unpersist depois de gravar a quarentena e a bronze.
+    """
+    if COLUNA_CORROMPIDA not in df.columns:
+        return df, None, None
+
+    df = df.persist(StorageLevel.MEMORY_AND_DISK)
+    df_quarentena = (
+        df.filter(F.col(COLUNA_CORROMPIDA).isNotNull())
+          .select(
+              F.lit(nome_tabela).alias("tabela"),
+              F.col("_arquivo_origem").alias("arquivo"),
+              F.col(COLUNA_CORROMPIDA).alias("registro"),
+              F.current_timestamp().alias("data_carga"),
+          )
+    )
+    df_valido = df.filter(F.col(COLUNA_CORROMPIDA).isNull()).drop(COLUNA_CORROMPIDA)
+    return df_valido, df_quarentena, df
+
+
+def ler_por_cabecalho(tipo, caminhos_por_cabecalho):
+    """Lê os arquivos de um tipo agrupados pelo cabeçalho ({cabeçalho: [caminhos]}).
+
+    Arquivos com o mesmo cabeçalho são lidos em uma única varredura de vários caminhos;
+    se a ordem das colunas mudar entre anos, cada variação é lida com seu próprio
+    esquema e as leituras são unidas pelo nome das colunas.
+    Retorna (df_valido, df_quarentena, df_lido), como separar_quarentena; o df_valido mantém a
+    coluna "_arquivo_origem".
+    """
+    dfs = [ler_tabela_antaq(caminhos, tipo, list(cabecalho)) for cabecalho, caminhos in caminhos_por_cabecalho.items()]
+    df = reduce(lambda esquerda, direita: esquerda.unionByName(direita, allowMissingColumns=True), dfs)
+    return separar_quarentena(df, tipo)
+
+
+def incluir_hash_linha(df):
+    """Inclui a coluna hash_linha (xxhash64 de todas as colunas), usada para detectar e remover duplicados
+    por uma chave estreita, sem agrupar pelas linhas inteiras."""
+    colunas = [F.col(f"`{coluna}`") for coluna in df.columns if coluna != "_arquivo_origem"]
+    return df.withColumn("hash_linha", F.xxhash64(*colunas))
+
+
+def remover_ja_presentes(df, tabela):
+    """Remove do DataFrame as linhas cujo hash_linha já existe na tabela.
+
+    Lê apenas a coluna hash_linha das partições presentes no DataFrame, sem reler a tabela inteira.
+    """
+    spark = df.sparkSession
+    if not spark.catalog.tableExists(tabela):
+        return df
+    existentes = spark.table(tabela)
+    particao = particao_da_tabela(tabela.split(".")[-1], existentes.columns)
+    if particao:
+        valores = [linha[0] for linha in df.select(particao).distinct().collect()]
+        filtro = F.col(particao).isin([valor for valor in valores if valor is not None])
+        if None in valores:
+            filtro = filtro | F.col(particao).isNull()
+        existentes = existentes.filter(filtro)
+    return df.join(existentes.select("hash_linha"), on="hash_linha", how="left_anti")
+
+
+def incluir_ano(df):
+    """Inclui a coluna Ano a partir do nome do arquivo (ex.: .../2021Carga_txt_part1 -> 2021); nula para as tabelas de apoio."""
+    ano = F.regexp_extract(F.col("_arquivo_origem"), r"/(\d{4})[^/]*$", 1)
+    return df.withColumn("Ano", F.when(ano != "", ano.cast("int"))).drop("_arquivo_origem")
+
+
+# Formatos aceitos nas colunas de data/hora, em ordem de preferência
+FORMATOS_DATA_HORA = ["yyyy-MM-dd HH:mm:ss", "dd/MM/yyyy HH:mm:ss", "yyyy-MM-dd", "dd/MM/yyyy"]
+
+def converter_data_hora(coluna):
+    """Converte texto em timestamp testando os formatos aceitos; valores inválidos viram nulo."""
+    return F.coalesce(*[F.expr(f"try_to_timestamp(`{coluna}`, '{formato}')") for formato in FORMATOS_DATA_HORA])
+
+
+def horas_entre(inicio, fim):
+    """Diferença em horas entre dois timestamps, no mesmo tipo das colunas de temposatracacao."""
+    return ((F.unix_timestamp(fim) - F.unix_timestamp(inicio)) / 3600).cast("decimal(18,4)")
+
+
+def distancia_ate(latitude, longitude):
+    """Distância, em km (haversine), entre as colunas latitude/longitude e o ponto informado."""
+    phi1, phi2 = F.radians(F.lit(latitude)), F.radians(F.col("latitude"))
+    delta_phi, delta_lambda = phi2 - phi1, F.radians(F.col("longitude") - F.lit(longitude))
+    a = F.pow(F.sin(delta_phi / 2), 2) + F.cos(phi1) * F.cos(phi2) * F.pow(F.sin(delta_lambda / 2), 2)
+    return 2 * RAIO_TERRA_KM * F.asin(F.sqrt(a))
+
+
+def preparar_prata(tipo, df):
+    """Converte as datas para timestamp em uma única projeção e, na atracação, inclui T1 a T4, TA e TE."""
+    datas = set(colunas_data_hora(tipo))
+    df = df.select([converter_data_hora(coluna).alias(coluna) if coluna in datas else F.col(f"`{coluna}`") for coluna in df.columns])
+
+    if tipo == "atracacao":
+        df = df.select("*", *[horas_entre(inicio, fim).alias(nome) for nome, (inicio, fim, _) in DURACOES_ATRACACAO.items()])
+    return df
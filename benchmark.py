@@ -0,0 +1,226 @@
+"""Benchmark do pipeline da ANTAQ por fator de escala, sobre os dados sintéticos.
+
+Para cada escala, gera os arquivos com gerador_sintetico.py (se ainda não existirem), executa as
+etapas do pipeline local (bronze, prata e ouro) e cada consulta de CONSULTAS_OURO, e registra a
+mediana dos tempos das repetições em um arquivo JSON lines. Cada registro guarda a data, o commit
+do git, a escala, a etapa ou consulta, os segundos e as linhas, para que as execuções possam ser
+comparadas entre alterações do código.
+
+As medidas do próprio script são do pipeline local (DuckDB, motor "duckdb"). As do notebook no
+Spark são acrescentadas ao mesmo arquivo, com motor "spark", a partir das métricas de medir_etapa
+exportadas pelo notebook (ARQUIVO_METRICAS) em uma execução sobre os mesmos dados sintéticos;
+as comparações são sempre entre execuções do mesmo motor.
+
+Uso:
+    pip install duckdb
+    python benchmark.py --escalas 1 10 --repeticoes 3
+    python benchmark.py --escalas 100 --dados /mnt/sintetico --comparar
+    python benchmark.py --escalas 10 --metricas-notebook metricas_etapas.jsonl --comparar
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from antaq_comum import CONSULTAS_OURO
+from gerador_sintetico import gerar
+from pipeline_local import (
+    carregar_bronze,
+    carregar_ouro,
+    carregar_prata,
+    conectar,
+    descobrir_arquivos,
+    tabelas_da_camada,
+)
+
+ARQUIVO_RESULTADOS = os.path.join("benchmarks", "resultados.jsonl")
+
+# Arquivo gravado ao final da geração: um diretório sem ele (geração interrompida) é gerado de novo
+MARCADOR_GERACAO = "_GERADO"
+
+# Variação, em relação à execução anterior, a partir da qual a comparação destaca a medida
+LIMIAR_VARIACAO = 0.10
+
+
+def commit_atual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def preparar_dados(diretorio_dados, escala, anos, semente):
+    """Diretório com os arquivos sintéticos da escala, gerados apenas na primeira vez."""
+    diretorio = os.path.join(diretorio_dados, f"escala_{escala:g}_{anos[0]}_{anos[-1]}_s{semente}")
+    if not os.path.exists(os.path.join(diretorio, MARCADOR_GERACAO)):
+        shutil.rmtree(diretorio, ignore_errors=True)
+        inicio = time.perf_counter()
+        gerar(diretorio, escala, anos, semente)
+        open(os.path.join(diretorio, MARCADOR_GERACAO), "w").close()
+        print(f"🧪 Dados da escala {escala:g} gerados em {time.perf_counter() - inicio:.2f} s")
+    return diretorio
+
+
+def linhas_da_camada(con, camada):
+    return sum(con.execute(f"SELECT COUNT(*) FROM {camada}.{tabela}").fetchone()[0] for tabela in tabelas_da_camada(con, camada))
+
+
+def medir_execucao(origem, threads):
+    """Uma execução completa: {(tipo, nome): (segundos, linhas)} para cada etapa e consulta."""
+    destino = tempfile.mkdtemp(prefix="antaq_benchmark_")
+    medidas = {}
+    try:
+        con = conectar(threads)
+        etapas = [
+            ("bronze", lambda: carregar_bronze(con, descobrir_arquivos(origem), destino)),
+            ("prata", lambda: carregar_prata(con, destino)),
+            ("ouro", lambda: carregar_ouro(con, destino)),
+        ]
+        for nome_etapa, etapa in etapas:
+            inicio = time.perf_counter()
+            etapa()
+            medidas[("etapa", nome_etapa)] = (time.perf_counter() - inicio, linhas_da_camada(con, nome_etapa))
+
+        # Cada consulta é materializada por completo, como no notebook (display/coleta do resultado)
+        for nome_consulta, consulta in CONSULTAS_OURO.items():
+            inicio = time.perf_counter()
+            linhas = len(con.sql(consulta).fetchall())
+            medidas[("consulta", nome_consulta)] = (time.perf_counter() - inicio, linhas)
+        con.close()
+    finally:
+        shutil.rmtree(destino, ignore_errors=True)
+    return medidas
+
+
+def resumir_execucoes(execucoes, motor, escala, anos, semente, threads):
+    """Registros (um por etapa e consulta) com a mediana dos tempos das execuções."""
+    base = {
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit_atual(),
+        "motor": motor,
+        "escala": escala,
+        "anos": [anos[0], anos[-1]],
+        "semente": semente,
+        "threads": threads,
+        "repeticoes": len(execucoes),
+    }
+    registros = []
+    for tipo, nome in execucoes[0]:
+        tempos = [execucao[(tipo, nome)][0] for execucao in execucoes if (tipo, nome) in execucao]
+        registros.append({
+            **base,
+            "tipo": tipo,
+            "nome": nome,
+            "segundos": round(statistics.median(tempos), 4),
+            "segundos_min": round(min(tempos), 4),
+            "linhas": execucoes[0][(tipo, nome)][1],
+        })
+    return registros
+
+
+def executar_benchmark(escala, anos, diretorio_dados, repeticoes, threads, semente):
+    """Mede o pipeline local nas repetições pedidas."""
+    origem = preparar_dados(diretorio_dados, escala, anos, semente)
+    execucoes = [medir_execucao(origem, threads) for _ in range(repeticoes)]
+    return resumir_execucoes(execucoes, "duckdb", escala, anos, semente, threads or os.cpu_count())
+
+
+def medidas_do_notebook(caminho):
+    """Uma execução por id_execucao, no formato de medir_execucao, a partir das métricas de medir_etapa do notebook.
+
+    As tabelas de uma etapa são gravadas em paralelo: o tempo da etapa vai do início do primeiro
+    registro ao fim do último, e as linhas são as gravadas (linhas_saida) somadas. Cada consulta de
+    CONSULTAS_OURO (etapa consulta_ouro) é uma medida do tipo "consulta".
+    """
+    por_execucao = defaultdict(lambda: defaultdict(list))
+    for metrica in ler_resultados(caminho):
+        chave = ("consulta", metrica["tabela"]) if metrica["etapa"] == "consulta_ouro" else ("etapa", metrica["etapa"])
+        por_execucao[metrica["id_execucao"]][chave].append(metrica)
+
+    execucoes = []
+    for grupos in por_execucao.values():
+        execucao = {}
+        for chave, metricas in grupos.items():
+            inicios = [datetime.fromisoformat(metrica["inicio"]).timestamp() for metrica in metricas]
+            fim = max(inicio + metrica["segundos"] for inicio, metrica in zip(inicios, metricas))
+            execucao[chave] = (fim - min(inicios), sum(metrica.get("linhas_saida") or 0 for metrica in metricas))
+        execucoes.append(execucao)
+    return execucoes
+
+
+def ler_resultados(caminho):
+    if not os.path.exists(caminho):
+        return []
+    with open(caminho, encoding="utf-8") as arquivo:
+        return [json.loads(linha) for linha in arquivo if linha.strip()]
+
+
+def gravar_resultados(caminho, registros):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    with open(caminho, "a", encoding="utf-8") as arquivo:
+        for registro in registros:
+            arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+def comparar_com_anterior(registros, anteriores):
+    """Compara cada medida com a última execução registrada no mesmo motor, escala, anos e semente."""
+    chave = lambda registro: (
+        registro.get("motor", "duckdb"), registro["escala"], tuple(registro["anos"]), registro["semente"], registro["tipo"], registro["nome"]
+    )
+    ultimos = {chave(registro): registro for registro in anteriores}
+    for registro in registros:
+        anterior = ultimos.get(chave(registro))
+        if anterior is None:
+            continue
+        variacao = registro["segundos"] / anterior["segundos"] - 1 if anterior["segundos"] else 0.0
+        marca = "🔺" if variacao > LIMIAR_VARIACAO else "🔻" if variacao < -LIMIAR_VARIACAO else "  "
+        print(f"{marca} {registro['tipo']} {registro['nome']}: {anterior['segundos']:.3f} s "
+              f"({anterior['commit']}) -> {registro['segundos']:.3f} s ({variacao:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede o pipeline local da ANTAQ em dados sintéticos por fator de escala.")
+    parser.add_argument("--escalas", type=float, nargs="+", default=[1.0], help="fatores de escala (1 a 100)")
+    parser.add_argument("--anos", type=int, nargs=2, default=[2020, 2024], metavar=("INICIO", "FIM"))
+    parser.add_argument("--dados", default=os.path.join("benchmarks", "dados"), help="diretório dos dados sintéticos")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--resultados", default=ARQUIVO_RESULTADOS, help="arquivo JSON lines com o histórico")
+    parser.add_argument("--comparar", action="store_true", help="compara com a execução anterior de cada escala")
+    parser.add_argument("--metricas-notebook", default=None,
+                        help="JSON lines de medir_etapa exportado pelo notebook (ARQUIVO_METRICAS): registra a execução "
+                             "do Spark na escala, anos e semente informados, em vez de medir o pipeline local")
+    argumentos = parser.parse_args()
+
+    anos = list(range(argumentos.anos[0], argumentos.anos[1] + 1))
+    anteriores = ler_resultados(argumentos.resultados)
+    if argumentos.metricas_notebook and len(argumentos.escalas) != 1:
+        parser.error("--metricas-notebook exige uma única escala (a dos dados usados pelo notebook)")
+    for escala in argumentos.escalas:
+        if argumentos.metricas_notebook:
+            execucoes = medidas_do_notebook(argumentos.metricas_notebook)
+            if not execucoes:
+                parser.error(f"nenhuma métrica em {argumentos.metricas_notebook}")
+            registros = resumir_execucoes(execucoes, "spark", escala, anos, argumentos.semente, argumentos.threads)
+        else:
+            registros = executar_benchmark(escala, anos, argumentos.dados, argumentos.repeticoes, argumentos.threads, argumentos.semente)
+        gravar_resultados(argumentos.resultados, registros)
+        print(f"📊 Escala {escala:g} ({registros[0]['motor']}):")
+        for registro in registros:
+            print(f"   {registro['tipo']} {registro['nome']}: {registro['segundos']:.3f} s, Linhas: {registro['linhas']}")
+        if argumentos.comparar:
+            comparar_com_anterior(registros, anteriores)
+
+
+if __name__ == "__main__":
+    main()
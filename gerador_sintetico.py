@@ -0,0 +1,478 @@
+"""Gerador de dados sintéticos da ANTAQ para testes de desempenho.
+
+Gera arquivos no mesmo formato dos extratos do Estatístico Aquaviário, para todas as tabelas
+do Catálogo de Dados: separados por ";", com os cabeçalhos originais em português, um arquivo
+por tabela e ano (tabelas de apoio sem ano) e as tabelas grandes divididas em partes _txt_partN.
+
+Os dados são referencialmente consistentes (cargas apontam para atracações existentes, berços
+pertencem aos portos, códigos de mercadoria e de origem/destino existem nas tabelas de apoio,
+tempos de atracação batem com as datas) e têm assimetria realista: poucos portos concentram a
+maior parte das atracações, poucas mercadorias a maior parte das cargas e alguns navios fazem
+muitas escalas. Uma pequena fração das linhas de carga_conteinerizada é duplicada, como nos
+arquivos reais. Com --linhas-invalidas, cada arquivo de atracação recebe linhas fora do esquema
+(texto no IDAtracacao), para conferir a quarentena.
+
+A geração é feita com o DuckDB, com números pseudoaleatórios derivados do hash dos
+identificadores: a mesma semente produz os mesmos arquivos, independentemente do número de threads.
+
+Uso:
+    pip install duckdb
+    python gerador_sintetico.py --destino dados/sintetico --escala 1
+    python gerador_sintetico.py --destino dados/sintetico_100x --escala 100 --anos 2020 2024
+    python gerador_sintetico.py --destino dados/sintetico_quarentena --escala 0.1 --linhas-invalidas 5
+"""
+import argparse
+import math
+import os
+import random
+import time
+
+import duckdb
+
+from antaq_comum import ESQUEMAS_ANTAQ, tipo_da_tabela
+
+# Volume de referência (escala 1): atracações por ano; as demais tabelas derivam das atracações
+ATRACACOES_POR_ANO = 10_000
+
+# Média aproximada de cargas por atracação de movimentação de carga
+CARGAS_POR_ATRACACAO = 8
+
+# Partes _txt_partN com no máximo este número de linhas (sem contar o cabeçalho)
+LINHAS_POR_PARTE = 50_000
+
+NUMERO_PORTOS = 40
+NUMERO_LOCAIS_EXTERIOR = 60
+NUMERO_MERCADORIAS = 120
+NUMERO_MERCADORIAS_CONTEINERIZADAS = 60
+
+# Navios distintos na escala 1; cresce com a raiz da escala (mais escalas por navio em escalas maiores)
+NAVIOS_ESCALA_1 = 1_500
+
+# Fração das linhas de carga_conteinerizada repetidas
+FRACAO_DUPLICADOS = 0.01
+
+# Nome do arquivo de cada tabela (sem o ano), como nos extratos da ANTAQ
+NOMES_ARQUIVOS = {
+    "atracacao": "Atracacao",
+    "carga": "Carga",
+    "carga_conteinerizada": "Carga_Conteinerizada",
+    "carga_hidrovia": "Carga_Hidrovia",
+    "carga_regiao": "Carga_Regiao",
+    "carga_rio": "Carga_Rio",
+    "taxaocupacao": "TaxaOcupacao",
+    "taxaocupacaocomcarga": "TaxaOcupacaoComCarga",
+    "taxaocupacaotoatracacao": "TaxaOcupacaoTOAtracacao",
+    "temposatracacao": "TemposAtracacao",
+    "temposatracacaoparalisacao": "TemposAtracacaoParalisacao",
+    "destino_carga": "InstalacaoDestino",
+    "origem_carga": "InstalacaoOrigem",
+    "mercadoria": "Mercadoria",
+    "mercadoria_conteinerizada": "MercadoriaConteinerizada",
+}
+
+# UF -> (região geográfica, região hidrográfica, município, latitude, longitude)
+UFS = {
+    "SP": ("Sudeste", "Atlântico Sudeste", "Santos", -23.96, -46.33),
+    "RJ": ("Sudeste", "Atlântico Sudeste", "Rio de Janeiro", -22.89, -43.18),
+    "ES": ("Sudeste", "Atlântico Sudeste", "Vitória", -20.32, -40.33),
+    "PR": ("Sul", "Atlântico Sul", "Paranaguá", -25.50, -48.52),
+    "SC": ("Sul", "Atlântico Sul", "Itajaí", -26.90, -48.66),
+    "RS": ("Sul", "Atlântico Sul", "Rio Grande", -32.04, -52.08),
+    "BA": ("Nordeste", "Atlântico Leste", "Salvador", -12.97, -38.51),
+    "PE": ("Nordeste", "Atlântico Nordeste Oriental", "Ipojuca", -8.39, -34.96),
+    "CE": ("Nordeste", "Atlântico Nordeste Oriental", "São Gonçalo do Amarante", -3.54, -38.81),
+    "MA": ("Nordeste", "Atlântico Nordeste Ocidental", "São Luís", -2.57, -44.37),
+    "PA": ("Norte", "Amazônica", "Barcarena", -1.53, -48.73),
+    "AM": ("Norte", "Amazônica", "Manaus", -3.14, -60.02),
+}
+
+# País -> (bigrama, continente, bloco econômico)
+PAISES = {
+    "China": ("CN", "Ásia", "Outros"),
+    "Estados Unidos": ("US", "América do Norte", "NAFTA"),
+    "Países Baixos": ("NL", "Europa", "União Europeia"),
+    "Argentina": ("AR", "América do Sul", "Mercosul"),
+    "Japão": ("JP", "Ásia", "Outros"),
+    "Espanha": ("ES", "Europa", "União Europeia"),
+    "Singapura": ("SG", "Ásia", "ASEAN"),
+    "Chile": ("CL", "América do Sul", "Outros"),
+    "Nigéria": ("NG", "África", "Outros"),
+    "Índia": ("IN", "Ásia", "Outros"),
+}
+
+HIDROVIAS = ["Hidrovia do Madeira", "Hidrovia Tietê-Paraná", "Hidrovia do Amazonas", "Hidrovia do Tapajós", "Hidrovia do São Francisco"]
+RIOS = ["Rio Madeira", "Rio Tietê", "Rio Amazonas", "Rio Tapajós", "Rio São Francisco", "Rio Paraná"]
+DESCRICOES_PARALISACAO = ["Chuva", "Maré", "Quebra de equipamento", "Falta de carga", "Greve", "Manobra"]
+
+# (valor, peso) das distribuições categóricas
+TIPOS_OPERACAO = [
+    ("Movimentação da Carga", 80), ("Passageiro", 4), ("Apoio", 6), ("Marinha", 1),
+    ("Abastecimento", 4), ("Reparo/Manutenção", 3), ("Misto", 1), ("Retirada de Resíduos", 1),
+]
+TIPOS_NAVEGACAO = [("Longo Curso", 45), ("Cabotagem", 30), ("Interior", 12), ("Apoio Portuário", 8), ("Apoio Marítimo", 5)]
+NATUREZAS_CARGA = [("Granel Sólido", 40), ("Granel Líquido e Gasoso", 25), ("Carga Geral", 15), ("Carga Conteinerizada", 20)]
+# STNaturezaCarga, STSH2 e STSH4: se a atracação movimentou uma única natureza, capítulo ou mercadoria
+EXCLUSIVIDADES = [("Exclusivo", 60), ("Compartilhado", 40)]
+
+
+def escolha_ponderada(expressao_uniforme, opcoes):
+    """Expressão CASE que escolhe um valor de opcoes [(valor, peso)] a partir de um número uniforme em [0, 1)."""
+    total = sum(peso for _, peso in opcoes)
+    acumulado, casos = 0, []
+    for valor, peso in opcoes[:-1]:
+        acumulado += peso
+        casos.append(f"WHEN {expressao_uniforme} < {acumulado / total} THEN '{valor}'")
+    return f"CASE {' '.join(casos)} ELSE '{opcoes[-1][0]}' END"
+
+
+def _inserir(con, tabela, colunas, linhas):
+    con.execute(f"CREATE OR REPLACE TEMP TABLE {tabela} ({', '.join(colunas)})")
+    con.executemany(f"INSERT INTO {tabela} VALUES ({', '.join('?' for _ in colunas)})", linhas)
+
+
+def criar_cadastros(con, semente):
+    """Portos, berços, locais de origem/destino e mercadorias usados por todos os anos."""
+    aleatorio = random.Random(semente)
+    ufs = list(UFS)
+
+    portos, bercos, locais = [], [], []
+    for i in range(NUMERO_PORTOS):
+        uf = ufs[i % len(ufs)]
+        regiao, regiao_hidrografica, municipio, latitude, longitude = UFS[uf]
+        cdtup = f"BR{uf}{i:03d}"
+        # Portos com índice menor (os que concentram as atracações) têm mais berços
+        numero_bercos = max(1, 12 - i // 4)
+        em_rio = "Sim" if regiao == "Norte" else "Não"
+        portos.append((
+            i, cdtup, f"Porto Sintético {i + 1:02d}",
+            f"{latitude + aleatorio.uniform(-0.3, 0.3):.6f}, {longitude + aleatorio.uniform(-0.3, 0.3):.6f}",
+            f"Complexo Portuário {municipio}", "Porto Organizado" if i % 3 == 0 else "TUP",
+            municipio, uf, uf, regiao, regiao_hidrografica, em_rio, f"CP{uf}", numero_bercos,
+        ))
+        for j in range(numero_bercos):
+            bercos.append((i, j, f"{cdtup}{j + 1:03d}", f"Berço {j + 1}", f"Terminal {i + 1:02d}-{j // 3 + 1}"))
+        locais.append((len(locais), cdtup, f"Porto Sintético {i + 1:02d}", "BR", "BRA", cdtup, "", regiao_hidrografica, uf, municipio, "Brasil", "América do Sul", "Mercosul"))
+
+    paises = list(PAISES)
+    for i in range(NUMERO_LOCAIS_EXTERIOR):
+        pais = paises[i % len(paises)]
+        bigrama, continente, bloco = PAISES[pais]
+        codigo = f"{bigrama}{chr(65 + i // 26 % 26)}{chr(65 + i % 26)}X"
+        locais.append((len(locais), codigo, f"Porto {pais} {i + 1}", bigrama, f"{bigrama}X", "", "", "", "", "-", pais, continente, bloco))
+
+    _inserir(con, "_portos", [
+        "indice INTEGER", "cdtup VARCHAR", "porto VARCHAR", "coordenadas VARCHAR", "complexo VARCHAR",
+        "autoridade VARCHAR", "municipio VARCHAR", "uf VARCHAR", "sguf VARCHAR", "regiao VARCHAR",
+        "regiao_hidrografica VARCHAR", "em_rio VARCHAR", "capitania VARCHAR", "numero_bercos INTEGER",
+    ], portos)
+    _inserir(con, "_bercos", ["indice_porto INTEGER", "indice INTEGER", "idberco VARCHAR", "berco VARCHAR", "terminal VARCHAR"], bercos)
+    # Os primeiros locais são os portos brasileiros, seguidos pelos portos do exterior
+    _inserir(con, "_locais", [
+        "indice INTEGER", "codigo VARCHAR", "nome VARCHAR", "bigrama VARCHAR", "trigrama VARCHAR", "cdtup VARCHAR", "rio VARCHAR",
+        "regiao_hidrografica VARCHAR", "uf VARCHAR", "cidade VARCHAR", "pais VARCHAR", "continente VARCHAR", "bloco VARCHAR",
+    ], locais)
+
+    _inserir(con, "_mercadorias", ["indice INTEGER", "codigo VARCHAR", "sh2 VARCHAR", "grupo VARCHAR", "nome VARCHAR"], [
+        (i, f"{10 + i * 7 % 89:02d}{i % 100:02d}", f"{10 + i * 7 % 89:02d}", f"Grupo {i % 12 + 1}", f"Mercadoria {i + 1}")
+        for i in range(NUMERO_MERCADORIAS)
+    ])
+    _inserir(con, "_mercadorias_conteinerizadas", ["indice INTEGER", "codigo VARCHAR", "grupo VARCHAR", "nome VARCHAR"], [
+        (i, f"{20 + i % 70:02d}{i:02d}", f"{i % 8 + 1}", f"Mercadoria Conteinerizada {i + 1}")
+        for i in range(NUMERO_MERCADORIAS_CONTEINERIZADAS)
+    ])
+
+
+def criar_funcoes(con, semente):
+    """Funções auxiliares: uniforme(id, sal) em [0, 1) e concentrado(id, sal, n) com poucos índices dominantes."""
+    con.execute(f"CREATE OR REPLACE TEMP MACRO uniforme(id, sal) AS (hash(id, sal, {semente}) % 1000000)::DOUBLE / 1000000")
+    con.execute("CREATE OR REPLACE TEMP MACRO concentrado(id, sal, n) AS least(floor(n * pow(uniforme(id, sal), 3))::BIGINT, n - 1)")
+    con.execute("CREATE OR REPLACE TEMP MACRO horas(segundos) AS CAST(segundos / 3600 AS DECIMAL(18,4))")
+    con.execute("CREATE OR REPLACE TEMP MACRO data_antaq(ts) AS strftime(ts, '%d/%m/%Y %H:%M:%S')")
+
+
+def criar_atracacoes(con, ano, escala):
+    """Atracações do ano com as durações de cada fase, em uma tabela temporária usada pelas tabelas dependentes."""
+    quantidade = max(1, round(ATRACACOES_POR_ANO * escala))
+    navios = max(10, round(NAVIOS_ESCALA_1 * math.sqrt(escala)))
+    primeiro_id = (ano - 2000) * 100_000_000
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE _atracacao AS
+        WITH base AS (
+            SELECT {primeiro_id} + i AS id, concentrado({primeiro_id} + i, 1, {NUMERO_PORTOS}) AS indice_porto
+            FROM range({quantidade}) r(i)
+        )
+        SELECT b.id, p.*,
+               br.idberco, br.berco, br.terminal,
+               TIMESTAMP '{ano}-01-01' + to_seconds(floor(uniforme(b.id, 3) * 364 * 86400)::BIGINT) AS chegada,
+               floor(pow(uniforme(b.id, 4), 2) * 72 * 3600)::BIGINT AS espera_atracacao,
+               floor(uniforme(b.id, 5) * 6 * 3600)::BIGINT AS espera_inicio,
+               (2 * 3600 + floor(pow(uniforme(b.id, 6), 2) * 94 * 3600))::BIGINT AS operacao,
+               floor(uniforme(b.id, 7) * 12 * 3600)::BIGINT AS espera_desatracacao,
+               {escolha_ponderada("uniforme(b.id, 8)", TIPOS_OPERACAO)} AS tipo_operacao,
+               {escolha_ponderada("uniforme(b.id, 9)", TIPOS_NAVEGACAO)} AS tipo_navegacao,
+               CASE WHEN uniforme(b.id, 10) < 0.3 THEN 1 ELSE 2 END AS nacionalidade,
+               9000000 + concentrado(b.id, 11, {navios}) AS imo,
+               1 + floor(pow(uniforme(b.id, 12), 2) * 3 * {CARGAS_POR_ATRACACAO - 1})::INTEGER AS quantidade_cargas
+        FROM base b
+        JOIN _portos p ON p.indice = b.indice_porto
+        JOIN _bercos br ON br.indice_porto = b.indice_porto AND br.indice = hash(b.id, 2) % p.numero_bercos
+    """)
+    con.execute("""
+        CREATE OR REPLACE TEMP TABLE _atracacao AS
+        SELECT *,
+               chegada + to_seconds(espera_atracacao) AS atracacao,
+               chegada + to_seconds(espera_atracacao + espera_inicio) AS inicio_operacao,
+               chegada + to_seconds(espera_atracacao + espera_inicio + operacao) AS termino_operacao,
+               chegada + to_seconds(espera_atracacao + espera_inicio + operacao + espera_desatracacao) AS desatracacao
+        FROM _atracacao
+    """)
+
+
+def criar_cargas(con):
+    """Cargas das atracações de movimentação de carga, com origem ou destino no porto da atracação."""
+    total_locais = con.execute("SELECT COUNT(*) FROM _locais").fetchone()[0]
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE _carga AS
+        WITH base AS (
+            SELECT a.id AS idatracacao, a.id * 100 + j AS id, a.cdtup, a.tipo_navegacao
+            FROM (SELECT *, unnest(range(quantidade_cargas)) AS j FROM _atracacao WHERE tipo_operacao = 'Movimentação da Carga') a
+        ),
+        sorteio AS (
+            SELECT *,
+                   CASE WHEN tipo_navegacao = 'Longo Curso' THEN {NUMERO_PORTOS} + concentrado(id, 21, {total_locais - NUMERO_PORTOS})
+                        ELSE concentrado(id, 21, {NUMERO_PORTOS}) END AS indice_local,
+                   CASE WHEN uniforme(id, 22) < 0.55 THEN 'Embarcados' ELSE 'Desembarcados' END AS sentido,
+                   {escolha_ponderada("uniforme(id, 23)", NATUREZAS_CARGA)} AS natureza,
+                   concentrado(id, 24, {NUMERO_MERCADORIAS}) AS indice_mercadoria,
+                   1 + floor(uniforme(id, 25) * 40)::BIGINT AS quantidade,
+                   CAST(pow(10, 1 + uniforme(id, 26) * 4) AS DECIMAL(18,3)) AS peso
+            FROM base
+        )
+        SELECT s.*, l.codigo AS codigo_local, m.codigo AS cdmercadoria, m.sh2
+        FROM sorteio s
+        JOIN _locais l ON l.indice = s.indice_local
+        JOIN _mercadorias m ON m.indice = s.indice_mercadoria
+    """)
+
+
+def consultas_do_ano(ano):
+    """SELECT de cada tabela anual, com as colunas nomeadas pelos cabeçalhos originais."""
+    flag = lambda condicao: f"CASE WHEN {condicao} THEN 1 ELSE 0 END"
+    conteiner = "natureza = 'Carga Conteinerizada'"
+    interior = "tipo_navegacao = 'Interior'"
+    dias = f"datediff('day', DATE '{ano}-01-01', DATE '{ano + 1}-01-01')"
+    return {
+        "atracacao": ("_atracacao", {
+            "IDAtracacao": "id", "CDTUP": "cdtup", "IDBerco": "idberco", "Berço": "berco",
+            "Porto Atracação": "porto", "Coordenadas": "coordenadas", "Apelido Instalação Portuária": "porto",
+            "Complexo Portuário": "complexo", "Tipo da Autoridade Portuária": "autoridade",
+            "Data Atracação": "data_antaq(atracacao)", "Data Chegada": "data_antaq(chegada)",
+            "Data Desatracação": "data_antaq(desatracacao)", "Data Início Operação": "data_antaq(inicio_operacao)",
+            "Data Término Operação": "data_antaq(termino_operacao)", "Tipo de Operação": "tipo_operacao",
+            "Tipo de Navegação da Atracação": "tipo_navegacao", "Nacionalidade do Armador": "nacionalidade",
+            "FlagMCOperacaoAtracacao": flag("tipo_operacao = 'Movimentação da Carga'"), "Terminal": "terminal",
+            "Município": "municipio", "UF": "uf", "SGUF": "sguf", "Região Geográfica": "regiao",
+            "Região Hidrográfica": "regiao_hidrografica", "Instalação Portuária em Rio": "em_rio",
+            "Nº da Capitania": "capitania", "Nº do IMO": "imo::VARCHAR",
+        }),
+        "temposatracacao": ("_atracacao", {
+            "IDAtracacao": "id", "TEsperaAtracacao": "horas(espera_atracacao)", "TEsperaInicioOp": "horas(espera_inicio)",
+            "TOperacao": "horas(operacao)", "TEsperaDesatracacao": "horas(espera_desatracacao)",
+            "TAtracado": "horas(espera_inicio + operacao + espera_desatracacao)",
+            "TEstadia": "horas(espera_atracacao + espera_inicio + operacao + espera_desatracacao)",
+        }),
+        "temposatracacaoparalisacao": ("_atracacao WHERE uniforme(id, 30) < 0.15", {
+            "IDTemposDescontos": "id * 10", "IDAtracacao": "id",
+            "DescricaoTempoDesconto": f"list_extract({DESCRICOES_PARALISACAO}, (1 + hash(id, 31) % {len(DESCRICOES_PARALISACAO)})::BIGINT)",
+            "DTInicio": "data_antaq(inicio_operacao + to_seconds(floor(operacao * uniforme(id, 32) / 2)::BIGINT))",
+            "DTTermino": "data_antaq(inicio_operacao + to_seconds(floor(operacao * (0.5 + uniforme(id, 33) / 2))::BIGINT))",
+        }),
+        "carga": ("_carga", {
+            "IDCarga": "id", "IDAtracacao": "idatracacao",
+            "Origem": "CASE WHEN sentido = 'Embarcados' THEN cdtup ELSE codigo_local END",
+            "Destino": "CASE WHEN sentido = 'Embarcados' THEN codigo_local ELSE cdtup END",
+            "CDMercadoria": "cdmercadoria", "Tipo Operação da Carga": "'Movimentação de Carga'",
+            "Carga Geral Acondicionamento": f"CASE WHEN natureza = 'Carga Geral' THEN 'Solta' WHEN {conteiner} THEN 'Conteinerizada' END",
+            "ConteinerEstado": f"CASE WHEN {conteiner} THEN CASE WHEN uniforme(id, 27) < 0.8 THEN 'Cheio' ELSE 'Vazio' END END",
+            "Tipo Navegação": "tipo_navegacao", "FlagAutorizacao": "'S'",
+            "FlagCabotagem": flag("tipo_navegacao = 'Cabotagem'"), "FlagCabotagemMovimentacao": flag("tipo_navegacao = 'Cabotagem'"),
+            "FlagConteinerTamanho": f"CASE WHEN {conteiner} THEN CASE WHEN uniforme(id, 28) < 0.6 THEN '40' ELSE '20' END END",
+            "FlagLongoCurso": flag("tipo_navegacao = 'Longo Curso'"), "FlagMCOperacaoCarga": "1",
+            "FlagOffshore": flag("tipo_navegacao = 'Apoio Marítimo'"), "FlagTransporteViaInterioir": flag(interior),
+            "Percurso Transporte em vias Interiores": f"CASE WHEN {interior} THEN 'Interior' END",
+            "Percurso Transporte Interiores": f"CASE WHEN {interior} THEN 'Fluvial' END",
+            "STNaturezaCarga": escolha_ponderada("uniforme(idatracacao, 34)", EXCLUSIVIDADES),
+            "STSH2": escolha_ponderada("uniforme(idatracacao, 35)", EXCLUSIVIDADES),
+            "STSH4": escolha_ponderada("uniforme(idatracacao, 36)", EXCLUSIVIDADES),
+            "Natureza da Carga": "natureza", "Sentido": "sentido",
+            "TEU": f"CASE WHEN {conteiner} THEN CAST(quantidade * 1.5 AS DECIMAL(18,2)) END",
+            "QTCarga": "quantidade", "VLPesoCargaBruta": "peso",
+        }),
+        "carga_conteinerizada": (f"""
+            (SELECT c.id, c.peso, j, uniforme(c.id * 10 + j, 40) AS sorteio
+             FROM (SELECT *, unnest(range((1 + hash(id, 41) % 3)::BIGINT)) AS j FROM _carga WHERE {conteiner}) c
+             UNION ALL
+             SELECT c.id, c.peso, 0 AS j, uniforme(c.id * 10, 40) AS sorteio
+             FROM _carga c WHERE {conteiner} AND uniforme(c.id, 42) < {FRACAO_DUPLICADOS})
+            JOIN _mercadorias_conteinerizadas m ON m.indice = concentrado(id * 10 + j, 43, {NUMERO_MERCADORIAS_CONTEINERIZADAS})
+        """, {
+            "IDCarga": "id", "CDMercadoriaConteinerizada": "codigo",
+            "VLPesoCargaConteinerizada": "CAST(peso * (0.2 + sorteio * 0.3) AS DECIMAL(18,3))",
+        }),
+        "carga_hidrovia": (f"_carga WHERE {interior}", {
+            "IDCarga": "id", "Hidrovia": f"list_extract({HIDROVIAS}, (1 + hash(id, 50) % {len(HIDROVIAS)})::BIGINT)", "ValorMovimentado": "peso",
+        }),
+        "carga_regiao": (f"_carga WHERE {interior}", {
+            "IDCarga": "id", "Região Hidrográfica": "'Amazônica'", "ValorMovimentado": "peso",
+        }),
+        "carga_rio": (f"_carga WHERE {interior}", {
+            "IDCarga": "id", "Rio": f"list_extract({RIOS}, (1 + hash(id, 51) % {len(RIOS)})::BIGINT)", "ValorMovimentado": "peso",
+        }),
+        "taxaocupacao": (_ocupacao(ano, dias), _colunas_ocupacao("TempoEmMinutosdias", "minutos")),
+        "taxaocupacaocomcarga": (
+            f"{_ocupacao(ano, dias)} WHERE uniforme(hash(idberco, dia), 61) < 0.8",
+            _colunas_ocupacao("TempoEmMinutosdiasFlagCarga", "CAST(minutos * 0.85 AS DECIMAL(10,2))"),
+        ),
+        "taxaocupacaotoatracacao": (
+            f"(SELECT *, unnest(['Movimentação da Carga', 'Abastecimento'][1:1 + (hash(idberco, dia) % 2)::INTEGER]) AS operacao "
+            f"FROM {_ocupacao(ano, dias)})",
+            {"DSTipoOperacaoAtracacaoTaxaOcupacao": "operacao",
+             **_colunas_ocupacao("TempoEmMinutosdiasTOAtracacao", "CASE WHEN operacao = 'Abastecimento' THEN CAST(minutos * 0.1 AS DECIMAL(10,2)) ELSE minutos END")},
+        ),
+    }
+
+
+def _ocupacao(ano, dias):
+    """Berço-dias ocupados no ano: portos com mais atracações têm berços mais ocupados."""
+    return f"""(
+        SELECT b.idberco, d.dia, DATE '{ano}-01-01' + d.dia::INTEGER AS data,
+               CAST(60 + floor(uniforme(hash(b.idberco, d.dia), 60) * 1380) AS DECIMAL(10,2)) AS minutos
+        FROM _bercos b
+        CROSS JOIN (SELECT range AS dia FROM range({dias})) d
+        WHERE uniforme(hash(b.idberco, d.dia), 62) < 0.9 - 0.7 * b.indice_porto / {NUMERO_PORTOS}
+    )"""
+
+
+def _colunas_ocupacao(coluna_minutos, expressao_minutos):
+    return {
+        "IDBerco": "idberco", "DiaTaxaOcupacao": "day(data)", "MêsTaxaOcupacao": "month(data)",
+        "AnoTaxaOcupacao": "year(data)", coluna_minutos: expressao_minutos,
+    }
+
+
+def consultas_apoio():
+    return {
+        "origem_carga": ("_locais", {
+            "Origem": "codigo", "Origem Nome": "nome", "CDBigramaOrigem": "bigrama", "CDTrigramaOrigem": "trigrama",
+            "CDTUPOrigem": "cdtup", "Rio Origem": "rio", "Região Hidrográfica Origem": "regiao_hidrografica",
+            "UF.Origem": "uf", "Cidade Origem": "cidade", "País Origem": "pais", "Continente Origem": "continente",
+            "BlocoEconomico_Origem": "bloco",
+        }),
+        "destino_carga": ("_locais", {
+            "Destino": "codigo", "Nome Destino": "nome", "CDBigramaDestino": "bigrama", "CDTrigramaDestino": "trigrama",
+            "CDTUPDestino": "cdtup", "Rio Destino": "rio", "Região Hidrográfica Destino": "regiao_hidrografica",
+            "UF.Destino": "uf", "Cidade Destino": "cidade", "País Destino": "pais", "Continente Destino": "continente",
+            "BlocoEconomico_Destino": "bloco",
+        }),
+        "mercadoria": ("_mercadorias", {
+            "CDMercadoria": "codigo", "CDNCMSH2": "sh2", "Tipo Conteiner": "NULL", "Grupo de Mercadoria": "grupo",
+            "Mercadoria": "nome", "Nomenclatura Simplificada Mercadoria": "nome",
+        }),
+        "mercadoria_conteinerizada": ("_mercadorias_conteinerizadas", {
+            "CDMercadoriaConteinerizada": "codigo", "CDGrupoMercadoriaConteinerizada": "grupo",
+            "Grupo Mercadoria Conteinerizada": "'Grupo ' || grupo", "Mercadoria Conteinerizada": "nome",
+            "Nomenclatura Simplificada Mercadoria Conteinerizada": "nome",
+        }),
+    }
+
+
+def gravar_arquivos(con, destino, tipo, origem, colunas, ano=None, linhas_por_parte=LINHAS_POR_PARTE):
+    """Grava a tabela com os cabeçalhos na ordem do registro, dividida em partes _txt_partN quando necessário."""
+    faltantes = [nome for nome, _ in ESQUEMAS_ANTAQ[tipo] if nome not in colunas]
+    if faltantes:
+        raise ValueError(f"Colunas sem expressão no gerador da tabela {tipo}: {faltantes}")
+
+    selecao = ", ".join(f'{colunas[nome]} AS "{nome}"' for nome, _ in ESQUEMAS_ANTAQ[tipo])
+    con.execute(f"CREATE OR REPLACE TEMP TABLE _saida AS SELECT {selecao} FROM {origem}")
+    linhas = con.execute("SELECT COUNT(*) FROM _saida").fetchone()[0]
+
+    prefixo = f"{ano or ''}{NOMES_ARQUIVOS[tipo]}"
+    partes = max(1, math.ceil(linhas / linhas_por_parte))
+    nomes = [f"{prefixo}.txt"] if partes == 1 else [f"{prefixo}_txt_part{parte}" for parte in range(1, partes + 1)]
+    for parte, nome in enumerate(nomes):
+        assert tipo_da_tabela(nome) == tipo, f"{nome} não é reconhecido como {tipo}"
+        con.execute(f"""
+            COPY (SELECT * EXCLUDE (_linha) FROM (SELECT *, row_number() OVER () - 1 AS _linha FROM _saida)
+                  WHERE _linha >= {parte * linhas_por_parte} AND _linha < {(parte + 1) * linhas_por_parte})
+            TO '{os.path.join(destino, nome)}' (FORMAT csv, HEADER, DELIMITER ';')
+        """)
+    return linhas, len(nomes)
+
+
+def acrescentar_linhas_invalidas(destino, tipo, ano, partes, quantidade):
+    """Acrescenta ao último arquivo da tabela linhas com texto na primeira coluna (numérica no esquema)."""
+    prefixo = f"{ano or ''}{NOMES_ARQUIVOS[tipo]}"
+    nome = f"{prefixo}.txt" if partes == 1 else f"{prefixo}_txt_part{partes}"
+    vazias = ";" * (len(ESQUEMAS_ANTAQ[tipo]) - 1)
+    with open(os.path.join(destino, nome), "a", encoding="utf-8") as arquivo:
+        for linha in range(quantidade):
+            arquivo.write(f"invalido_{ano}_{linha}{vazias}\n")
+
+
+def gerar(destino, escala=1.0, anos=range(2020, 2025), semente=42, linhas_por_parte=LINHAS_POR_PARTE, threads=None,
+          linhas_invalidas=0):
+    """Gera todas as tabelas no diretório de destino e retorna {tabela: linhas}.
+
+    linhas_invalidas: linhas fora do esquema acrescentadas a cada arquivo anual de atracação
+    (não entram na contagem retornada).
+    """
+    os.makedirs(destino, exist_ok=True)
+    con = duckdb.connect()
+    con.execute(f"SET threads = {threads or os.cpu_count()}")
+    # Ordem estável das linhas nos arquivos, para que a mesma semente gere os mesmos arquivos
+    con.execute("SET preserve_insertion_order = true")
+    criar_funcoes(con, semente)
+    criar_cadastros(con, semente)
+
+    linhas_por_tabela = {}
+    for tipo, (origem, colunas) in consultas_apoio().items():
+        linhas_por_tabela[tipo], _ = gravar_arquivos(con, destino, tipo, origem, colunas, linhas_por_parte=linhas_por_parte)
+
+    for ano in anos:
+        inicio = time.perf_counter()
+        criar_atracacoes(con, ano, escala)
+        con.execute("CREATE OR REPLACE TEMP TABLE _atracacao AS SELECT * FROM _atracacao ORDER BY id")
+        criar_cargas(con)
+        con.execute("CREATE OR REPLACE TEMP TABLE _carga AS SELECT * FROM _carga ORDER BY id")
+        for tipo, (origem, colunas) in consultas_do_ano(ano).items():
+            linhas, partes = gravar_arquivos(con, destino, tipo, origem, colunas, ano, linhas_por_parte)
+            if linhas_invalidas and tipo == "atracacao":
+                acrescentar_linhas_invalidas(destino, tipo, ano, partes, linhas_invalidas)
+            linhas_por_tabela[tipo] = linhas_por_tabela.get(tipo, 0) + linhas
+        print(f"Ano {ano} gerado em {time.perf_counter() - inicio:.1f} s")
+
+    con.close()
+    return linhas_por_tabela
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera arquivos sintéticos no formato dos extratos da ANTAQ.")
+    parser.add_argument("--destino", required=True, help="diretório dos arquivos gerados")
+    parser.add_argument("--escala", type=float, default=1.0, help=f"fator de escala (1 = {ATRACACOES_POR_ANO} atracações por ano)")
+    parser.add_argument("--anos", type=int, nargs=2, default=[2020, 2024], metavar=("INICIO", "FIM"), help="intervalo de anos")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--linhas-por-parte", type=int, default=LINHAS_POR_PARTE)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--linhas-invalidas", type=int, default=0, help="linhas fora do esquema por arquivo anual de atracação")
+    argumentos = parser.parse_args()
+
+    linhas = gerar(
+        argumentos.destino, argumentos.escala, range(argumentos.anos[0], argumentos.anos[1] + 1),
+        argumentos.semente, argumentos.linhas_por_parte, argumentos.threads, argumentos.linhas_invalidas,
+    )
+    for tabela, quantidade in sorted(linhas.items()):
+        print(f"Tabela: {tabela}, Linhas: {quantidade}")
+
+
+if __name__ == "__main__":
+    main()
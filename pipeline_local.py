@@ -0,0 +1,588 @@
+"""Execução local do pipeline da ANTAQ, sem cluster Spark.
+
+Executa as mesmas etapas do notebook (leitura -> bronze -> prata -> ouro e as consultas das
+perguntas de negócio) com o DuckDB em processo, lendo os arquivos .txt de um diretório local
+e gravando as camadas em Parquet. A leitura dos CSV é paralela e usa o mesmo registro de
+esquemas do notebook (antaq_comum.py).
+
+Uso:
+    pip install duckdb
+    python pipeline_local.py --origem dados/antaq --destino saida
+    python pipeline_local.py --origem dados/antaq --destino saida --comparar-com resultados_spark
+
+Diferenças em relação ao notebook: cada execução é uma carga completa (não há manifesto), as
+tabelas da ouro não usam buckets e o hash_linha é o hash() do DuckDB em vez do xxhash64 do Spark.
+"""
+import argparse
+import math
+import os
+import shutil
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+import duckdb
+
+from antaq_comum import (
+    ARMAZENAMENTO_BRONZE,
+    ATRIBUTOS_LOCAL_FLUXOS,
+    BITS_HLL,
+    CONSULTAS_OURO,
+    DURACOES_ATRACACAO,
+    ESQUEMAS_ANTAQ,
+    ORDENACAO_BRONZE,
+    colunas_data_hora,
+    consulta_historico_navio,
+    consulta_historico_navios,
+    consulta_sketch_navios,
+    consulta_sketch_tempos,
+    geohash,
+    identificador_navio,
+    interpretar_coordenadas,
+    normalizar_nome_coluna,
+    particao_da_tabela,
+    tipo_da_tabela,
+    verificar_colisoes,
+)
+
+SEPARADOR = ";"
+
+# Tipos do registro de esquemas -> tipos do DuckDB (datas são lidas como texto e convertidas na prata)
+TIPOS_DUCKDB = {"STRING": "VARCHAR", "INT": "INTEGER", "TIMESTAMP": "VARCHAR"}
+
+# Mesmos formatos de FORMATOS_DATA_HORA do notebook, na sintaxe do strptime
+FORMATOS_DATA_HORA = ["%Y-%m-%d %H:%M:%S", "%d/%m/%Y %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y"]
+
+# Tabela de origem -> (coluna de minutos, sufixo das colunas na série compacta)
+VARIANTES_OCUPACAO = {
+    "taxaocupacao": ("tempoemminutosdias", "ocupado"),
+    "taxaocupacaocomcarga": ("tempoemminutosdiasflagcarga", "com_carga"),
+    "taxaocupacaotoatracacao": ("tempoemminutosdiastoatracacao", "to_atracacao"),
+}
+
+MINUTOS_POR_DIA = 1440
+
+# Tolerância relativa na comparação dos resultados com os exportados pelo Spark
+TOLERANCIA_COMPARACAO = 1e-6
+
+
+def conectar(threads=None):
+    """Conexão DuckDB em memória com os esquemas das camadas; os dados ficam nos arquivos Parquet."""
+    con = duckdb.connect()
+    con.execute(f"SET threads = {threads or os.cpu_count()}")
+    for camada in ["bronze", "prata", "ouro"]:
+        con.execute(f"CREATE SCHEMA IF NOT EXISTS {camada}")
+    return con
+
+
+def descobrir_arquivos(caminho_base):
+    """Agrupa os arquivos .txt e .txt_part do diretório pelo tipo de tabela (ex.: 2020Carga_txt_part2 -> carga)."""
+    arquivos_por_tipo = defaultdict(list)
+    for arquivo in sorted(os.scandir(caminho_base), key=lambda entrada: entrada.name):
+        if arquivo.is_file() and (arquivo.name.endswith(".txt") or "txt_part" in arquivo.name):
+            arquivos_por_tipo[tipo_da_tabela(arquivo.name)].append(arquivo.path)
+    return arquivos_por_tipo
+
+
+def ler_cabecalho(caminho):
+    with open(caminho, encoding="utf-8", errors="replace") as arquivo:
+        return arquivo.readline().rstrip("\r\n").lstrip("\ufeff").split(SEPARADOR)
+
+
+def colunas_read_csv(tipo, cabecalho):
+    """Parâmetro columns do read_csv: nomes normalizados na ordem do cabeçalho e tipos do registro."""
+    tipos = {normalizar_nome_coluna(nome): tipo_coluna for nome, tipo_coluna in ESQUEMAS_ANTAQ.get(tipo, [])}
+    nomes = [normalizar_nome_coluna(nome) for nome in cabecalho]
+    verificar_colisoes(cabecalho, nomes)
+    colunas = []
+    for nome in nomes:
+        tipo_coluna = tipos.get(nome, "STRING")
+        colunas.append(f"'{nome}': '{TIPOS_DUCKDB.get(tipo_coluna, tipo_coluna)}'")
+    return "{" + ", ".join(colunas) + "}"
+
+
+def _lista_sql(valores):
+    return "[" + ", ".join("'" + valor.replace("'", "''") + "'" for valor in valores) + "]"
+
+
+def ler_tipo(con, tipo, caminhos):
+    """Lê todos os arquivos de um tipo em uma tabela temporária, uma varredura paralela por cabeçalho.
+
+    Linhas que não respeitam o esquema vão para a tabela temporária _quarentena. A coluna Ano vem
+    do nome do arquivo e hash_linha é calculado sobre todas as colunas, como no notebook.
+    """
+    caminhos_por_cabecalho = defaultdict(list)
+    for caminho in caminhos:
+        caminhos_por_cabecalho[tuple(ler_cabecalho(caminho))].append(caminho)
+
+    leituras = []
+    for cabecalho, caminhos_grupo in caminhos_por_cabecalho.items():
+        leituras.append(
+            f"SELECT * FROM read_csv({_lista_sql(caminhos_grupo)}, delim = '{SEPARADOR}', header = true, "
+            f"columns = {colunas_read_csv(tipo, cabecalho)}, filename = '_arquivo_origem', parallel = true, "
+            f"store_rejects = true)"
+        )
+    con.execute(f"CREATE OR REPLACE TEMP TABLE _leitura AS {' UNION ALL BY NAME '.join(leituras)}")
+
+    con.execute(f"""
+        INSERT INTO _quarentena
+        SELECT DISTINCT '{tipo}' AS tabela, s.file_path AS arquivo, e.csv_line AS registro, current_timestamp AS data_carga
+        FROM reject_errors e JOIN reject_scans s USING (scan_id, file_id)
+    """)
+    con.execute("DELETE FROM reject_errors")
+    con.execute("DELETE FROM reject_scans")
+
+    colunas = [coluna for coluna in con.table("_leitura").columns if coluna != "_arquivo_origem"]
+    return con.sql(f"""
+        SELECT * EXCLUDE (_arquivo_origem), hash({", ".join(f'"{coluna}"' for coluna in colunas + ["Ano"])}) AS hash_linha
+        FROM (
+            SELECT *, TRY_CAST(NULLIF(regexp_extract(_arquivo_origem, '(?:^|[/\\\\])(\\d{{4}})[^/\\\\]*$', 1), '') AS INTEGER) AS Ano
+            FROM _leitura
+        )
+    """)
+
+
+def gravar_tabela(con, destino, camada, tabela, relacao):
+    """Grava a relação em Parquet (particionada como no notebook) e registra a view camada.tabela.
+
+    A bronze segue ARMAZENAMENTO_BRONZE e ORDENACAO_BRONZE, como no notebook; o tamanho dos grupos
+    de linhas fica com o padrão do DuckDB, que só limita os grupos por bytes sem preservar a ordem.
+    """
+    diretorio = os.path.join(destino, camada, tabela)
+    shutil.rmtree(diretorio, ignore_errors=True)
+    os.makedirs(diretorio)
+
+    particao = particao_da_tabela(tabela, relacao.columns)
+    consulta, opcoes = "SELECT * FROM _gravacao", "FORMAT parquet"
+    if camada == "bronze":
+        opcoes += f", COMPRESSION {ARMAZENAMENTO_BRONZE['compressao']}"
+        ordenacao = [coluna for coluna in ORDENACAO_BRONZE.get(tabela, []) if coluna in relacao.columns]
+        if ordenacao:
+            consulta += f" ORDER BY {', '.join(ordenacao)}"
+
+    con.register("_gravacao", relacao)
+    if particao:
+        con.execute(f"COPY ({consulta}) TO '{diretorio}' ({opcoes}, PARTITION_BY ({particao}), OVERWRITE)")
+    else:
+        con.execute(f"COPY ({consulta}) TO '{os.path.join(diretorio, 'dados.parquet')}' ({opcoes})")
+    con.unregister("_gravacao")
+
+    registrar_view(con, camada, tabela, diretorio, particao is not None)
+
+
+def registrar_view(con, camada, tabela, diretorio, particionada):
+    con.execute(
+        f"CREATE OR REPLACE VIEW {camada}.{tabela} AS "
+        f"SELECT * FROM read_parquet('{diretorio}/**/*.parquet', hive_partitioning = {str(particionada).lower()})"
+    )
+
+
+def tabelas_da_camada(con, camada):
+    return [linha[0] for linha in con.execute(
+        "SELECT table_name FROM information_schema.tables WHERE table_schema = ? ORDER BY table_name", [camada]
+    ).fetchall()]
+
+
+def carregar_bronze(con, arquivos_por_tipo, destino):
+    """Lê os arquivos de cada tipo e grava a bronze e a bronze.quarentena."""
+    con.execute("""
+        CREATE OR REPLACE TEMP TABLE _quarentena
+        (tabela VARCHAR, arquivo VARCHAR, registro VARCHAR, data_carga TIMESTAMP WITH TIME ZONE)
+    """)
+    for tipo, caminhos in arquivos_por_tipo.items():
+        if tipo not in ESQUEMAS_ANTAQ:
+            print(f"⚠️ Tabela sem esquema registrado, lida como texto: {tipo}")
+        gravar_tabela(con, destino, "bronze", tipo, ler_tipo(con, tipo, caminhos))
+        print(f"Tabela {tipo} salva em bronze.{tipo}")
+
+    gravar_tabela(con, destino, "bronze", "quarentena", con.table("_quarentena"))
+    quarentena = con.execute("SELECT tabela, COUNT(*) FROM _quarentena GROUP BY tabela").fetchall()
+    for tabela, linhas in quarentena:
+        print(f"⚠️ Tabela {tabela}: {linhas} linhas fora do esquema enviadas para bronze.quarentena")
+
+
+def converter_data_hora(coluna):
+    """Converte texto em timestamp testando os formatos aceitos; valores inválidos viram nulo."""
+    return "coalesce(" + ", ".join(f"try_strptime(\"{coluna}\", '{formato}')" for formato in FORMATOS_DATA_HORA) + ")"
+
+
+def horas_entre(inicio, fim):
+    """Diferença em horas entre dois timestamps, no mesmo tipo das colunas de temposatracacao."""
+    return f"CAST((epoch(\"{fim}\") - epoch(\"{inicio}\")) / 3600 AS DECIMAL(18,4))"
+
+
+def preparar_prata(con, tipo):
+    """Datas convertidas para timestamp e, na atracação, os tempos T1 a T4, TA e TE."""
+    colunas = con.sql(f"SELECT * FROM bronze.{tipo}").columns
+    datas = set(colunas_data_hora(tipo))
+    expressoes = [f"{converter_data_hora(coluna)} AS \"{coluna}\"" if coluna in datas else f"\"{coluna}\"" for coluna in colunas]
+    consulta = f"SELECT {', '.join(expressoes)} FROM bronze.{tipo}"
+    if tipo == "atracacao":
+        duracoes = [f"{horas_entre(inicio, fim)} AS {nome}" for nome, (inicio, fim, _) in DURACOES_ATRACACAO.items()]
+        consulta = f"SELECT *, {', '.join(duracoes)} FROM ({consulta})"
+
+    # Mesma remoção de duplicados do notebook: uma linha por hash_linha
+    if tipo == "carga_conteinerizada":
+        consulta += " QUALIFY row_number() OVER (PARTITION BY hash_linha) = 1"
+    return con.sql(consulta)
+
+
+def carregar_prata(con, destino):
+    for tipo in tabelas_da_camada(con, "bronze"):
+        if tipo == "quarentena":
+            continue
+        gravar_tabela(con, destino, "prata", tipo, preparar_prata(con, tipo))
+        print(f"Tabela {tipo} salva em prata.{tipo}")
+
+
+def gravar_dimensao(con, destino, nome_dimensao, consulta_atributos, chave_natural, coluna_sk):
+    """Dimensão com uma linha por chave natural e chave substituta sequencial na ordem da chave natural."""
+    relacao = con.sql(f"""
+        SELECT CAST(row_number() OVER (ORDER BY "{chave_natural}") AS INTEGER) AS {coluna_sk}, *
+        FROM (
+            SELECT * FROM ({consulta_atributos})
+            WHERE "{chave_natural}" IS NOT NULL
+            QUALIFY row_number() OVER (PARTITION BY "{chave_natural}") = 1
+        )
+    """)
+    gravar_tabela(con, destino, "ouro", nome_dimensao, relacao)
+
+
+def _selecionar_apoio(con, tabela, colunas):
+    """SELECT da tabela de apoio com as colunas renomeadas ({origem: destino}), ou None se não existir."""
+    if tabela not in tabelas_da_camada(con, "prata"):
+        return None
+    return f"SELECT {', '.join(f'{origem} AS {destino}' for origem, destino in colunas.items())} FROM prata.{tabela}"
+
+
+def carregar_dimensoes(con, destino):
+    """Mesmas dimensões do notebook, recriadas a cada execução."""
+    gravar_dimensao(con, destino, "dim_porto", """
+        SELECT cdtup, porto_atracacao, complexo_portuario, tipo_da_autoridade_portuaria,
+               municipio, uf, sguf, regiao_geografica, regiao_hidrografica, coordenadas
+        FROM ouro.atracacao
+    """, "cdtup", "sk_porto")
+    gravar_dimensao(con, destino, "dim_berco", """
+        SELECT a.idberco, a.berco, p.sk_porto
+        FROM ouro.atracacao a LEFT JOIN ouro.dim_porto p ON a.cdtup = p.cdtup
+    """, "idberco", "sk_berco")
+    gravar_dimensao(con, destino, "dim_terminal", "SELECT terminal FROM ouro.atracacao", "terminal", "sk_terminal")
+    gravar_dimensao(con, destino, "dim_navegacao", """
+        SELECT tipo_de_navegacao_da_atracacao AS tipo_navegacao FROM ouro.atracacao
+        UNION ALL SELECT tipo_navegacao FROM ouro.carga
+    """, "tipo_navegacao", "sk_navegacao")
+    gravar_dimensao(con, destino, "dim_operacao", "SELECT tipo_de_operacao FROM ouro.atracacao", "tipo_de_operacao", "sk_operacao")
+    gravar_dimensao(con, destino, "dim_natureza_carga", "SELECT natureza_da_carga FROM ouro.carga", "natureza_da_carga", "sk_natureza_carga")
+    gravar_dimensao(con, destino, "dim_sentido", "SELECT sentido FROM ouro.carga", "sentido", "sk_sentido")
+
+    mercadorias = "SELECT cdmercadoria FROM ouro.carga"
+    cadastro = _selecionar_apoio(con, "mercadoria", {
+        "cdmercadoria": "cdmercadoria", "cdncmsh2": "cdncmsh2", "grupo_de_mercadoria": "grupo_de_mercadoria",
+        "mercadoria": "mercadoria", "nomenclatura_simplificada_mercadoria": "nomenclatura_simplificada_mercadoria",
+    })
+    if cadastro:
+        mercadorias = f"""
+            SELECT * FROM (SELECT cdmercadoria FROM ouro.carga UNION SELECT cdmercadoria FROM ({cadastro}))
+            LEFT JOIN ({cadastro}) USING (cdmercadoria)
+        """
+    gravar_dimensao(con, destino, "dim_mercadoria", mercadorias, "cdmercadoria", "sk_mercadoria")
+
+    locais = "SELECT origem AS codigo FROM ouro.carga UNION ALL SELECT destino AS codigo FROM ouro.carga"
+    cadastros = [
+        _selecionar_apoio(con, "origem_carga", {
+            "origem": "codigo", "origem_nome": "nome", "cidade_origem": "cidade", "uf_origem": "uf",
+            "pais_origem": "pais", "continente_origem": "continente", "blocoeconomico_origem": "bloco_economico",
+        }),
+        _selecionar_apoio(con, "destino_carga", {
+            "destino": "codigo", "nome_destino": "nome", "cidade_destino": "cidade", "uf_destino": "uf",
+            "pais_destino": "pais", "continente_destino": "continente", "blocoeconomico_destino": "bloco_economico",
+        }),
+    ]
+    cadastros = [cadastro for cadastro in cadastros if cadastro]
+    if cadastros:
+        cadastro = f"""
+            SELECT * FROM ({" UNION ALL ".join(cadastros)})
+            QUALIFY row_number() OVER (PARTITION BY codigo) = 1
+        """
+        locais = f"""
+            SELECT * FROM ({locais} UNION SELECT codigo FROM ({cadastro}))
+            LEFT JOIN ({cadastro}) USING (codigo)
+        """
+    gravar_dimensao(con, destino, "dim_local", locais, "codigo", "sk_local")
+
+
+def carregar_fatos(con, destino):
+    gravar_tabela(con, destino, "ouro", "fato_atracacao", con.sql("""
+        SELECT a.idatracacao, a.Ano, p.sk_porto, b.sk_berco, t.sk_terminal, n.sk_navegacao, o.sk_operacao,
+               a.data_chegada, a.data_atracacao, a.data_inicio_operacao, a.data_termino_operacao, a.data_desatracacao
+        FROM ouro.atracacao a
+        LEFT JOIN ouro.dim_porto p ON a.cdtup = p.cdtup
+        LEFT JOIN ouro.dim_berco b ON a.idberco = b.idberco
+        LEFT JOIN ouro.dim_terminal t ON a.terminal = t.terminal
+        LEFT JOIN ouro.dim_navegacao n ON a.tipo_de_navegacao_da_atracacao = n.tipo_navegacao
+        LEFT JOIN ouro.dim_operacao o ON a.tipo_de_operacao = o.tipo_de_operacao
+    """))
+    gravar_tabela(con, destino, "ouro", "fato_carga", con.sql("""
+        SELECT c.idcarga, c.idatracacao, c.Ano, m.sk_mercadoria, o.sk_local AS sk_origem, d.sk_local AS sk_destino,
+               z.sk_natureza_carga, n.sk_navegacao, s.sk_sentido,
+               c.vlpesocargabruta, c.teu, c.qtcarga
+        FROM ouro.carga c
+        LEFT JOIN ouro.dim_mercadoria m ON c.cdmercadoria = m.cdmercadoria
+        LEFT JOIN ouro.dim_local o ON c.origem = o.codigo
+        LEFT JOIN ouro.dim_local d ON c.destino = d.codigo
+        LEFT JOIN ouro.dim_natureza_carga z ON c.natureza_da_carga = z.natureza_da_carga
+        LEFT JOIN ouro.dim_navegacao n ON c.tipo_navegacao = n.tipo_navegacao
+        LEFT JOIN ouro.dim_sentido s ON c.sentido = s.sentido
+    """))
+
+
+def carregar_marts(con, destino):
+    """Marts com somas e contagens parciais por ano, matriz origem-destino, sketches e histórico de navios, iguais aos do notebook."""
+    gravar_tabela(con, destino, "ouro", "mart_atracacoes", con.sql("""
+        SELECT a.Ano, a.sk_porto, a.sk_terminal, n.tipo_navegacao AS tipo_de_navegacao_da_atracacao,
+               COUNT(*) AS qtd_atracacoes,
+               SUM(t.tatracado) AS soma_tatracado, COUNT(t.tatracado) AS qtd_tatracado,
+               SUM(t.testadia) AS soma_testadia, COUNT(t.testadia) AS qtd_testadia
+        FROM ouro.fato_atracacao a
+        LEFT JOIN ouro.temposatracacao t ON a.idatracacao = t.idatracacao
+        LEFT JOIN ouro.dim_navegacao n ON a.sk_navegacao = n.sk_navegacao
+        GROUP BY ALL
+    """))
+    gravar_tabela(con, destino, "ouro", "mart_carga", con.sql("""
+        SELECT c.Ano, a.Ano AS ano_atracacao, z.natureza_da_carga, c.sk_mercadoria, n.tipo_navegacao AS tipo_de_navegacao_da_atracacao,
+               SUM(c.vlpesocargabruta) AS soma_vlpesocargabruta, COUNT(*) AS qtd_cargas
+        FROM ouro.fato_carga c
+        LEFT JOIN ouro.fato_atracacao a ON c.idatracacao = a.idatracacao
+        LEFT JOIN ouro.dim_natureza_carga z ON c.sk_natureza_carga = z.sk_natureza_carga
+        LEFT JOIN ouro.dim_navegacao n ON a.sk_navegacao = n.sk_navegacao
+        GROUP BY ALL
+    """))
+
+    # Matriz origem-destino com os atributos dos locais; sem o cadastro, os atributos ficam nulos
+    colunas_local = con.sql("SELECT * FROM ouro.dim_local").columns
+    locais = []
+    for lado, apelido in [("origem", "o"), ("destino", "d")]:
+        locais.append(f"{apelido}.codigo AS {lado}")
+        for atributo in ATRIBUTOS_LOCAL_FLUXOS:
+            expressao = f"{apelido}.{atributo}" if atributo in colunas_local else "CAST(NULL AS VARCHAR)"
+            locais.append(f"{expressao} AS {lado}_{atributo}")
+    gravar_tabela(con, destino, "ouro", "mart_fluxos", con.sql(f"""
+        SELECT f.Ano, f.sk_origem, f.sk_destino, {", ".join(locais)},
+               z.natureza_da_carga, n.tipo_navegacao,
+               f.soma_vlpesocargabruta, f.soma_teu, f.soma_qtcarga, f.qtd_cargas
+        FROM (
+            SELECT Ano, sk_origem, sk_destino, sk_natureza_carga, sk_navegacao,
+                   SUM(vlpesocargabruta) AS soma_vlpesocargabruta, SUM(teu) AS soma_teu,
+                   SUM(qtcarga) AS soma_qtcarga, COUNT(*) AS qtd_cargas
+            FROM ouro.fato_carga
+            GROUP BY ALL
+        ) f
+        LEFT JOIN ouro.dim_local o ON f.sk_origem = o.sk_local
+        LEFT JOIN ouro.dim_local d ON f.sk_destino = d.sk_local
+        LEFT JOIN ouro.dim_natureza_carga z ON f.sk_natureza_carga = z.sk_natureza_carga
+        LEFT JOIN ouro.dim_navegacao n ON f.sk_navegacao = n.sk_navegacao
+    """))
+
+    # Sketches de percentis dos tempos e de navios distintos (hash() do DuckDB no lugar do xxhash64)
+    gravar_tabela(con, destino, "ouro", "sketch_tempos", con.sql(consulta_sketch_tempos()))
+    gravar_tabela(con, destino, "ouro", "sketch_navios", con.sql(
+        consulta_sketch_navios("hash(n.no_do_imo)", f"CAST(hash(n.no_do_imo) >> {BITS_HLL} AS BIGINT)")
+    ))
+
+    # Histórico de navios ordenado pelo navio em cada ano: a busca usa as estatísticas dos grupos de linhas
+    gravar_tabela(con, destino, "ouro", "historico_navios", con.sql(consulta_historico_navios()))
+
+
+def carregar_indice_espacial(con, destino):
+    """Índice espacial de portos e berços (ouro.indice_espacial), igual ao do notebook."""
+    portos = []
+    for sk_porto, cdtup, texto in con.execute("SELECT sk_porto, cdtup, coordenadas FROM ouro.dim_porto").fetchall():
+        coordenadas = interpretar_coordenadas(texto)
+        if coordenadas is not None:
+            portos.append((sk_porto, cdtup, *coordenadas, geohash(*coordenadas)))
+    con.execute("""
+        CREATE OR REPLACE TEMP TABLE _portos_geo
+        (sk_porto INTEGER, cdtup VARCHAR, latitude DOUBLE, longitude DOUBLE, geohash VARCHAR)
+    """)
+    if portos:
+        con.executemany("INSERT INTO _portos_geo VALUES (?, ?, ?, ?, ?)", portos)
+    gravar_tabela(con, destino, "ouro", "indice_espacial", con.sql("""
+        SELECT 'porto' AS tipo, cdtup AS chave, CAST(NULL AS INTEGER) AS sk_berco, sk_porto, latitude, longitude, geohash
+        FROM _portos_geo
+        UNION ALL
+        SELECT 'berco', b.idberco, b.sk_berco, p.sk_porto, p.latitude, p.longitude, p.geohash
+        FROM ouro.dim_berco b JOIN _portos_geo p ON b.sk_porto = p.sk_porto
+        ORDER BY geohash
+    """))
+
+
+def agregar_ocupacao(tabela, coluna_minutos, sufixo):
+    """Uma linha por berço e ano: vetor diário de 366 posições, minutos por mês e total do ano."""
+    meses = ", ".join(f"CAST(SUM(CASE WHEN mestaxaocupacao = {mes} THEN minutos ELSE 0 END) AS BIGINT)" for mes in range(1, 13))
+    # O mapa dia -> minutos é montado uma vez por berço e ano na agregação interna; dentro do
+    # lambda ele seria reconstruído para cada uma das 366 posições
+    return f"""
+        SELECT idberco, anotaxaocupacao, minutos_mensal_{sufixo}, minutos_ano_{sufixo},
+               list_transform(range(1, 367), dia -> coalesce(mapa[dia], 0)) AS minutos_diarios_{sufixo}
+        FROM (
+            SELECT idberco, anotaxaocupacao,
+                   list_value({meses}) AS minutos_mensal_{sufixo},
+                   CAST(SUM(minutos) AS BIGINT) AS minutos_ano_{sufixo},
+                   map_from_entries(list(struct_pack(k := CAST(dia_do_ano AS BIGINT), v := minutos))) AS mapa
+            FROM (
+                SELECT idberco, anotaxaocupacao, mestaxaocupacao,
+                       dayofyear(make_date(anotaxaocupacao, mestaxaocupacao, diataxaocupacao)) AS dia_do_ano,
+                       CAST(SUM({coluna_minutos}) AS INTEGER) AS minutos
+                FROM ouro.{tabela}
+                GROUP BY ALL
+            )
+            GROUP BY idberco, anotaxaocupacao
+        )
+    """
+
+
+def carregar_ocupacao_berco(con, destino):
+    """Série compacta de ocupação por berço (ouro.ocupacao_berco) com as taxas mensais e anual."""
+    presentes = set(tabelas_da_camada(con, "ouro"))
+    variantes = [(tabela, coluna, sufixo) for tabela, (coluna, sufixo) in VARIANTES_OCUPACAO.items() if tabela in presentes]
+    if not variantes:
+        return
+
+    consulta = f"({agregar_ocupacao(*variantes[0])})"
+    for variante in variantes[1:]:
+        consulta += f" FULL JOIN ({agregar_ocupacao(*variante)}) USING (idberco, anotaxaocupacao)"
+
+    taxas = []
+    for _, _, sufixo in variantes:
+        mensais = ", ".join(
+            f"minutos_mensal_{sufixo}[{mes}] / (dayofmonth(last_day(make_date(anotaxaocupacao, {mes}, 1))) * {MINUTOS_POR_DIA})"
+            for mes in range(1, 13)
+        )
+        taxas += [
+            f"list_value({mensais}) AS taxa_mensal_{sufixo}",
+            f"minutos_ano_{sufixo} / (dias_no_ano * {MINUTOS_POR_DIA}) AS taxa_anual_{sufixo}",
+        ]
+    relacao = con.sql(f"""
+        SELECT *, {", ".join(taxas)}
+        FROM (SELECT *, dayofyear(make_date(anotaxaocupacao, 12, 31)) AS dias_no_ano FROM {consulta})
+    """)
+    gravar_tabela(con, destino, "ouro", "ocupacao_berco", relacao)
+
+
+def carregar_ouro(con, destino):
+    """Camada ouro: tabelas da prata, modelo estrela, índice espacial, marts e série de ocupação por berço.
+
+    As tabelas copiadas da prata não são regravadas: localmente não há buckets, então as views da
+    ouro apontam para os mesmos arquivos Parquet da prata.
+    """
+    for tabela in tabelas_da_camada(con, "prata"):
+        diretorio = os.path.join(destino, "prata", tabela)
+        registrar_view(con, "ouro", tabela, diretorio, particao_da_tabela(tabela, con.sql(f"SELECT * FROM prata.{tabela}").columns) is not None)
+
+    if {"atracacao", "carga"} <= set(tabelas_da_camada(con, "ouro")):
+        carregar_dimensoes(con, destino)
+        carregar_fatos(con, destino)
+        carregar_indice_espacial(con, destino)
+        if "temposatracacao" in tabelas_da_camada(con, "ouro"):
+            carregar_marts(con, destino)
+    carregar_ocupacao_berco(con, destino)
+
+
+def executar_consultas(con, destino):
+    """Executa CONSULTAS_OURO e grava cada resultado em resultados/<consulta>.parquet."""
+    diretorio = os.path.join(destino, "resultados")
+    os.makedirs(diretorio, exist_ok=True)
+    for nome_consulta, consulta in CONSULTAS_OURO.items():
+        try:
+            resultado = con.sql(consulta)
+        except duckdb.CatalogException as erro:
+            print(f"⚠️ Consulta {nome_consulta} ignorada: {erro}")
+            continue
+        caminho = os.path.join(diretorio, f"{nome_consulta}.parquet")
+        resultado.write_parquet(caminho)
+        linhas = con.execute(f"SELECT COUNT(*) FROM read_parquet('{caminho}')").fetchone()[0]
+        print(f"🔎 Consulta: {nome_consulta}, Linhas: {linhas}")
+
+
+def _normalizar_linha(linha):
+    return tuple(float(valor) if isinstance(valor, (int, float, Decimal)) else valor for valor in linha)
+
+
+def _linhas_iguais(esquerda, direita):
+    if len(esquerda) != len(direita):
+        return False
+    for valor_esquerda, valor_direita in zip(esquerda, direita):
+        if isinstance(valor_esquerda, float) and isinstance(valor_direita, float):
+            if not math.isclose(valor_esquerda, valor_direita, rel_tol=TOLERANCIA_COMPARACAO, abs_tol=TOLERANCIA_COMPARACAO):
+                return False
+        elif valor_esquerda != valor_direita:
+            return False
+    return True
+
+
+def comparar_resultados(con, destino, diretorio_spark):
+    """Compara os resultados locais com os exportados pelo notebook (DIRETORIO_RESULTADOS_OURO).
+
+    As linhas são comparadas sem considerar a ordem, com tolerância nos valores numéricos.
+    Retorna as consultas divergentes.
+    """
+    divergentes = []
+    for nome_consulta in CONSULTAS_OURO:
+        local = os.path.join(destino, "resultados", f"{nome_consulta}.parquet")
+        spark = os.path.join(diretorio_spark, nome_consulta)
+        if not os.path.exists(local) or not os.path.exists(spark):
+            print(f"⚠️ Consulta {nome_consulta}: resultado ausente, comparação ignorada")
+            continue
+        if os.path.isdir(spark):
+            spark = os.path.join(spark, "*.parquet")
+
+        ordenar = lambda linhas: sorted((_normalizar_linha(linha) for linha in linhas), key=repr)
+        linhas_local = ordenar(con.execute(f"SELECT * FROM read_parquet('{local}')").fetchall())
+        linhas_spark = ordenar(con.execute(f"SELECT * FROM read_parquet('{spark}')").fetchall())
+
+        iguais = len(linhas_local) == len(linhas_spark) and all(map(_linhas_iguais, linhas_local, linhas_spark))
+        if iguais:
+            print(f"✅ Consulta {nome_consulta}: {len(linhas_local)} linhas iguais às do Spark")
+        else:
+            print(f"❌ Consulta {nome_consulta}: {len(linhas_local)} linhas locais, {len(linhas_spark)} no Spark, com divergências")
+            divergentes.append(nome_consulta)
+    return divergentes
+
+
+def executar_pipeline(origem, destino, threads=None):
+    """Executa todas as etapas e retorna a conexão, com as views das camadas registradas."""
+    inicio = time.perf_counter()
+    con = conectar(threads)
+    etapas = [
+        ("bronze", lambda: carregar_bronze(con, descobrir_arquivos(origem), destino)),
+        ("prata", lambda: carregar_prata(con, destino)),
+        ("ouro", lambda: carregar_ouro(con, destino)),
+        ("consultas", lambda: executar_consultas(con, destino)),
+    ]
+    for nome_etapa, etapa in etapas:
+        inicio_etapa = time.perf_counter()
+        etapa()
+        print(f"⏱️ Etapa {nome_etapa}: {time.perf_counter() - inicio_etapa:.2f} s")
+    print(f"⏱️ Total: {time.perf_counter() - inicio:.2f} s")
+    return con
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Executa o pipeline da ANTAQ localmente com DuckDB.")
+    parser.add_argument("--origem", required=True, help="diretório com os arquivos .txt da ANTAQ")
+    parser.add_argument("--destino", required=True, help="diretório de saída das camadas em Parquet")
+    parser.add_argument("--threads", type=int, default=None, help="threads do DuckDB (padrão: todos os núcleos)")
+    parser.add_argument("--comparar-com", default=None, help="diretório com os resultados exportados pelo notebook")
+    parser.add_argument("--navio", default=None, help="nº do IMO de um navio cujo histórico de atracações será exibido")
+    parser.add_argument("--capitania", default=None, help="nº da capitania do navio, para navios sem nº do IMO")
+    argumentos = parser.parse_args()
+
+    con = executar_pipeline(argumentos.origem, argumentos.destino, argumentos.threads)
+    if argumentos.navio or argumentos.capitania:
+        con.sql(consulta_historico_navio(identificador_navio(argumentos.navio, argumentos.capitania))).show(max_rows=100)
+    if argumentos.comparar_com and comparar_resultados(con, argumentos.destino, argumentos.comparar_com):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
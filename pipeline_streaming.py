@@ -0,0 +1,236 @@
+"""Modo streaming do pipeline da ANTAQ para as entregas diárias do SDP.
+
+Monitora um diretório de chegada com o Structured Streaming e processa os arquivos novos em
+micro-lotes: cada arquivo é associado à sua tabela pelo nome (tipo_da_tabela) e lido com o
+esquema tipado do registro. As linhas ainda ausentes são acrescentadas à bronze (anti-join pelo
+hash_linha nas partições do lote), mescladas na prata pelo hash_linha (MERGE do Delta) e a camada ouro é atualizada apenas nos anos recebidos no lote.
+
+O checkpoint do stream guarda os arquivos já processados, e as gravações na bronze usam as
+opções txnAppId/txnVersion do Delta para que um lote reprocessado após falha não seja gravado
+duas vezes.
+
+No Databricks, o notebook inicia o stream com iniciar_streaming (seção "Modo streaming").
+Localmente, com o Spark em modo local:
+
+    pip install pyspark delta-spark
+    python pipeline_streaming.py --chegada /tmp/chegada --destino /tmp/antaq_streaming
+    python pipeline_streaming.py --chegada /tmp/chegada --destino /tmp/antaq_streaming --disponivel-agora
+"""
+import argparse
+import os
+from collections import defaultdict
+
+from delta.tables import DeltaTable
+from pyspark.sql import SparkSession
+
+from antaq_comum import TABELAS_APOIO, ano_do_arquivo, particao_da_tabela, tipo_da_tabela
+from antaq_spark import (
+    OPCOES_LEITURA_CSV,
+    clean_column_names,
+    incluir_ano,
+    incluir_hash_linha,
+    ler_por_cabecalho,
+    preparar_prata,
+    remover_ja_presentes,
+)
+
+# Esquema fixo da fonte binaryFile; apenas o caminho é selecionado, então o conteúdo não é lido pelo stream
+ESQUEMA_ARQUIVOS = "path STRING, modificationTime TIMESTAMP, length BIGINT, content BINARY"
+
+# Arquivos .txt e partes _txt_partN, como em descobrir_arquivos
+FILTRO_ARQUIVOS = "*{.txt,txt_part*}"
+
+# Limite de arquivos por micro-lote, para que uma carga inicial grande não vire um único lote
+ARQUIVOS_POR_LOTE = 50
+
+# Identificador das gravações idempotentes (txnAppId) na bronze
+ID_APLICACAO = "antaq_streaming"
+
+
+def caminho_local(caminho):
+    """Caminho acessível pelo Python: dbfs:/ pelo ponto de montagem /dbfs e file:/ como caminho local."""
+    if caminho.startswith("dbfs:"):
+        return "/dbfs" + caminho[len("dbfs:"):]
+    if caminho.startswith("file:"):
+        return caminho[len("file:"):]
+    return caminho
+
+
+def ler_cabecalho(caminho):
+    """Lê apenas a primeira linha do arquivo, sem disparar jobs no Spark."""
+    with open(caminho_local(caminho), encoding="utf-8", errors="replace") as arquivo:
+        return arquivo.readline().rstrip("\r\n").lstrip("\ufeff").split(OPCOES_LEITURA_CSV["sep"])
+
+
+def agrupar_lote(caminhos):
+    """Agrupa os caminhos do lote por tipo de tabela e cabeçalho, e retorna também os anos de cada tipo."""
+    por_tipo = defaultdict(lambda: defaultdict(list))
+    anos_por_tipo = defaultdict(set)
+    for caminho in caminhos:
+        nome = caminho.rstrip("/").rsplit("/", 1)[-1]
+        tipo = tipo_da_tabela(nome)
+        por_tipo[tipo][tuple(ler_cabecalho(caminho))].append(caminho)
+        anos_por_tipo[tipo].add(ano_do_arquivo(nome))
+    return por_tipo, anos_por_tipo
+
+
+def _filtro_anos(particao, anos):
+    anos = sorted(ano for ano in anos if ano is not None)
+    return f"{particao} IN ({', '.join(str(ano) for ano in anos)})" if particao and anos else None
+
+
+def gravar_bronze(df, tabela, id_lote):
+    """Acrescenta o lote à tabela da bronze; tabelas de apoio são substituídas pelo arquivo recebido.
+
+    No append, linhas já presentes na bronze (reenvios do mesmo arquivo) são descartadas pelo hash_linha.
+    """
+    spark = df.sparkSession
+    nome = tabela.split(".")[-1]
+    opcoes = {"txnAppId": f"{ID_APLICACAO}_{tabela}", "txnVersion": id_lote}
+    escritor = df.write.format("delta").options(**opcoes)
+
+    if nome in TABELAS_APOIO:
+        escritor.mode("overwrite").option("overwriteSchema", "true").saveAsTable(tabela)
+    elif spark.catalog.tableExists(tabela):
+        remover_ja_presentes(df, tabela).write.format("delta").options(**opcoes).mode("append").saveAsTable(tabela)
+    else:
+        particao = particao_da_tabela(nome, df.columns)
+        escritor = escritor.partitionBy(particao) if particao else escritor
+        escritor.mode("append").saveAsTable(tabela)
+
+
+def mesclar_prata(df, tabela, anos):
+    """Mescla o lote na prata pelo hash_linha: linhas já presentes (reenvios do mesmo arquivo) são ignoradas.
+
+    A condição inclui a coluna de partição com os anos do lote, para que o MERGE leia apenas essas partições.
+    """
+    spark = df.sparkSession
+    nome = tabela.split(".")[-1]
+    df = df.dropDuplicates(["hash_linha"])
+
+    if nome in TABELAS_APOIO or not spark.catalog.tableExists(tabela):
+        particao = particao_da_tabela(nome, df.columns)
+        escritor = df.write.format("delta").mode("overwrite").option("overwriteSchema", "true")
+        escritor = escritor.partitionBy(particao) if particao else escritor
+        escritor.saveAsTable(tabela)
+        return
+
+    condicao = "t.hash_linha = s.hash_linha"
+    filtro = _filtro_anos(particao_da_tabela(nome, df.columns), anos)
+    if filtro:
+        condicao += f" AND t.{filtro}"
+    DeltaTable.forName(spark, tabela).alias("t").merge(df.alias("s"), condicao).whenNotMatchedInsertAll().execute()
+
+
+def atualizar_copias_ouro(spark, anos_por_tipo):
+    """Atualização padrão da ouro: regrava, para cada tabela do lote, apenas os anos recebidos.
+
+    O notebook substitui esta função por uma que também atualiza dimensões, fatos, marts e a
+    série de ocupação por berço.
+    """
+    for tipo, anos in anos_por_tipo.items():
+        df = spark.table(f"prata.{tipo}")
+        particao = particao_da_tabela(tipo, df.columns)
+        filtro = _filtro_anos("Ano" if particao else None, anos)
+
+        if filtro and spark.catalog.tableExists(f"ouro.{tipo}"):
+            df.filter(filtro).write.format("delta").mode("overwrite").option("replaceWhere", filtro).saveAsTable(f"ouro.{tipo}")
+            continue
+        escritor = df.write.format("delta").mode("overwrite")
+        escritor = escritor.partitionBy(particao) if particao else escritor
+        escritor.option("overwriteSchema", "true").saveAsTable(f"ouro.{tipo}")
+
+
+def processar_lote(df_arquivos, id_lote, atualizar_ouro):
+    """Processa um micro-lote de arquivos novos: bronze (append), prata (MERGE) e ouro (anos do lote)."""
+    caminhos = [linha["path"] for linha in df_arquivos.select("path").collect()]
+    if not caminhos:
+        return
+
+    por_tipo, anos_por_tipo = agrupar_lote(caminhos)
+    for tipo, caminhos_por_cabecalho in por_tipo.items():
+        # As linhas válidas e a quarentena saem da leitura persistida (df_lido), liberada ao final do tipo
+        df, df_quarentena, df_lido = ler_por_cabecalho(tipo, caminhos_por_cabecalho)
+        df = incluir_hash_linha(incluir_ano(clean_column_names(df))).persist()
+
+        gravar_bronze(df, f"bronze.{tipo}", id_lote)
+        if df_quarentena is not None:
+            (df_quarentena.write.format("delta").mode("append")
+                          .option("txnAppId", f"{ID_APLICACAO}_quarentena_{tipo}").option("txnVersion", id_lote)
+                          .saveAsTable("bronze.quarentena"))
+        mesclar_prata(preparar_prata(tipo, df), f"prata.{tipo}", anos_por_tipo[tipo])
+        df.unpersist()
+        if df_lido is not None:
+            df_lido.unpersist()
+
+    atualizar_ouro(dict(anos_por_tipo))
+    print(f"Lote {id_lote}: {len(caminhos)} arquivos, tabelas {sorted(anos_por_tipo)}")
+
+
+def iniciar_streaming(spark, diretorio_chegada, diretorio_checkpoint, atualizar_ouro=None,
+                      intervalo="1 minute", disponivel_agora=False):
+    """Inicia o stream sobre o diretório de chegada e retorna a StreamingQuery.
+
+    Com disponivel_agora=True processa os arquivos pendentes e encerra (trigger availableNow),
+    útil para testes e para execuções agendadas; caso contrário, verifica o diretório a cada intervalo.
+    """
+    for camada in ["bronze", "prata", "ouro"]:
+        spark.sql(f"CREATE SCHEMA IF NOT EXISTS {camada}")
+    if atualizar_ouro is None:
+        atualizar_ouro = lambda anos_por_tipo: atualizar_copias_ouro(spark, anos_por_tipo)
+
+    arquivos = (
+        spark.readStream.format("binaryFile")
+             .schema(ESQUEMA_ARQUIVOS)
+             .option("pathGlobFilter", FILTRO_ARQUIVOS)
+             .option("maxFilesPerTrigger", ARQUIVOS_POR_LOTE)
+             .load(diretorio_chegada)
+             .select("path")
+    )
+    escritor = (
+        arquivos.writeStream
+                .queryName("antaq_streaming")
+                .foreachBatch(lambda df, id_lote: processar_lote(df, id_lote, atualizar_ouro))
+                .option("checkpointLocation", diretorio_checkpoint)
+    )
+    escritor = escritor.trigger(availableNow=True) if disponivel_agora else escritor.trigger(processingTime=intervalo)
+    return escritor.start()
+
+
+def criar_sessao_local(destino):
+    """SparkSession em modo local com Delta, metastore e warehouse dentro do diretório de destino."""
+    from delta import configure_spark_with_delta_pip
+
+    construtor = (
+        SparkSession.builder.master("local[*]").appName("antaq_streaming")
+                    .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
+                    .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
+                    .config("spark.sql.warehouse.dir", os.path.join(destino, "warehouse"))
+                    .config("javax.jdo.option.ConnectionURL", f"jdbc:derby:;databaseName={os.path.join(destino, 'metastore_db')};create=true")
+                    .config("spark.sql.shuffle.partitions", "8")
+                    .enableHiveSupport()
+    )
+    return configure_spark_with_delta_pip(construtor).getOrCreate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Processa em streaming os arquivos da ANTAQ de um diretório de chegada.")
+    parser.add_argument("--chegada", required=True, help="diretório monitorado com os arquivos .txt")
+    parser.add_argument("--destino", required=True, help="diretório do warehouse, metastore e checkpoint")
+    parser.add_argument("--intervalo", default="1 minute", help="intervalo entre as verificações do diretório")
+    parser.add_argument("--disponivel-agora", action="store_true", help="processa os arquivos pendentes e encerra")
+    argumentos = parser.parse_args()
+
+    spark = criar_sessao_local(os.path.abspath(argumentos.destino))
+    consulta = iniciar_streaming(
+        spark,
+        os.path.abspath(argumentos.chegada),
+        os.path.join(os.path.abspath(argumentos.destino), "checkpoint"),
+        intervalo=argumentos.intervalo,
+        disponivel_agora=argumentos.disponivel_agora,
+    )
+    consulta.awaitTermination()
+
+
+if __name__ == "__main__":
+    main()
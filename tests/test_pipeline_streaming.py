@@ -0,0 +1,69 @@
+"""Teste de ponta a ponta do modo streaming com o Spark em modo local.
+
+Gera arquivos sintéticos de atracação e carga, processa o diretório de chegada com
+iniciar_streaming(..., disponivel_agora=True) e confere as contagens da bronze, da prata e da
+ouro; depois entrega novamente o mesmo arquivo com outro nome e confere que nada muda.
+Ignorado quando pyspark, delta-spark ou o Java não estão disponíveis.
+"""
+import os
+import shutil
+import sys
+
+import pytest
+
+pytest.importorskip("pyspark")
+pytest.importorskip("delta")
+if shutil.which("java") is None and not os.environ.get("JAVA_HOME"):
+    pytest.skip("Java não encontrado para o Spark em modo local", allow_module_level=True)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gerador_sintetico import gerar  # noqa: E402
+from pipeline_streaming import criar_sessao_local, iniciar_streaming  # noqa: E402
+
+ANO = 2023
+TABELAS = ["atracacao", "carga"]
+ARQUIVOS = {"atracacao": f"{ANO}Atracacao.txt", "carga": f"{ANO}Carga.txt"}
+
+
+@pytest.fixture(scope="module")
+def ambiente(tmp_path_factory):
+    """Arquivos gerados, diretório de chegada com atracação e carga e sessão Spark local com Delta."""
+    base = tmp_path_factory.mktemp("antaq_streaming")
+    gerados, chegada, destino = base / "gerados", base / "chegada", base / "destino"
+    linhas = gerar(str(gerados), escala=0.02, anos=[ANO])
+    chegada.mkdir()
+    for nome in ARQUIVOS.values():
+        shutil.copy(gerados / nome, chegada / nome)
+
+    spark = criar_sessao_local(str(destino))
+    yield spark, chegada, destino, linhas
+    spark.stop()
+
+
+def processar(spark, chegada, destino):
+    consulta = iniciar_streaming(spark, str(chegada), str(destino / "checkpoint"), disponivel_agora=True)
+    consulta.awaitTermination()
+    assert consulta.exception() is None
+
+
+def contagens(spark):
+    return {
+        (camada, tabela): spark.table(f"{camada}.{tabela}").count()
+        for camada in ["bronze", "prata", "ouro"] for tabela in TABELAS
+    }
+
+
+def test_carga_e_reentrega_idempotente(ambiente):
+    spark, chegada, destino, linhas = ambiente
+
+    processar(spark, chegada, destino)
+    primeira = contagens(spark)
+    for tabela in TABELAS:
+        for camada in ["bronze", "prata", "ouro"]:
+            assert primeira[(camada, tabela)] == linhas[tabela], (camada, tabela)
+
+    # Mesmo conteúdo com outro nome: o checkpoint não o reconhece, a bronze e a prata descartam pelo hash_linha
+    shutil.copy(chegada / ARQUIVOS["atracacao"], chegada / f"{ANO}Atracacao_txt_part9")
+    processar(spark, chegada, destino)
+    assert contagens(spark) == primeira